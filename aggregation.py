@@ -0,0 +1,199 @@
+"""
+Spatial pre-aggregation: bin points into quadkey or grid cells with per-cell stats
+"""
+
+import numpy as np
+import pandas as pd
+
+from geojson_builder import PointCoordinates, json_column_values
+from instrumentation import stage
+
+# Cell schemes offered for aggregated exports, label -> default resolution
+AGGREGATION_SCHEMES = {"Quadkey": 14, "Grid": 0.01}
+# Deepest Web Mercator zoom level of quadkey cells
+MAX_ZOOM = 24
+# Latitude limit of the Web Mercator projection
+MAX_MERCATOR_LAT = 85.05112878
+# Pyramid tiles at zoom z hold the cells of zoom z + TILE_DETAIL (16 x 16 per tile)
+TILE_DETAIL = 4
+
+
+def value_columns_of(df, lat_col, lon_col):
+    """Return the numeric (non-boolean) columns aggregated per cell"""
+    return [col for col in df.columns
+            if col not in (lat_col, lon_col)
+            and pd.api.types.is_numeric_dtype(df[col].dtype)
+            and not pd.api.types.is_bool_dtype(df[col].dtype)]
+
+
+def tile_xy(lats, lons, zoom):
+    """Return the Web Mercator tile x/y of each point at a zoom level"""
+    n = 1 << zoom
+    lat = np.radians(np.clip(lats, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = np.floor((lons + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64)
+
+
+def tile_bounds(x, y, zoom):
+    """Return the (west, south, east, north) degrees of tiles"""
+    n = float(1 << zoom)
+
+    def lat_of(row):
+        return np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat_of(y + 1), (x + 1) / n * 360.0 - 180.0, lat_of(y)
+
+
+def quadkeys(x, y, zoom):
+    """Return the quadkey strings of tiles"""
+    if zoom == 0:
+        return np.full(len(x), "", dtype=object)
+    shifts = np.arange(zoom - 1, -1, -1, dtype=np.int64)
+    digits = ((x[:, None] >> shifts) & 1) + 2 * ((y[:, None] >> shifts) & 1)
+    chars = np.ascontiguousarray((digits + ord("0")).astype(np.uint8))
+    return chars.view(f"S{zoom}").ravel().astype(str).astype(object)
+
+
+def grid_xy(lats, lons, cell_degrees):
+    """Return the column/row of each point in a regular lat/lon grid"""
+    x = np.floor((lons + 180.0) / cell_degrees).astype(np.int64)
+    y = np.floor((lats + 90.0) / cell_degrees).astype(np.int64)
+    return x, y
+
+
+def bin_points(df, scheme="Quadkey", resolution=AGGREGATION_SCHEMES["Quadkey"], value_columns=None,
+               points=None):
+    """Bin points into cells and return the partial aggregates per cell
+
+    The result has one row per occupied cell: its cell_x/cell_y (tile or
+    grid column/row), the point count and, per value column, the sum,
+    non-null count, min and max. Partial aggregates roll up into coarser
+    cells without revisiting the points. points is a prebuilt
+    PointCoordinates of df's rows.
+    """
+    if points is None:
+        points = PointCoordinates(df)
+    if points.lat_col is None or points.lon_col is None:
+        raise ValueError("No coordinate columns (lat, lon or latitude, longitude) found")
+    if value_columns is None:
+        value_columns = value_columns_of(df, points.lat_col, points.lon_col)
+    lats, lons, valid = points.arrays()
+    if scheme == "Quadkey":
+        x, y = tile_xy(lats[valid], lons[valid], int(resolution))
+    elif scheme == "Grid":
+        x, y = grid_xy(lats[valid], lons[valid], float(resolution))
+    else:
+        raise ValueError(f"Unknown aggregation scheme: {scheme}")
+
+    points = pd.DataFrame({"cell_x": x, "cell_y": y})
+    for col in value_columns:
+        points[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)[valid]
+    return _combine(points, value_columns, {col: ("sum", "count", "min", "max") for col in value_columns})
+
+
+def rollup(partial, levels=1):
+    """Merge partial aggregates of quadkey cells into their ancestors levels up"""
+    coarser = partial.assign(cell_x=partial["cell_x"].to_numpy() >> levels,
+                             cell_y=partial["cell_y"].to_numpy() >> levels)
+    value_columns = [col[:-len("__sum")] for col in partial.columns if col.endswith("__sum")]
+    return _combine(coarser, value_columns, {col: ("sum", "sum", "min", "max") for col in value_columns},
+                    count="sum", suffixed=True)
+
+
+def _combine(frame, value_columns, how, count="size", suffixed=False):
+    """Group rows by cell_x/cell_y into count, __sum, __n, __min and __max columns"""
+    grouped = frame.groupby(["cell_x", "cell_y"], sort=True)
+    combined = pd.DataFrame({"count": grouped["count"].sum() if count == "sum" else grouped.size()})
+    for col in value_columns:
+        for part, func in zip(("__sum", "__n", "__min", "__max"), how[col]):
+            source = f"{col}{part}" if suffixed else col
+            combined[f"{col}{part}"] = grouped[source].agg(func)
+    return combined.reset_index()
+
+
+def finalize_cells(partial, scheme="Quadkey", resolution=AGGREGATION_SCHEMES["Quadkey"]):
+    """Turn partial aggregates into cells with an id, bounds, count and stats"""
+    x, y = partial["cell_x"].to_numpy(), partial["cell_y"].to_numpy()
+    if scheme == "Quadkey":
+        cell_ids = quadkeys(x, y, int(resolution))
+        west, south, east, north = tile_bounds(x, y, int(resolution))
+    else:
+        cell_degrees = float(resolution)
+        cell_ids = pd.Series(x).astype(str).str.cat(pd.Series(y).astype(str), sep="_").to_numpy(dtype=object)
+        west, south = x * cell_degrees - 180.0, y * cell_degrees - 90.0
+        east, north = west + cell_degrees, south + cell_degrees
+    cells = pd.DataFrame({"cell": cell_ids, "count": partial["count"].to_numpy()})
+    for col in [col[:-len("__sum")] for col in partial.columns if col.endswith("__sum")]:
+        counts = partial[f"{col}__n"].to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cells[f"{col}_mean"] = partial[f"{col}__sum"].to_numpy() / counts
+        cells[f"{col}_min"] = partial[f"{col}__min"].to_numpy()
+        cells[f"{col}_max"] = partial[f"{col}__max"].to_numpy()
+    return cells.assign(west=west, south=south, east=east, north=north)
+
+
+def aggregate_points(df, scheme="Quadkey", resolution=AGGREGATION_SCHEMES["Quadkey"], value_columns=None,
+                     points=None):
+    """Bin points into quadkey tiles or grid cells with per-cell count and stats
+
+    Returns one row per occupied cell: its id (quadkey or 'col_row'),
+    point count, mean/min/max of every numeric column and the cell bounds.
+    """
+    with stage("aggregate", rows_in=len(df), scheme=scheme, resolution=resolution) as record:
+        cells = finalize_cells(bin_points(df, scheme, resolution, value_columns, points), scheme, resolution)
+        record["rows_out"] = len(cells)
+    return cells
+
+
+def cell_features(cells):
+    """Build a Polygon feature per cell with its stats as properties"""
+    bounds = ("west", "south", "east", "north")
+    prop_names = [col for col in cells.columns if col not in bounds]
+    prop_columns = [json_column_values(cells[col]) for col in prop_names]
+    rings = zip(*(cells[col].tolist() for col in bounds))
+    return [
+        {
+            "type": "Feature",
+            "properties": dict(zip(prop_names, props)),
+            "geometry": {"type": "Polygon",
+                         "coordinates": [[[w, s], [e, s], [e, n], [w, n], [w, s]]]},
+        }
+        for props, (w, s, e, n) in zip(zip(*prop_columns), rings)
+    ]
+
+
+def aggregated_feature_collection(cells, scope_number):
+    """Create the GeoJSON FeatureCollection of aggregated cells"""
+    return {
+        "type": "FeatureCollection",
+        "name": f"merged_data_{scope_number}_cells",
+        "features": cell_features(cells),
+    }
+
+
+def pyramid_tiles(df, min_zoom, max_zoom, detail=TILE_DETAIL, value_columns=None, points=None):
+    """Yield (zoom, x, y, cells) for every occupied tile from max_zoom down to min_zoom
+
+    Tiles at zoom z hold the quadkey cells of zoom z + detail (capped at
+    MAX_ZOOM). Points are binned once at the finest level; every coarser
+    level is rolled up from the level below.
+    """
+    if not 0 <= min_zoom <= max_zoom <= MAX_ZOOM:
+        raise ValueError(f"Pyramid zooms must satisfy 0 <= min <= max <= {MAX_ZOOM}")
+    cell_zoom = min(max_zoom + detail, MAX_ZOOM)
+    with stage("pyramid: bin", rows_in=len(df)) as record:
+        partial = bin_points(df, "Quadkey", cell_zoom, value_columns, points)
+        record["rows_out"] = len(partial)
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        level_zoom = min(zoom + detail, MAX_ZOOM)
+        if level_zoom < cell_zoom:
+            partial = rollup(partial, cell_zoom - level_zoom)
+            cell_zoom = level_zoom
+        cells = finalize_cells(partial, "Quadkey", cell_zoom)
+        shift = cell_zoom - zoom
+        tile_x = partial["cell_x"].to_numpy() >> shift
+        tile_y = partial["cell_y"].to_numpy() >> shift
+        tiles = pd.DataFrame({"x": tile_x, "y": tile_y}).groupby(["x", "y"], sort=True).indices
+        for (x, y), rows in tiles.items():
+            yield zoom, int(x), int(y), cells.iloc[rows]
@@ -1,12 +1,27 @@
 import streamlit as st
-import pandas as pd
-import json
-import io
-from datetime import datetime, date
-import geopandas as gpd
-from shapely.geometry import Point
-import tempfile
+from datetime import date
 import os
+import uuid
+from caching import (CSV_ARTIFACT, FusionResult, content_hash, fusion_cache, geojson_artifact, parse_cache,
+                     read_csv_cached, source_key)
+from engine import DEFAULT_DATE, SCOPE_OPTIONS, common_join_columns, fusion_job, incremental_job
+from fusion import (ASOF_STRATEGY, DEFAULT_ASOF_TOLERANCE_S, FUSION_ENGINES, LAZY_ENGINE,
+                    MERGE_STRATEGIES, NEAREST_ROAD_STRATEGY, OUT_OF_CORE_ENGINE, STRATEGY_OPTIONS,
+                    find_time_column)
+from spatial import DEFAULT_MAX_DISTANCE_M
+from summary import column_stats_frame
+from ingestion import arrow_available
+from instrumentation import MAX_RECENT_RUNS, Run, psutil_available, stage, stages_frame
+from lazy_engine import polars_available
+from planner import DEFAULT_MAX_OUTPUT_BYTES, DEFAULT_MAX_OUTPUT_ROWS, plan_join
+from jobs import CANCELLED, DONE, JOB_POLL_SECONDS, QUEUED
+from incremental import INCREMENTAL_STRATEGIES
+from page_assets import PAGE_CSS, get_incremental_history, get_job_registry, get_result_store, get_road_store
+from aggregation import AGGREGATION_SCHEMES, MAX_ZOOM, TILE_DETAIL
+from geojson_builder import coordinate_key
+from exporters import (COLUMNAR_FORMATS, DEFAULT_PYRAMID_ZOOMS, PARQUET_COMPRESSIONS, columnar_file,
+                       iter_aggregated_geojson_chunks, iter_csv_chunks, iter_geojson_chunks, spool_chunks,
+                       tile_pyramid_file)
 
 # Page configuration
 st.set_page_config(
@@ -16,132 +31,115 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Modern CSS styling to match the design
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-    .via-fusion-tag {
-        background-color: #ff6b35;
-        color: white;
-        padding: 0.3rem 0.8rem;
-        border-radius: 15px;
-        font-size: 0.9rem;
-        font-weight: bold;
-        display: inline-block;
-        margin-bottom: 2rem;
-        text-align: center;
-        width: 100%;
-    }
-    .section-header {
-        font-size: 1.8rem;
-        font-weight: bold;
-        color: #2c3e50;
-        margin-top: 2rem;
-        margin-bottom: 1.5rem;
-    }
-    .upload-section {
-        background-color: #f8f9fa;
-        border: 2px dashed #dee2e6;
-        border-radius: 10px;
-        padding: 2rem;
-        margin: 1rem 0;
-        text-align: center;
-    }
-    .upload-title {
-        font-size: 1.4rem;
-        font-weight: bold;
-        color: #2c3e50;
-        margin-bottom: 0.5rem;
-    }
-    .upload-subtitle {
-        color: #6c757d;
-        margin-bottom: 1rem;
-    }
-    .file-upload-area {
-        background-color: #f8f9fa;
-        border: 2px dashed #dee2e6;
-        border-radius: 8px;
-        padding: 2rem;
-        margin: 1rem 0;
-        text-align: center;
-        min-height: 120px;
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-        align-items: center;
-    }
-    .upload-icon {
-        font-size: 2rem;
-        color: #6c757d;
-        margin-bottom: 1rem;
-    }
-    .upload-text {
-        color: #495057;
-        font-size: 1.1rem;
-        margin-bottom: 0.5rem;
-    }
-    .upload-limit {
-        color: #6c757d;
-        font-size: 0.9rem;
-    }
-    .browse-button {
-        background-color: #6c757d;
-        color: white;
-        border: none;
-        padding: 0.5rem 1rem;
-        border-radius: 5px;
-        margin-top: 1rem;
-    }
-    .file-info-box {
-        background-color: #e7f3ff;
-        border: 1px solid #b3d9ff;
-        color: #004085;
-        padding: 1rem;
-        border-radius: 5px;
-        margin: 1rem 0;
-        text-align: center;
-    }
-    .success-message {
-        background-color: #d4edda;
-        border: 1px solid #c3e6cb;
-        color: #155724;
-        padding: 0.75rem;
-        border-radius: 0.25rem;
-        margin: 1rem 0;
-    }
-    .info-box {
-        background-color: #e7f3ff;
-        border: 1px solid #b3d9ff;
-        color: #004085;
-        padding: 1rem;
-        border-radius: 0.25rem;
-        margin: 1rem 0;
-    }
-    .footer {
-        text-align: center;
-        color: #666;
-        margin-top: 2rem;
-        padding: 1rem;
-        border-top: 1px solid #dee2e6;
-    }
-    .metric-card {
-        background-color: #f8f9fa;
-        border: 1px solid #dee2e6;
-        border-radius: 8px;
-        padding: 1rem;
-        text-align: center;
-        margin: 0.5rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Modern CSS styling to match the design, built once in page_assets
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+def get_parse_cache():
+    """Return this session's cache of parsed uploads"""
+    if 'parse_cache' not in st.session_state:
+        st.session_state['parse_cache'] = parse_cache()
+    return st.session_state['parse_cache']
+
+def get_fusion_cache():
+    """Return this session's cache of fusion results and exports"""
+    if 'fusion_cache' not in st.session_state:
+        st.session_state['fusion_cache'] = fusion_cache()
+    return st.session_state['fusion_cache']
+
+def current_job(jobs):
+    """Return this session's fusion job, reattaching via the URL after a refresh"""
+    job_id = st.session_state.get('fusion_job_id') or st.query_params.get('job')
+    job = jobs.get(job_id) if job_id else None
+    if job is None:
+        forget_job(jobs, job_id)
+    return job
+
+def forget_job(jobs, job_id):
+    """Drop a collected or unknown job from the registry, session and URL"""
+    if job_id:
+        jobs.pop(job_id)
+    st.session_state.pop('fusion_job_id', None)
+    if 'job' in st.query_params:
+        del st.query_params['job']
+
+def store_result(fusion_key, result):
+    """Make a fusion result the one shown in the download section"""
+    st.session_state['merged_data'] = result.merged_df
+    st.session_state['fusion_summary'] = result.summary
+    st.session_state['fusion_key'] = fusion_key
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_job_progress(job, jobs):
+    """Poll a running job, rerunning the page once it has finished"""
+    if job.done:
+        st.rerun()
+    if job.status == QUEUED:
+        text = f"🕒 {job.label}: queued ({jobs.queued_ahead(job)} job(s) ahead)"
+    else:
+        text = f"⏳ {job.label}: {job.stage or 'starting'} • {job.elapsed():.0f}s"
+    st.progress(job.progress, text=text)
+    if st.button("🛑 Cancel", key=f"cancel_{job.id}"):
+        job.cancel()
+
+def remember_run(record):
+    """Keep a finished run record for this session's diagnostics panel"""
+    recent = st.session_state.setdefault('recent_runs', [])
+    recent.append(record)
+    del recent[:-MAX_RECENT_RUNS]
+
+def show_diagnostics():
+    """Show the stage timings of this session's recent runs, newest first"""
+    recent = st.session_state.get('recent_runs', [])
+    if not recent:
+        st.caption("No runs recorded yet")
+    for record in reversed(recent):
+        st.caption(f"{record['run']} • {record['status']} • {record['total_seconds']:.2f}s • {record['started']}")
+        st.dataframe(stages_frame(record), hide_index=True)
+
+def show_export_info(result, name):
+    """Show the size and build time of a cached export"""
+    size, seconds = result.artifact_info(name)
+    st.caption(f"📦 {size / 1e6:.2f} MB • built in {seconds:.2f}s")
+
+def show_points_report(report):
+    """Show how many rows became map points and why the others were left out"""
+    if report['lat_col'] is None or report['lon_col'] is None:
+        st.caption("📍 No coordinate columns found: the GeoJSON holds one metadata feature")
+        return
+    source = '' if report['source_crs'] is None else f" from {report['source_crs']}"
+    st.caption(f"📍 {report['points']:,} of {report['rows']:,} rows as points "
+               f"({report['lat_col']}/{report['lon_col']}{source}) • rejected: {report['missing']:,} missing, "
+               f"{report['out_of_range']:,} out of range, {report['duplicates']:,} duplicates")
+
+def time_column_select(label, df):
+    """Select box of a frame's columns, preset to its detected timestamp column"""
+    columns = list(df.columns)
+    detected = find_time_column(df)
+    selected = st.selectbox(label, columns, index=None if detected is None else columns.index(detected),
+                            placeholder="Select a timestamp column",
+                            help="Datetime or date text column the as-of join matches on")
+    if selected is None:
+        st.warning("⚠️ No timestamp column detected, select one")
+    return selected
+
+def export_data(result, name):
+    """Return a callable reading a cached export only when its download button is clicked"""
+    return lambda: result.artifact_bytes(name)
 
 def main():
+    # Stages of this script run; logged as one JSON line if any were recorded
+    run = Run("app", trace_memory=st.session_state.get('trace_memory', False))
+    with run.activate():
+        render_app(run)
+
+def render_app(run):
+    upload_cache = get_parse_cache()
+    results_cache = get_fusion_cache()
+    jobs = get_job_registry()
+    store = get_result_store()
+    history = get_incremental_history()
+    road_store = get_road_store()
+    
     # Main header with Via Fusion tag
     st.markdown('<div class="main-header">🔗 Data Fusion Application</div>', unsafe_allow_html=True)
     st.markdown('<div class="via-fusion-tag">Via Fusion</div>', unsafe_allow_html=True)
@@ -152,42 +150,22 @@ def main():
         
         # Scope Selector
         st.markdown("### 📍 Target Scope Selection")
-        scope_options = {
-            "Vianova Showcase - 300557 - Dubai UAE - 403825": "403825",
-            "Lime - 300066 - Lime Gothenburg - 300109": "300109",
-            "Stadt Sindelfingen - 309232 - EV Ladestation Demo - 408444": "408444",
-            "Fenix - 304630 - Abu Dhabi - 306669": "306669",
-            "BoltEU - 300076 - Bolt Ludwigshafen - 353510": "353510",
-            "vianova-feed-management - 1 - test-road-import-over-20k - 403792": "403792",
-            "Lime - 300066 - Lime Brussels - 300118": "300118",
-            "waytailLive - 10109 - Northindainzia - 404103": "404103",
-            "Marseille - 408340 - France - 408340": "408340",
-            "Lyon - 408341 - France - 408341": "408341",
-            "Paris - 408342 - France - 408342": "408342",
-            "Toulouse - 408343 - France - 408343": "408343",
-            "Nice - 408344 - France - 408344": "408344",
-            "Nantes - 408345 - France - 408345": "408345",
-            "Strasbourg - 408346 - France - 408346": "408346",
-            "Montpellier - 408347 - France - 408347": "408347",
-            "Bordeaux - 408348 - France - 408348": "408348",
-            "Lille - 408349 - France - 408349": "408349"
-        }
         
         selected_scope = st.selectbox(
             "Target_scope:",
-            options=list(scope_options.keys()),
+            options=list(SCOPE_OPTIONS.keys()),
             index=0,  # Default to Vianova Showcase
             placeholder="Choose an option"
         )
         
-        scope_number = scope_options[selected_scope]
+        scope_number = SCOPE_OPTIONS[selected_scope]
         st.info(f"Selected Scope: {scope_number}")
         
         # Date Picker
         st.markdown("### 📅 Date Selection")
         selected_date = st.date_input(
             "Select Date:",
-            value=date(2025, 9, 29),  # Default to September 29, 2025
+            value=DEFAULT_DATE,  # Default to September 29, 2025
             min_value=date(2020, 1, 1),
             max_value=date(2030, 12, 31)
         )
@@ -198,11 +176,214 @@ def main():
         st.markdown("### 🔧 Processing Options")
         merge_strategy = st.selectbox(
             "Merge Strategy:",
-            ["Inner Join", "Left Join", "Right Join", "Outer Join"],
+            STRATEGY_OPTIONS,
             index=0
         )
+        max_distance_m = st.number_input(
+            "Max road distance (m):",
+            min_value=1.0,
+            value=DEFAULT_MAX_DISTANCE_M,
+            step=10.0,
+            disabled=merge_strategy != NEAREST_ROAD_STRATEGY,
+            help="BMS points farther than this from every road are left unmatched"
+        )
+        asof_tolerance_s = st.number_input(
+            "As-of tolerance (s):",
+            min_value=0,
+            value=DEFAULT_ASOF_TOLERANCE_S,
+            step=60,
+            disabled=merge_strategy != ASOF_STRATEGY,
+            help="Road records further apart in time than this are not matched (0 = no limit)"
+        )
+        incremental = st.checkbox(
+            "Incremental mode",
+            value=False,
+            disabled=merge_strategy not in INCREMENTAL_STRATEGIES,
+            help="Only fuse BMS rows not fused for this scope yet and append them to the scope's history; "
+                 "rows are kept per date of their timestamp (the selected date without one) and downloads hold "
+                 "the dates the new rows were added to (inner, left, nearest-road and as-of joins)"
+        ) and merge_strategy in INCREMENTAL_STRATEGIES
+        manifest = history.manifest(scope_number)
+        if incremental and manifest is not None:
+            st.caption(f"📚 History: {manifest['history_rows']:,} rows in {len(manifest['partitions'])} "
+                       f"date partition(s), updated {manifest['updated']}")
+            if st.button("🗑️ Reset scope history"):
+                with history.scope_lock(scope_number):
+                    history.reset(scope_number)
+                st.rerun()
+        use_road_reference = st.checkbox(
+            "Keep road table per scope",
+            value=True,
+            help="Store the parsed road table and its join/spatial indexes on the server; later sessions "
+                 "reuse them without uploading the file again, and only a changed road file replaces them"
+        )
+        road_manifest = road_store.manifest(scope_number)
+        if use_road_reference and road_manifest is not None:
+            st.caption(f"🛣️ Stored road table: {road_manifest['rows']:,} rows"
+                       f"{'' if road_manifest['geometry'] is None else ' with geometries'}, "
+                       f"updated {road_manifest['updated']}")
+            if st.button("🗑️ Forget scope road table"):
+                road_store.reset(scope_number)
+                st.rerun()
+        fusion_engine = st.selectbox(
+            "Fusion Engine:",
+            [engine for engine in FUSION_ENGINES if engine != LAZY_ENGINE or polars_available()],
+            index=0,
+            help="Out-of-core merges on-disk hash buckets one at a time; "
+                 "Parallel merges the buckets in a process pool; "
+                 "Lazy runs the join as a multi-threaded Polars query (requires polars)"
+        )
+        fusion_workers = st.number_input(
+            "Parallel workers:",
+            min_value=1,
+            max_value=os.cpu_count() or 1,
+            value=os.cpu_count() or 1,
+            disabled=fusion_engine != "Parallel (process pool)"
+        )
+        
+        optimize_dtypes = st.checkbox(
+            "Optimize column types",
+            value=True,
+            help="Infer compact dtypes (categories, float32/int32, timestamps) to reduce memory"
+        )
+        use_arrow = st.checkbox(
+            "Use Arrow backend",
+            value=False,
+            disabled=not arrow_available(),
+            help="Parse with the pyarrow engine into Arrow-backed columns (requires pyarrow)"
+        )
+        read_options = {'optimize': optimize_dtypes, 'use_arrow': use_arrow}
         
         include_geojson = st.checkbox("Generate GeoJSON Output", value=True)
+        compact_geojson = st.checkbox(
+            "Compact GeoJSON (no indentation)",
+            value=False,
+            disabled=not include_geojson,
+            help="Smaller GeoJSON download without whitespace"
+        )
+        aggregation_scheme = st.selectbox(
+            "Aggregated GeoJSON:",
+            ["Off"] + list(AGGREGATION_SCHEMES),
+            index=0,
+            help="Per-cell point counts and mean/min/max of numeric columns; "
+                 "far smaller than one feature per point"
+        )
+        if aggregation_scheme == "Grid":
+            aggregation_resolution = st.number_input(
+                "Grid cell size (degrees):",
+                min_value=0.0001,
+                value=AGGREGATION_SCHEMES["Grid"],
+                step=0.005,
+                format="%.4f"
+            )
+        else:
+            aggregation_resolution = st.number_input(
+                "Quadkey zoom level:",
+                min_value=0,
+                max_value=MAX_ZOOM,
+                value=AGGREGATION_SCHEMES["Quadkey"],
+                disabled=aggregation_scheme == "Off"
+            )
+        tile_pyramid = st.checkbox(
+            "Tile pyramid (zip)",
+            value=False,
+            help="Aggregated GeoJSON tiles {z}/{x}/{y}.geojson for map tooling"
+        )
+        pyramid_zooms = st.slider(
+            "Pyramid zoom levels:",
+            min_value=0,
+            max_value=MAX_ZOOM - TILE_DETAIL,
+            value=DEFAULT_PYRAMID_ZOOMS,
+            disabled=not tile_pyramid
+        )
+        columnar_formats = st.multiselect(
+            "Columnar Exports:",
+            list(COLUMNAR_FORMATS),
+            default=[],
+            help="Parquet for the merged table; GeoParquet/FlatGeobuf for the point geometries"
+        )
+        parquet_compression = st.selectbox(
+            "Parquet Compression:",
+            PARQUET_COMPRESSIONS,
+            index=0,
+            disabled=not columnar_formats
+        )
+        
+        # Coordinates of the map exports: detected and read as WGS84 degrees unless set here
+        st.markdown("### 📍 Coordinates")
+        lat_override = st.text_input(
+            "Latitude column:",
+            value="",
+            placeholder="auto-detect",
+            help="Column of latitudes (or projected y); blank to detect lat/latitude columns"
+        )
+        lon_override = st.text_input(
+            "Longitude column:",
+            value="",
+            placeholder="auto-detect",
+            help="Column of longitudes (or projected x); blank to detect lon/lng/longitude columns"
+        )
+        source_crs = st.text_input(
+            "Source CRS:",
+            value="",
+            placeholder="EPSG:4326",
+            help="CRS of the coordinate columns, e.g. EPSG:3857; reprojected to WGS84 for the map exports"
+        )
+        dedupe_points = st.checkbox(
+            "Drop repeated rows",
+            value=False,
+            help="Leave rows repeating an earlier row in every column out of the map exports"
+        )
+        coordinate_options = {'lat_col': lat_override.strip() or None, 'lon_col': lon_override.strip() or None,
+                              'source_crs': source_crs.strip() or None, 'dedupe': dedupe_points}
+        
+        # Join budget: joins estimated above it are refused
+        st.markdown("### 🛡️ Join Budget")
+        max_output_rows = st.number_input(
+            "Max output rows:",
+            min_value=1,
+            value=DEFAULT_MAX_OUTPUT_ROWS,
+            step=1_000_000
+        )
+        max_output_gb = st.number_input(
+            "Max output memory (GB):",
+            min_value=0.1,
+            value=DEFAULT_MAX_OUTPUT_BYTES / 1e9,
+            step=1.0
+        )
+        allow_over_budget = st.checkbox(
+            "Allow joins over budget",
+            value=False,
+            help="Run joins whose estimated output exceeds the budget anyway"
+        )
+        
+        # Parse cache statistics, filled in once the uploads are parsed
+        st.markdown("### 🗃️ Parse Cache")
+        cache_stats = st.empty()
+        
+        job_stats = jobs.stats()
+        st.markdown("### 🧵 Background Jobs")
+        st.caption(f"Running: {job_stats['running']}/{job_stats['max_workers']} | "
+                   f"Queued: {job_stats['queued']}")
+        
+        store_stats = store.stats()
+        st.markdown("### 💽 Shared Results")
+        st.caption(f"Hits: {store_stats['hits']} | Misses: {store_stats['misses']} | "
+                   f"Stored: {store_stats['entries']} results, {store_stats['bytes'] / 1e6:.1f} MB "
+                   f"of {store_stats['max_bytes'] / 1e9:.1f} GB")
+        
+        # Stage timings of recent runs, filled in at the end of the page
+        st.markdown("### 🩺 Diagnostics")
+        diagnostics = st.checkbox("Show stage timings", value=False)
+        st.checkbox(
+            "Trace peak memory (slower)",
+            value=False,
+            key='trace_memory',
+            help="Record each stage's peak Python allocations with tracemalloc"
+        )
+        if not psutil_available():
+            st.caption("RSS is the process peak; install psutil for current RSS")
+        diagnostics_panel = st.container()
     
     # Main content area with modern interface
     st.markdown('<div class="section-header">📊 Data Upload</div>', unsafe_allow_html=True)
@@ -232,13 +413,21 @@ def main():
         
         if bms_file is not None:
             try:
-                bms_df = pd.read_csv(bms_file)
+                bms_df, bms_report, bms_hash = read_csv_cached(bms_file, upload_cache, **read_options)
                 st.success(f"✅ BMS file loaded successfully!")
                 st.info(f"📈 BMS Data: {len(bms_df)} rows, {len(bms_df.columns)} columns")
+                st.caption(
+                    f"💾 Memory: {bms_report['before_bytes'] / 1e6:.1f} MB → "
+                    f"{bms_report['after_bytes'] / 1e6:.1f} MB ({bms_report['engine']} engine)"
+                )
                 
                 # Show preview
                 with st.expander("🔍 BMS Data Preview"):
                     st.dataframe(bms_df.head(10))
+                    if bms_report['dtypes']:
+                        st.caption("Optimized types: " + ", ".join(
+                            f"{col} → {dtype}" for col, dtype in bms_report['dtypes'].items()
+                        ))
                     
             except Exception as e:
                 st.error(f"❌ Error loading BMS file: {str(e)}")
@@ -268,23 +457,58 @@ def main():
             label_visibility="collapsed"
         )
         
+        road_reference = None
         if road_file is not None:
             try:
-                road_df = pd.read_csv(road_file)
+                road_key = source_key(content_hash(road_file), **read_options)
+                road_report = None
+                if not (use_road_reference and road_store.is_current(scope_number, road_key)):
+                    road_df, road_report, road_hash = read_csv_cached(road_file, upload_cache, **read_options)
+                    if use_road_reference:
+                        road_store.put(scope_number, road_df, road_key)
+                if use_road_reference:
+                    road_reference = road_store.reference(scope_number)
+                    road_df, road_hash = road_reference.frame, road_reference.digest
                 st.success(f"✅ Road file loaded successfully!")
                 st.info(f"📈 Road Data: {len(road_df)} rows, {len(road_df.columns)} columns")
+                if road_report is None:
+                    st.caption(f"💽 Using the stored road table of scope {scope_number} (parsed once for "
+                               f"every session)")
+                else:
+                    st.caption(
+                        f"💾 Memory: {road_report['before_bytes'] / 1e6:.1f} MB → "
+                        f"{road_report['after_bytes'] / 1e6:.1f} MB ({road_report['engine']} engine)"
+                    )
                 
                 # Show preview
                 with st.expander("🔍 Road Data Preview"):
                     st.dataframe(road_df.head(10))
+                    if road_report is not None and road_report['dtypes']:
+                        st.caption("Optimized types: " + ", ".join(
+                            f"{col} → {dtype}" for col, dtype in road_report['dtypes'].items()
+                        ))
                     
             except Exception as e:
                 st.error(f"❌ Error loading Road file: {str(e)}")
                 road_df = None
+        elif use_road_reference and road_manifest is not None:
+            road_reference = road_store.reference(scope_number)
+            road_df, road_hash = road_reference.frame, road_reference.digest
+            st.success(f"✅ Using the stored road table of scope {scope_number}")
+            st.info(f"📈 Road Data: {len(road_df)} rows, {len(road_df.columns)} columns")
+            st.caption("💽 Upload a changed road file to replace it")
+            with st.expander("🔍 Road Data Preview"):
+                st.dataframe(road_df.head(10))
         else:
             road_df = None
             st.markdown('<div class="file-info-box">📁 Please upload a CSV file</div>', unsafe_allow_html=True)
     
+    stats = upload_cache.stats()
+    cache_stats.caption(
+        f"Hits: {stats['hits']} | Misses: {stats['misses']} | "
+        f"Cached: {stats['entries']} files, {stats['bytes'] / 1e6:.1f} MB"
+    )
+    
     # Data Processing Section
     if bms_df is not None and road_df is not None:
         st.markdown('<div class="section-header">🔄 Data Processing</div>', unsafe_allow_html=True)
@@ -313,128 +537,331 @@ def main():
             </div>
             """, unsafe_allow_html=True)
         
-        # Find common columns for merging
-        common_columns = set(bms_df.columns) & set(road_df.columns)
+        # Find common columns for merging, once per pair of uploads
+        if st.session_state.get('common_columns_key') != (bms_hash, road_hash):
+            st.session_state['common_columns'] = common_join_columns(bms_df, road_df)
+            st.session_state['common_columns_key'] = (bms_hash, road_hash)
+        common_columns = st.session_state['common_columns']
         if common_columns:
             st.info(f"🔗 Common columns found: {', '.join(common_columns)}")
         else:
             st.warning("⚠️ No common columns found between datasets")
         
+        # Plan key-based joins before running them
+        join_keys = None
+        plan = None
+        if merge_strategy in MERGE_STRATEGIES:
+            join_keys = st.multiselect(
+                "Join keys:",
+                common_columns,
+                default=common_columns,
+                help="Columns that must match on both sides; fewer, more selective keys are safer"
+            )
+            plan_key = (bms_hash, road_hash, tuple(join_keys), merge_strategy,
+                        int(max_output_rows), max_output_gb)
+            if st.session_state.get('join_plan_key') != plan_key:
+                with stage("plan", rows_in=len(bms_df) + len(road_df)) as record:
+                    st.session_state['join_plan'] = plan_join(bms_df, road_df, join_keys, merge_strategy,
+                                                              int(max_output_rows), int(max_output_gb * 1e9))
+                    record["rows_out"] = st.session_state['join_plan']['estimated_rows']
+                st.session_state['join_plan_key'] = plan_key
+            plan = st.session_state['join_plan']
+            if plan['estimated_rows'] is not None:
+                st.info(f"📐 Estimated output: {plan['estimated_rows']:,} rows "
+                        f"(~{plan['estimated_bytes'] / 1e6:.1f} MB) • {plan['relationship']} keys • "
+                        f"{plan['distinct_keys'][0]:,} / {plan['distinct_keys'][1]:,} distinct")
+            if plan['changes']:
+                st.caption(f"🔧 Normalized key types: {'; '.join(plan['changes'])}")
+            for warning in plan['warnings']:
+                st.warning(f"⚠️ {warning}")
+        over_budget = plan is not None and not plan['within_budget']
+        if over_budget and plan['estimated_rows'] is not None:
+            if allow_over_budget:
+                st.warning("⚠️ Running over budget as allowed in the sidebar")
+            else:
+                st.error("🛑 Join refused: over budget. Select more selective keys or tick "
+                         "'Allow joins over budget' in the sidebar.")
+        
+        asof_by = asof_left_time = asof_right_time = None
+        if merge_strategy == ASOF_STRATEGY:
+            time_col1, time_col2 = st.columns(2)
+            with time_col1:
+                asof_left_time = time_column_select("BMS time column:", bms_df)
+            with time_col2:
+                asof_right_time = time_column_select("Road time column:", road_df)
+            asof_group = st.selectbox(
+                "Match within groups of:",
+                ["(none)"] + sorted(common_columns),
+                help="Only match records sharing this value, e.g. a vehicle or segment id"
+            )
+            asof_by = None if asof_group == "(none)" else asof_group
+        
         # Merge button
-        if st.button("🔗 Combine CSV Files", type="primary", use_container_width=True):
-            with st.spinner("Processing data fusion..."):
-                try:
-                    # Add metadata columns
-                    bms_df_processed = bms_df.copy()
-                    road_df_processed = road_df.copy()
-                    
-                    bms_df_processed['data_source'] = 'BMS'
-                    bms_df_processed['scope'] = scope_number
-                    bms_df_processed['processing_date'] = selected_date
-                    
-                    road_df_processed['data_source'] = 'Road'
-                    road_df_processed['scope'] = scope_number
-                    road_df_processed['processing_date'] = selected_date
-                    
-                    # Perform merge based on strategy
-                    if merge_strategy == "Inner Join":
-                        merged_df = pd.merge(bms_df_processed, road_df_processed, 
-                                           on=list(common_columns), how='inner')
-                    elif merge_strategy == "Left Join":
-                        merged_df = pd.merge(bms_df_processed, road_df_processed, 
-                                           on=list(common_columns), how='left')
-                    elif merge_strategy == "Right Join":
-                        merged_df = pd.merge(bms_df_processed, road_df_processed, 
-                                           on=list(common_columns), how='right')
-                    else:  # Outer Join
-                        merged_df = pd.merge(bms_df_processed, road_df_processed, 
-                                           on=list(common_columns), how='outer')
-                    
-                    # Store in session state
-                    st.session_state['merged_data'] = merged_df
-                    st.session_state['bms_data'] = bms_df_processed
-                    st.session_state['road_data'] = road_df_processed
-                    
-                    st.success(f"✅ Data fusion completed! {len(merged_df)} records created")
-                    
-                except Exception as e:
-                    st.error(f"❌ Error during data fusion: {str(e)}")
+        running_job = current_job(jobs)
+        if st.button("🔗 Combine CSV Files", type="primary", use_container_width=True,
+                     disabled=(running_job is not None and not running_job.done)
+                     or (over_budget and not (allow_over_budget and join_keys))):
+            fusion_options = dict(engine=fusion_engine, workers=int(fusion_workers), max_distance_m=max_distance_m,
+                                  asof_by=asof_by, asof_tolerance_s=asof_tolerance_s, on=join_keys,
+                                  road_reference=road_reference)
+            if merge_strategy == ASOF_STRATEGY:
+                fusion_options.update(asof_left_time=asof_left_time, asof_right_time=asof_right_time)
+            if (fusion_engine in (LAZY_ENGINE, OUT_OF_CORE_ENGINE) and merge_strategy in MERGE_STRATEGIES
+                    and not incremental):
+                # Scan or chunk the uploaded CSVs themselves rather than the parsed frames
+                road_source = road_df if road_reference is not None else road_file.getvalue()
+                fusion_options.update(sources=(bms_file.getvalue(), road_source),
+                                      optimize=read_options['optimize'])
+            if incremental:
+                # The history changes with every run, so never reuse an earlier result
+                fusion_key = ('incremental', scope_number, selected_date, uuid.uuid4().hex)
+            else:
+                fusion_key = (bms_hash, road_hash, scope_number, selected_date,
+                              merge_strategy, include_geojson, fusion_engine, max_distance_m,
+                              asof_by, asof_tolerance_s, asof_left_time, asof_right_time,
+                              None if join_keys is None else tuple(join_keys))
+            result = None if incremental else results_cache.get(fusion_key)
+            if result is None and not incremental:
+                # Computed earlier by any session: reference the shared frame
+                stored = store.get(fusion_key)
+                if stored is not None:
+                    result = results_cache.put(fusion_key, FusionResult(*stored))
+            
+            if result is not None:
+                store_result(fusion_key, result)
+                st.success(f"✅ Data fusion completed! {result.summary['rows']} records created")
+            else:
+                # Merge and pre-build the exports in the background
+                job_run = Run("incremental" if incremental else "fusion",
+                              trace_memory=st.session_state.get('trace_memory', False),
+                              scope=scope_number, date=str(selected_date), strategy=merge_strategy,
+                              engine=fusion_engine)
+                if incremental:
+                    job = jobs.submit(
+                        f"Scope {scope_number} / {selected_date} (incremental)", incremental_job,
+                        history, bms_df, road_df, scope_number, selected_date, merge_strategy,
+                        include_geojson, compact_geojson, job_run, key=fusion_key,
+                        coordinate_options=coordinate_options, **fusion_options
+                    )
+                else:
+                    job = jobs.submit(
+                        f"Scope {scope_number} / {selected_date}", fusion_job,
+                        bms_df, road_df, scope_number, selected_date, merge_strategy,
+                        include_geojson, compact_geojson, store, job_run, key=fusion_key,
+                        coordinate_options=coordinate_options, **fusion_options
+                    )
+                st.session_state.setdefault('job_runs', {})[job.id] = job_run
+                st.session_state['fusion_job_id'] = job.id
+                st.query_params['job'] = job.id
+    
+    # Background fusion job of this session
+    job = current_job(jobs)
+    if job is not None:
+        if not job.done:
+            show_job_progress(job, jobs)
+        else:
+            forget_job(jobs, job.id)
+            job_run = st.session_state.get('job_runs', {}).pop(job.id, None)
+            if job_run is not None:
+                remember_run(job_run.record())
+            if job.status == DONE:
+                results_cache.put(job.key, job.result)
+                store_result(job.key, job.result)
+                timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in job.stage_seconds.items())
+                st.success(f"✅ Data fusion completed! {job.result.summary['rows']} records created")
+                report = job.result.summary.get('incremental')
+                if report is not None:
+                    st.info(f"➕ {report['delta_rows']:,} new BMS rows fused, {report['skipped_rows']:,} already "
+                            f"fused • history: {report['history_rows']:,} rows in {report['partitions']} "
+                            f"date partition(s)")
+                    if report['rebuilt']:
+                        st.warning("⚠️ The road table or settings changed: the scope's history was rebuilt")
+                st.caption(f"⏱️ {timings}")
+            elif job.status == CANCELLED:
+                st.warning(f"🛑 {job.label}: fusion cancelled")
+            else:
+                st.error(f"❌ Error during data fusion: {job.error}")
     
     # Results and Download Section
     if 'merged_data' in st.session_state:
         st.markdown('<div class="section-header">📥 Download Results</div>', unsafe_allow_html=True)
         
         merged_df = st.session_state['merged_data']
+        fusion_key = st.session_state.get('fusion_key')
+        result = results_cache.get(fusion_key)
+        if result is None:
+            # Evicted from the cache: re-register so exports are memoized again
+            result = results_cache.put(
+                fusion_key, FusionResult(merged_df, st.session_state.get('fusion_summary'))
+            )
+        summary = result.summary
         
-        # Show results summary in cards
+        # Show results summary in cards (precomputed at fusion time)
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.markdown(f"""
             <div class="metric-card">
                 <h3>Total Records</h3>
-                <h2 style="color: #1f77b4;">{len(merged_df)}</h2>
+                <h2 style="color: #1f77b4;">{summary['rows']}</h2>
             </div>
             """, unsafe_allow_html=True)
         with col2:
             st.markdown(f"""
             <div class="metric-card">
                 <h3>Total Columns</h3>
-                <h2 style="color: #1f77b4;">{len(merged_df.columns)}</h2>
+                <h2 style="color: #1f77b4;">{summary['columns']}</h2>
             </div>
             """, unsafe_allow_html=True)
         with col3:
             st.markdown(f"""
             <div class="metric-card">
                 <h3>BMS Records</h3>
-                <h2 style="color: #1f77b4;">{len(merged_df[merged_df['data_source'] == 'BMS'])}</h2>
+                <h2 style="color: #1f77b4;">{summary['sources']['BMS']}</h2>
             </div>
             """, unsafe_allow_html=True)
         with col4:
             st.markdown(f"""
             <div class="metric-card">
                 <h3>Road Records</h3>
-                <h2 style="color: #1f77b4;">{len(merged_df[merged_df['data_source'] == 'Road'])}</h2>
+                <h2 style="color: #1f77b4;">{summary['sources']['Road']}</h2>
             </div>
             """, unsafe_allow_html=True)
         
         # Show merged data preview
         with st.expander("🔍 Merged Data Preview"):
-            st.dataframe(merged_df.head(20))
+            st.dataframe(summary['preview'])
+        
+        with st.expander("📊 Column Summary"):
+            st.caption(f"💾 In memory: {summary['memory_bytes'] / 1e6:.1f} MB")
+            st.dataframe(column_stats_frame(summary))
         
         # Download buttons
         col1, col2 = st.columns(2)
         
         with col1:
-            # CSV Download
-            csv_buffer = io.StringIO()
-            merged_df.to_csv(csv_buffer, index=False)
-            csv_data = csv_buffer.getvalue()
+            # CSV Download, streamed in chunks into a spooled temp file
+            result.artifact(
+                CSV_ARTIFACT, lambda: spool_chunks(iter_csv_chunks(merged_df))
+            )
+            results_cache.refresh(fusion_key)
             
             st.download_button(
                 label="📊 Download CSV",
-                data=csv_data,
+                data=export_data(result, CSV_ARTIFACT),
                 file_name=f"merged_data_{scope_number}_{selected_date}.csv",
                 mime="text/csv",
                 use_container_width=True
             )
+            show_export_info(result, CSV_ARTIFACT)
         
         with col2:
             if include_geojson:
                 # GeoJSON Download
                 try:
-                    # Create GeoJSON from merged data
-                    geojson_data = create_geojson_from_data(merged_df, scope_number)
+                    # Stream GeoJSON features from merged data
+                    points = result.points(coordinate_options)
+                    name = geojson_artifact(scope_number, compact_geojson, coordinate_options)
+                    result.artifact(
+                        name,
+                        lambda: spool_chunks(
+                            iter_geojson_chunks(merged_df, scope_number, compact=compact_geojson, points=points)
+                        )
+                    )
+                    results_cache.refresh(fusion_key)
                     
                     st.download_button(
                         label="🗺️ Download GeoJSON",
-                        data=json.dumps(geojson_data, indent=2),
+                        data=export_data(result, name),
                         file_name=f"merged_data_{scope_number}_{selected_date}.geojson",
                         mime="application/json",
                         use_container_width=True
                     )
+                    show_export_info(result, name)
+                    show_points_report(points.report)
                 except Exception as e:
                     st.error(f"❌ Error creating GeoJSON: {str(e)}")
-                    st.info("💡 GeoJSON creation requires coordinate columns (lat, lon or latitude, longitude)")
+                    st.info("💡 GeoJSON creation requires coordinate columns (lat, lon or latitude, longitude); "
+                            "set them and their CRS under 📍 Coordinates")
+        
+        # Columnar downloads
+        if columnar_formats:
+            for export_format, col in zip(columnar_formats, st.columns(len(columnar_formats))):
+                extension, mime = COLUMNAR_FORMATS[export_format]
+                name = (export_format, parquet_compression)
+                with col:
+                    try:
+                        points = None
+                        if export_format != "Parquet":
+                            points = result.points(coordinate_options)
+                            name += coordinate_key(coordinate_options)
+                        result.artifact(
+                            name, lambda: columnar_file(merged_df, export_format, parquet_compression, points)
+                        )
+                        results_cache.refresh(fusion_key)
+                        
+                        st.download_button(
+                            label=f"🧱 Download {export_format}",
+                            data=export_data(result, name),
+                            file_name=f"merged_data_{scope_number}_{selected_date}{extension}",
+                            mime=mime,
+                            use_container_width=True
+                        )
+                        show_export_info(result, name)
+                    except Exception as e:
+                        st.error(f"❌ Error creating {export_format}: {str(e)}")
+        
+        # Spatially aggregated downloads
+        if aggregation_scheme != "Off" or tile_pyramid:
+            col1, col2 = st.columns(2)
+            if aggregation_scheme != "Off":
+                with col1:
+                    try:
+                        points = result.points(coordinate_options)
+                        name = ('aggregated', scope_number, aggregation_scheme, aggregation_resolution,
+                                compact_geojson) + coordinate_key(coordinate_options)
+                        result.artifact(name, lambda: spool_chunks(iter_aggregated_geojson_chunks(
+                            merged_df, scope_number, aggregation_scheme, aggregation_resolution,
+                            compact=compact_geojson, points=points
+                        )))
+                        results_cache.refresh(fusion_key)
+                        
+                        st.download_button(
+                            label="🧮 Download Aggregated GeoJSON",
+                            data=export_data(result, name),
+                            file_name=f"merged_data_{scope_number}_{selected_date}_cells.geojson",
+                            mime="application/json",
+                            use_container_width=True
+                        )
+                        show_export_info(result, name)
+                    except Exception as e:
+                        st.error(f"❌ Error aggregating points: {str(e)}")
+            if tile_pyramid:
+                with col2:
+                    try:
+                        points = result.points(coordinate_options)
+                        name = ('tiles', scope_number, tuple(pyramid_zooms)) + coordinate_key(coordinate_options)
+                        result.artifact(
+                            name, lambda: tile_pyramid_file(merged_df, scope_number, *pyramid_zooms, points=points)
+                        )
+                        results_cache.refresh(fusion_key)
+                        
+                        st.download_button(
+                            label="🗂️ Download Tile Pyramid",
+                            data=export_data(result, name),
+                            file_name=f"merged_data_{scope_number}_{selected_date}_tiles.zip",
+                            mime="application/zip",
+                            use_container_width=True
+                        )
+                        show_export_info(result, name)
+                    except Exception as e:
+                        st.error(f"❌ Error building tiles: {str(e)}")
+    
+    if run.stages:
+        run.finish()
+        remember_run(run.log())
+    if diagnostics:
+        with diagnostics_panel:
+            show_diagnostics()
     
     # Footer
     st.markdown(f"""
@@ -444,59 +871,5 @@ def main():
     </div>
     """, unsafe_allow_html=True)
 
-def create_geojson_from_data(df, scope_number):
-    """Create GeoJSON from DataFrame with coordinate columns"""
-    features = []
-    
-    # Try to find coordinate columns
-    lat_cols = [col for col in df.columns if 'lat' in col.lower()]
-    lon_cols = [col for col in df.columns if 'lon' in col.lower() or 'lng' in col.lower()]
-    
-    if not lat_cols or not lon_cols:
-        # If no coordinate columns, create a simple GeoJSON with metadata
-        return {
-            "type": "FeatureCollection",
-            "name": f"merged_data_{scope_number}",
-            "features": [{
-                "type": "Feature",
-                "properties": {
-                    "scope": scope_number,
-                    "total_records": len(df),
-                    "description": "Merged dataset without spatial coordinates"
-                },
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [0, 0]  # Default coordinates
-                }
-            }]
-        }
-    
-    lat_col = lat_cols[0]
-    lon_col = lon_cols[0]
-    
-    for idx, row in df.iterrows():
-        try:
-            lat = float(row[lat_col])
-            lon = float(row[lon_col])
-            
-            if pd.notna(lat) and pd.notna(lon):
-                feature = {
-                    "type": "Feature",
-                    "properties": {col: row[col] for col in df.columns if col not in [lat_col, lon_col]},
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [lon, lat]
-                    }
-                }
-                features.append(feature)
-        except (ValueError, TypeError):
-            continue
-    
-    return {
-        "type": "FeatureCollection",
-        "name": f"merged_data_{scope_number}",
-        "features": features
-    }
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Headless batch runner for Data Fusion jobs (no Streamlit UI needed)
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from aggregation import AGGREGATION_SCHEMES
+from engine import DEFAULT_DATE, SCOPE_OPTIONS, run_job
+from exporters import COLUMNAR_FORMATS, PARQUET_COMPRESSIONS
+from fusion import ASOF_STRATEGY, FUSION_ENGINES, STRATEGY_OPTIONS
+from planner import DEFAULT_MAX_OUTPUT_BYTES, DEFAULT_MAX_OUTPUT_ROWS
+
+
+def parse_args(argv=None):
+    """Parse command-line options"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("bms_csv", help="Path to the BMS CSV file")
+    parser.add_argument("road_csv", nargs="?",
+                        help="Path to the Road CSV file (optional with --road-store once the scope's road "
+                             "table is stored)")
+    parser.add_argument("--scope", nargs="+", default=[SCOPE_OPTIONS[next(iter(SCOPE_OPTIONS))]],
+                        help="Scope numbers to process, or 'all' for every known scope")
+    parser.add_argument("--date", nargs="+", type=date.fromisoformat, default=[DEFAULT_DATE],
+                        help="Processing dates (YYYY-MM-DD)")
+    parser.add_argument("--strategy", choices=STRATEGY_OPTIONS, default=STRATEGY_OPTIONS[0],
+                        help="Merge strategy")
+    parser.add_argument("--engine", choices=FUSION_ENGINES, default=FUSION_ENGINES[0],
+                        help="Fusion engine")
+    parser.add_argument("--keys", nargs="+",
+                        help="Join key columns (default: every column shared by both files)")
+    parser.add_argument("--asof-left-time",
+                        help="BMS timestamp column of the as-of join (default: detected)")
+    parser.add_argument("--asof-right-time",
+                        help="Road timestamp column of the as-of join (default: detected)")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_OUTPUT_ROWS,
+                        help="Refuse joins estimated to produce more rows than this")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_OUTPUT_BYTES,
+                        help="Refuse joins estimated to need more memory than this")
+    parser.add_argument("--allow-over-budget", action="store_true",
+                        help="Run joins even when their estimate exceeds the budget")
+    parser.add_argument("--columns", nargs="+",
+                        help="Only keep these input columns (join keys are always kept)")
+    parser.add_argument("--history-dir",
+                        help="Incremental mode: fuse only BMS rows not fused for the scope yet and append "
+                             "them to the history kept in this directory")
+    parser.add_argument("--road-store",
+                        help="Keep each scope's parsed road table and its indexes in this directory; an "
+                             "unchanged road CSV is not parsed again")
+    parser.add_argument("--output-dir", default="output", help="Directory for the exports")
+    parser.add_argument("--no-geojson", action="store_true", help="Skip the GeoJSON export")
+    parser.add_argument("--compact-geojson", action="store_true", help="Write non-indented GeoJSON")
+    parser.add_argument("--aggregate", choices=list(AGGREGATION_SCHEMES),
+                        help="Also write a GeoJSON of per-cell counts and stats")
+    parser.add_argument("--resolution", type=float,
+                        help="Quadkey zoom level or grid cell size in degrees for --aggregate "
+                             f"(default: {', '.join(f'{k} {v}' for k, v in AGGREGATION_SCHEMES.items())})")
+    parser.add_argument("--pyramid", type=int, nargs=2, metavar=("MIN_ZOOM", "MAX_ZOOM"),
+                        help="Also write a zip of aggregated GeoJSON tiles for these zoom levels")
+    parser.add_argument("--lat-col", help="Latitude (or projected y) column of the map exports (default: detected)")
+    parser.add_argument("--lon-col", help="Longitude (or projected x) column of the map exports (default: detected)")
+    parser.add_argument("--source-crs",
+                        help="CRS of the coordinate columns, e.g. EPSG:3857; reprojected to WGS84 for the map "
+                             "exports (default: WGS84 degrees)")
+    parser.add_argument("--dedupe-points", action="store_true",
+                        help="Leave rows repeating an earlier row out of the map exports")
+    parser.add_argument("--columnar", choices=list(COLUMNAR_FORMATS), nargs="+", default=[],
+                        help="Additional columnar export formats")
+    parser.add_argument("--compression", choices=PARQUET_COMPRESSIONS, default="snappy",
+                        help="Parquet/GeoParquet compression codec")
+    parser.add_argument("--arrow", action="store_true", help="Parse CSVs with the pyarrow engine")
+    parser.add_argument("--jobs", type=int, default=1, help="Jobs to run concurrently")
+    args = parser.parse_args(argv)
+    if args.road_csv is None and args.road_store is None:
+        parser.error("road_csv is required without --road-store")
+    return args
+
+
+def expand_scopes(scopes):
+    """Resolve 'all' to every known scope number"""
+    if "all" in scopes:
+        return list(SCOPE_OPTIONS.values())
+    return scopes
+
+
+def main(argv=None):
+    """Run every scope/date combination, concurrently when --jobs > 1"""
+    args = parse_args(argv)
+    jobs = [(scope, selected_date) for scope in expand_scopes(args.scope) for selected_date in args.date]
+    job_options = {
+        "output_dir": args.output_dir,
+        "merge_strategy": args.strategy,
+        "include_geojson": not args.no_geojson,
+        "compact_geojson": args.compact_geojson,
+        "aggregation_scheme": args.aggregate,
+        "aggregation_resolution": args.resolution,
+        "pyramid_zooms": args.pyramid,
+        "columnar_formats": args.columnar,
+        "parquet_compression": args.compression,
+        "use_arrow": args.arrow,
+        "engine": args.engine,
+        "columns": args.columns,
+        "on": args.keys,
+        "max_rows": args.max_rows,
+        "max_bytes": args.max_bytes,
+        "allow_over_budget": args.allow_over_budget,
+        "history_dir": args.history_dir,
+        "road_store_dir": args.road_store,
+        "coordinate_options": {"lat_col": args.lat_col, "lon_col": args.lon_col,
+                               "source_crs": args.source_crs, "dedupe": args.dedupe_points},
+    }
+
+    if args.strategy == ASOF_STRATEGY:
+        job_options.update(asof_left_time=args.asof_left_time, asof_right_time=args.asof_right_time)
+
+    if args.history_dir:
+        # Append each scope's days in date order, without interleaving updates
+        jobs.sort(key=lambda job: job[1])
+        if args.jobs > 1:
+            print("⚠️ Incremental mode runs jobs one at a time")
+            args.jobs = 1
+    print(f"🔗 Running {len(jobs)} fusion job(s) with {args.jobs} worker(s)")
+    print("-" * 50)
+    started = time.perf_counter()
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(run_job, args.bms_csv, args.road_csv, scope, selected_date, **job_options):
+                (scope, selected_date)
+            for scope, selected_date in jobs
+        }
+        for future in as_completed(futures):
+            scope, selected_date = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"❌ Scope {scope} / {selected_date}: {e}")
+                continue
+            print(f"✅ Scope {scope} / {selected_date}: {summary['merged_rows']:,} rows in "
+                  f"{summary['total_seconds']:.2f}s → {', '.join(summary['outputs'].values())}")
+            points = summary['points']
+            if points is not None and (points['lat_col'] is None or points['lon_col'] is None):
+                print("   📍 No coordinate columns found for the map exports")
+            elif points is not None:
+                print(f"   📍 {points['points']:,} points from {points['lat_col']}/{points['lon_col']}; "
+                      f"rejected: {points['missing']:,} missing, {points['out_of_range']:,} out of range, "
+                      f"{points['duplicates']:,} duplicates")
+            report = summary['incremental']
+            if report is not None:
+                print(f"   ➕ {report['delta_rows']:,} new BMS rows fused, {report['skipped_rows']:,} already fused; "
+                      f"history: {report['history_rows']:,} rows in {report['partitions']} partition(s)"
+                      + (" (rebuilt: road table or settings changed)" if report['rebuilt'] else ""))
+
+    elapsed = time.perf_counter() - started
+    print("-" * 50)
+    print(f"⏱️  {len(jobs) - failures}/{len(jobs)} job(s) in {elapsed:.2f}s "
+          f"({len(jobs) / elapsed:.2f} jobs/s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
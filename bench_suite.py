@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: time and peak memory of the hot paths at fixed sizes,
+with stored baselines to detect regressions
+
+    python bench_suite.py --rows 10000 100000 --save-baseline
+    python bench_suite.py --rows 10000 100000 --compare
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from engine import fuse
+from exporters import (iter_aggregated_geojson_chunks, iter_csv_chunks, iter_geojson_chunks, spool_chunks,
+                       tile_pyramid_file)
+from fusion import MERGE_STRATEGIES, NEAREST_ROAD_STRATEGY, asof_join
+from geojson_builder import PointCoordinates, create_geojson_from_data
+from ingestion import read_csv_typed
+from road_reference import RoadReferenceStore
+from spatial import nearest_road_join
+from synthetic import make_bms_frame, make_road_frame, make_road_lines, make_timed_inputs, write_csv
+
+# Input sizes of the suite
+SUITE_ROWS = [10_000, 100_000, 1_000_000, 10_000_000]
+# Default baseline file
+DEFAULT_BASELINE = "bench_baseline.json"
+# Relative slowdown or memory growth reported as a regression
+DEFAULT_TOLERANCE = 0.2
+# Time differences below this are treated as noise
+MIN_SECONDS_DELTA = 0.005
+# Timing runs are repeated (best run kept) for inputs up to this size
+REPEAT_MAX_ROWS = 100_000
+REPEATS = 3
+
+
+def setup_ingest(rows, tmp_dir):
+    """Write a synthetic BMS CSV to parse"""
+    return (write_csv(make_bms_frame(rows), tmp_dir, "bms.csv"),)
+
+
+def setup_join(rows, tmp_dir):
+    """Build the BMS/road frames joined on vehicle_id"""
+    return make_bms_frame(rows).drop(columns="data_source"), make_road_frame().drop(columns="data_source")
+
+
+def setup_spatial(rows, tmp_dir):
+    """Build BMS points and WKT road segments"""
+    return make_bms_frame(rows), make_road_lines()
+
+
+def setup_road_reference(rows, tmp_dir, road_df):
+    """Build BMS rows and store a road table as a scope's road reference"""
+    bms_df = make_bms_frame(rows)
+    reference = RoadReferenceStore(os.path.join(tmp_dir, "roads")).put("403825", road_df, "bench")
+    return bms_df, reference
+
+
+def setup_indexed_join(rows, tmp_dir):
+    """Build BMS rows and a stored road reference with its vehicle_id index"""
+    bms_df, reference = setup_road_reference(rows, tmp_dir, make_road_frame().drop(columns="data_source"))
+    bms_df = bms_df.drop(columns="data_source")
+    reference.key_index(["vehicle_id"])
+    return bms_df, reference
+
+
+def setup_indexed_spatial(rows, tmp_dir):
+    """Build BMS points and a stored road reference with its STRtree"""
+    bms_df, reference = setup_road_reference(rows, tmp_dir, make_road_lines())
+    indexed_join_case(NEAREST_ROAD_STRATEGY)(bms_df.head(1), reference)
+    return bms_df, reference
+
+
+def setup_asof(rows, tmp_dir):
+    """Build time-stamped BMS readings and road events"""
+    return make_timed_inputs(rows)
+
+
+def setup_export(rows, tmp_dir):
+    """Build the frame to export"""
+    return (make_bms_frame(rows),)
+
+
+def setup_repeated(rows, tmp_dir):
+    """Build the frame to export with a tenth of its rows repeated"""
+    df = make_bms_frame(rows)
+    return (pd.concat([df, df.sample(frac=0.1, random_state=0)], ignore_index=True),)
+
+
+def setup_projected(rows, tmp_dir):
+    """Build the frame to export with Web Mercator coordinates"""
+    from pyproj import Transformer
+
+    df = make_bms_frame(rows)
+    x, y = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True).transform(
+        df["longitude"].to_numpy(), df["latitude"].to_numpy())
+    return (df.assign(latitude=y, longitude=x),)
+
+
+def join_case(merge_strategy):
+    """Return a case running fuse() with one merge strategy"""
+    def run(bms_df, road_df):
+        return fuse(bms_df, road_df, "403825", date(2025, 9, 29), merge_strategy)
+    return run
+
+
+def indexed_join_case(merge_strategy):
+    """Return a case running fuse() against a stored road reference"""
+    def run(bms_df, reference):
+        return fuse(bms_df, reference.frame, "403825", date(2025, 9, 29), merge_strategy,
+                    road_reference=reference)
+    return run
+
+
+# name -> (setup, run, max rows or None); run(*setup(rows, tmp_dir)) is measured
+CASES = {
+    "ingest.read_csv": (setup_ingest, pd.read_csv, None),
+    "ingest.read_csv_typed": (setup_ingest, read_csv_typed, None),
+    **{f"join.{MERGE_STRATEGIES[strategy]}": (setup_join, join_case(strategy), None)
+       for strategy in MERGE_STRATEGIES},
+    "join.nearest_road": (setup_spatial, lambda bms_df, road_df: nearest_road_join(bms_df, road_df), None),
+    "join.indexed_inner": (setup_indexed_join, indexed_join_case("Inner Join"), None),
+    "join.indexed_left": (setup_indexed_join, indexed_join_case("Left Join"), None),
+    "join.indexed_nearest_road": (setup_indexed_spatial, indexed_join_case(NEAREST_ROAD_STRATEGY), None),
+    "join.asof": (setup_asof,
+                  lambda bms_df, road_df: asof_join(bms_df, road_df, "timestamp", "event_time"), None),
+    # The whole-payload builder holds every feature dict in memory
+    "geojson.build": (setup_export, lambda df: create_geojson_from_data(df, "403825"), 1_000_000),
+    "points.validate": (setup_export, PointCoordinates, None),
+    "points.dedupe": (setup_repeated, lambda df: PointCoordinates(df, dedupe=True), None),
+    "points.reproject": (setup_projected,
+                         lambda df: PointCoordinates(df, source_crs="EPSG:3857"), None),
+    "export.csv": (setup_export, lambda df: spool_chunks(iter_csv_chunks(df)).close(), None),
+    "export.geojson": (setup_export,
+                       lambda df: spool_chunks(iter_geojson_chunks(df, "403825")).close(), None),
+    "export.aggregated_geojson": (setup_export,
+                                  lambda df: spool_chunks(iter_aggregated_geojson_chunks(df, "403825")).close(),
+                                  None),
+    "export.tile_pyramid": (setup_export, lambda df: tile_pyramid_file(df, "403825").close(), None),
+}
+
+
+def measure(run, args, rows):
+    """Return (best seconds, peak traced bytes) of a case"""
+    repeats = REPEATS if rows <= REPEAT_MAX_ROWS else 1
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run(*args)
+        best = min(best, time.perf_counter() - started)
+
+    # Traced separately: tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    try:
+        run(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(rows_list, patterns):
+    """Run every selected case at every size and return {case@rows: result}"""
+    results = {}
+    for rows in rows_list:
+        print(f"📏 {rows:,} rows")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, (setup, run, max_rows) in CASES.items():
+                if not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    continue
+                if max_rows is not None and rows > max_rows:
+                    print(f"   {name:26} ⏭️  skipped above {max_rows:,} rows")
+                    continue
+                args = setup(rows, tmp_dir)
+                seconds, peak = measure(run, args, rows)
+                results[f"{name}@{rows}"] = {"seconds": seconds, "peak_bytes": peak}
+                print(f"   {name:26} {seconds:9.3f}s  {rows / seconds:14,.0f} rows/s  "
+                      f"peak {peak / 1e6:9.1f} MB")
+    return results
+
+
+def environment():
+    """Describe the machine and library versions a baseline was recorded on"""
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(results, path):
+    """Merge results into a baseline file, keeping cases that were not re-run"""
+    baseline = load_baseline(path) if os.path.exists(path) else {"results": {}}
+    baseline["environment"] = environment()
+    baseline["results"].update(results)
+    with open(path, "w") as handle:
+        json.dump(baseline, handle, indent=2, sort_keys=True)
+    print(f"💾 Saved {len(results)} result(s) to {path}")
+
+
+def load_baseline(path):
+    """Read a baseline file"""
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def compare(results, baseline, tolerance):
+    """Print each result against its baseline and return the regressed cases"""
+    regressions = []
+    print(f"📊 Against baseline recorded {baseline['environment']['created']} "
+          f"(tolerance {tolerance:.0%})")
+    for key, result in results.items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"   {key:32} 🆕 no baseline")
+            continue
+        time_ratio = result["seconds"] / base["seconds"] if base["seconds"] else 1.0
+        memory_ratio = result["peak_bytes"] / base["peak_bytes"] if base["peak_bytes"] else 1.0
+        slower = (time_ratio > 1 + tolerance
+                  and result["seconds"] - base["seconds"] > MIN_SECONDS_DELTA)
+        bigger = memory_ratio > 1 + tolerance
+        if slower or bigger:
+            regressions.append(key)
+        print(f"   {key:32} time {time_ratio:5.2f}x  memory {memory_ratio:5.2f}x  "
+              f"{'❌ regression' if slower or bigger else '✅'}")
+    return regressions
+
+
+def main(argv=None):
+    """Run the suite, then save and/or compare baselines"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=SUITE_ROWS[:2],
+                        help=f"Input sizes (suite sizes: {', '.join(f'{rows:,}' for rows in SUITE_ROWS)})")
+    parser.add_argument("--only", nargs="+", default=["*"],
+                        help="Case name patterns, e.g. 'join.*' (cases: " + ", ".join(CASES) + ")")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help="Store the results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE,
+                        help="Compare the results with a stored baseline; exit 1 on regressions, "
+                             "2 when the baseline file is missing")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative slowdown/memory growth tolerated before flagging a regression")
+    args = parser.parse_args(argv)
+    if args.compare and not os.path.exists(args.compare):
+        # Fail before spending minutes on a run that has nothing to compare with
+        print(f"❌ Baseline {args.compare} not found; record one on this machine first with "
+              f"--save-baseline {args.compare}")
+        return 2
+
+    print("⏱️  Data Fusion Application benchmark suite")
+    print("-" * 50)
+    results = run_suite(args.rows, args.only)
+    print("-" * 50)
+
+    regressions = []
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare), args.tolerance)
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Size-bounded caches for the Data Fusion Application
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from geojson_builder import PointCoordinates, coordinate_key
+from ingestion import read_csv_typed
+from instrumentation import stage
+from summary import summarize_frame
+
+# Default memory budget for parsed uploads kept per session
+PARSE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Default budget for fusion results and their export files kept per session
+FUSION_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# FusionResult artifact name of the CSV export
+CSV_ARTIFACT = ('csv',)
+# Digests of uploads remembered by file id, so reruns do not re-hash them
+UPLOAD_DIGESTS_MAX = 64
+
+_upload_digests = OrderedDict()
+_upload_digests_lock = threading.Lock()
+
+
+def content_hash(uploaded_file):
+    """Return a hex digest of an uploaded file's content
+
+    Streamlit uploads carry a file_id that changes with every upload; the
+    digest is computed once per id instead of on every rerun.
+    """
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id is not None:
+        with _upload_digests_lock:
+            if file_id in _upload_digests:
+                _upload_digests.move_to_end(file_id)
+                return _upload_digests[file_id]
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(uploaded_file.getbuffer())
+    hexdigest = digest.hexdigest()
+    if file_id is not None:
+        with _upload_digests_lock:
+            _upload_digests[file_id] = hexdigest
+            while len(_upload_digests) > UPLOAD_DIGESTS_MAX:
+                _upload_digests.popitem(last=False)
+    return hexdigest
+
+
+def file_hash(path, block_bytes=1 << 20):
+    """Return a hex digest of a file's content, matching content_hash of the same bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_bytes), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_key(content_digest, **read_options):
+    """Return the key of CSV content parsed with some read options"""
+    return (content_digest,) + tuple(sorted(read_options.items()))
+
+
+def frame_nbytes(df):
+    """Return the in-memory size of a DataFrame in bytes"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class LRUCache:
+    """Least-recently-used cache evicting by a total byte budget"""
+
+    def __init__(self, max_bytes, sizeof=frame_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return a cached value and mark it as recently used"""
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value):
+        """Store a value, evicting the oldest entries beyond the budget"""
+        self.pop(key)
+        nbytes = self.sizeof(value)
+        self._entries[key] = (value, nbytes)
+        self.total_bytes += nbytes
+        self._evict()
+        return value
+
+    def refresh(self, key):
+        """Re-measure an entry whose value grew in place"""
+        if key not in self._entries:
+            return
+        value, nbytes = self._entries[key]
+        new_nbytes = self.sizeof(value)
+        self._entries[key] = (value, new_nbytes)
+        self.total_bytes += new_nbytes - nbytes
+        self._evict()
+
+    def _evict(self):
+        """Drop the oldest entries until the budget is met"""
+        # Always keep the newest entry, even when it alone exceeds the budget
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_bytes
+
+    def pop(self, key):
+        """Remove an entry if present and return its value"""
+        if key not in self._entries:
+            return None
+        value, nbytes = self._entries.pop(key)
+        self.total_bytes -= nbytes
+        return value
+
+    def stats(self):
+        """Return hit/miss counters and current usage"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+        }
+
+
+class FusionResult:
+    """Merged frame of one fusion run, its summary and lazily built export files"""
+
+    def __init__(self, merged_df, summary=None):
+        self.merged_df = merged_df
+        self.summary = summary if summary is not None else summarize_frame(merged_df)
+        self.frame_bytes = self.summary["memory_bytes"]
+        self.artifacts = {}
+        self.build_seconds = {}
+        self.coordinates = {}
+        # Download buttons read exports from another thread than the rerun
+        self._lock = threading.RLock()
+
+    def artifact(self, name, build):
+        """Return a rewound export file, building it on first use"""
+        with self._lock:
+            if name not in self.artifacts:
+                started = time.perf_counter()
+                self.artifacts[name] = build()
+                self.build_seconds[name] = time.perf_counter() - started
+            export_file = self.artifacts[name]
+            export_file.seek(0)
+            return export_file
+
+    def artifact_bytes(self, name):
+        """Return the content of a built export"""
+        with self._lock:
+            export_file = self.artifacts[name]
+            export_file.seek(0)
+            data = export_file.read()
+            export_file.seek(0)
+            return data
+
+    def points(self, coordinate_options=None):
+        """Return the PointCoordinates of the merged frame, built once per set of coordinate options"""
+        key = coordinate_key(coordinate_options)
+        with self._lock:
+            if key not in self.coordinates:
+                self.coordinates[key] = PointCoordinates(self.merged_df, **(coordinate_options or {}))
+            return self.coordinates[key]
+
+    def artifact_info(self, name):
+        """Return (size in bytes, build seconds) of a built export"""
+        with self._lock:
+            export_file = self.artifacts[name]
+            export_file.seek(0, 2)
+            size = export_file.tell()
+            export_file.seek(0)
+            return size, self.build_seconds[name]
+
+    def nbytes(self):
+        """Return the size of the merged frame plus all built exports and coordinates"""
+        with self._lock:
+            total = self.frame_bytes + sum(points.nbytes() for points in self.coordinates.values())
+            for export_file in self.artifacts.values():
+                export_file.seek(0, 2)
+                total += export_file.tell()
+            return total
+
+
+def geojson_artifact(scope_number, compact, coordinate_options=None):
+    """Return the FusionResult artifact name of a GeoJSON export"""
+    return ('geojson', scope_number, compact) + coordinate_key(coordinate_options)
+
+
+def fusion_cache(max_bytes=FUSION_CACHE_MAX_BYTES):
+    """Create an LRU cache sized by FusionResult.nbytes"""
+    return LRUCache(max_bytes, sizeof=FusionResult.nbytes)
+
+
+def parse_cache(max_bytes=PARSE_CACHE_MAX_BYTES):
+    """Create an LRU cache of (DataFrame, ingest report) entries"""
+    return LRUCache(max_bytes, sizeof=lambda entry: entry[1]["after_bytes"])
+
+
+def read_csv_cached(uploaded_file, cache, **read_options):
+    """Parse an uploaded CSV, reusing the cached frame for unchanged content
+
+    Returns the DataFrame, its ingest report and the cache key, which
+    combines the content hash with the read options.
+    """
+    key = source_key(content_hash(uploaded_file), **read_options)
+    entry = cache.get(key)
+    if entry is None:
+        uploaded_file.seek(0)
+        with stage("parse", file=getattr(uploaded_file, "name", None)) as record:
+            entry = cache.put(key, read_csv_typed(uploaded_file, **read_options))
+            record["rows_out"] = len(entry[0])
+    df, report = entry
+    return df, report, key
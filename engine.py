@@ -0,0 +1,537 @@
+"""
+UI-independent fusion engine shared by the Streamlit app and the batch CLI
+"""
+
+import math
+import os
+import time
+from datetime import date
+
+from caching import CSV_ARTIFACT, FusionResult, file_hash, geojson_artifact, source_key
+from aggregation import AGGREGATION_SCHEMES
+from exporters import (CHUNK_ROWS, COLUMNAR_FORMATS, columnar_file, iter_aggregated_geojson_chunks,
+                       iter_csv_chunks, iter_frames_geojson_chunks, iter_geojson_chunks,
+                       spool_chunks, tile_pyramid_file)
+from geojson_builder import PointCoordinates
+from fusion import (
+    DEFAULT_ASOF_TOLERANCE_S,
+    FUSION_ENGINES,
+    LAZY_ENGINE,
+    MERGE_STRATEGIES,
+    METADATA_COLUMNS,
+    NEAREST_ROAD_STRATEGY,
+    OUT_OF_CORE_ENGINE,
+    PARTITION_CHUNK_ROWS,
+    add_source_metadata,
+    iter_bucket_merge,
+    iter_frame_chunks,
+    out_of_core_merge,
+    run_fusion,
+)
+from ingestion import csv_header, iter_csv_typed, read_csv_typed
+from instrumentation import Run, stage
+from incremental import (INCREMENTAL_STRATEGIES, PARTITION_COLUMN, IncrementalHistory, frame_digest,
+                         partition_keys, row_hashes, settings_digest, upload_marks)
+from jobs import JobCancelled
+from lazy_engine import estimate_lazy_join_rows, lazy_fuse
+from planner import (DEFAULT_MAX_OUTPUT_BYTES, DEFAULT_MAX_OUTPUT_ROWS, JoinBudgetExceeded, check_budget,
+                     chunked_key_histogram, estimate_join_rows, normalize_key_dtypes, plan_join)
+from road_reference import RoadReferenceStore
+from spatial import DEFAULT_MAX_DISTANCE_M
+
+# Target scopes offered in the app, label -> scope number
+SCOPE_OPTIONS = {
+    "Vianova Showcase - 300557 - Dubai UAE - 403825": "403825",
+    "Lime - 300066 - Lime Gothenburg - 300109": "300109",
+    "Stadt Sindelfingen - 309232 - EV Ladestation Demo - 408444": "408444",
+    "Fenix - 304630 - Abu Dhabi - 306669": "306669",
+    "BoltEU - 300076 - Bolt Ludwigshafen - 353510": "353510",
+    "vianova-feed-management - 1 - test-road-import-over-20k - 403792": "403792",
+    "Lime - 300066 - Lime Brussels - 300118": "300118",
+    "waytailLive - 10109 - Northindainzia - 404103": "404103",
+    "Marseille - 408340 - France - 408340": "408340",
+    "Lyon - 408341 - France - 408341": "408341",
+    "Paris - 408342 - France - 408342": "408342",
+    "Toulouse - 408343 - France - 408343": "408343",
+    "Nice - 408344 - France - 408344": "408344",
+    "Nantes - 408345 - France - 408345": "408345",
+    "Strasbourg - 408346 - France - 408346": "408346",
+    "Montpellier - 408347 - France - 408347": "408347",
+    "Bordeaux - 408348 - France - 408348": "408348",
+    "Lille - 408349 - France - 408349": "408349"
+}
+# Default processing date of the app's date picker
+DEFAULT_DATE = date(2025, 9, 29)
+
+
+def common_join_columns(bms_df, road_df):
+    """Return the columns shared by both inputs, in BMS column order
+
+    The metadata columns are never offered: fuse overwrites them with
+    per-source constants, so they could not match.
+    """
+    road_columns = set(road_df.columns) - set(METADATA_COLUMNS)
+    return [col for col in bms_df.columns if col in road_columns]
+
+
+def fuse(bms_df, road_df, scope_number, selected_date, merge_strategy="Inner Join",
+         engine="In-memory", workers=None, max_distance_m=DEFAULT_MAX_DISTANCE_M,
+         asof_by=None, asof_tolerance_s=DEFAULT_ASOF_TOLERANCE_S, columns=None, on=None,
+         road_reference=None, asof_left_time=None, asof_right_time=None, sources=None, optimize=True):
+    """Tag both inputs with their metadata and fuse them
+
+    Key-based strategies join on `on` (default: every shared column) after
+    normalizing the key dtypes. With `columns`, only those input columns
+    (plus the join keys) are kept. When road_df is the frame of a stored
+    RoadReference, in-memory inner/left joins whose keys needed no
+    conversion and the nearest-road join reuse its indexes. The as-of join
+    matches asof_left_time with asof_right_time (default: detected).
+    sources are the (BMS, road) CSV paths or bytes the frames were parsed
+    from (or the frames themselves); the Lazy engine scans those instead,
+    with optimize as in read_csv_typed, so projection pushdown and the
+    streaming reader apply, and the Out-of-core engine partitions them
+    chunk by chunk (see stream_fuse).
+    """
+    on = common_join_columns(bms_df, road_df) if on is None else list(on)
+    if sources is not None and merge_strategy in MERGE_STRATEGIES:
+        if engine == LAZY_ENGINE:
+            return lazy_fuse(*sources, scope_number, selected_date, merge_strategy, on, columns, optimize)
+        if engine == OUT_OF_CORE_ENGINE:
+            return out_of_core_merge(*_tagged_sources(sources, scope_number, selected_date, on, columns, optimize),
+                                     on, merge_strategy)
+    if merge_strategy in MERGE_STRATEGIES:
+        bms_df, road_df, _ = normalize_key_dtypes(bms_df, road_df, on)
+    if engine == LAZY_ENGINE and merge_strategy in MERGE_STRATEGIES:
+        return lazy_fuse(bms_df, road_df, scope_number, selected_date, merge_strategy, on, columns)
+    key_index = road_index = None
+    if road_reference is not None and road_df is road_reference.frame:
+        if MERGE_STRATEGIES.get(merge_strategy) in ("inner", "left") and engine == FUSION_ENGINES[0] and on:
+            key_index = road_reference.key_index(on)
+        elif merge_strategy == NEAREST_ROAD_STRATEGY:
+            road_index = road_reference.spatial_index()
+    if columns is not None:
+        keep = set(columns) | set(on) | {asof_left_time, asof_right_time}
+        bms_df = bms_df[[col for col in bms_df.columns if col in keep]]
+        road_df = road_df[[col for col in road_df.columns if col in keep]]
+    bms_df_processed = add_source_metadata(bms_df, 'BMS', scope_number, selected_date)
+    road_df_processed = add_source_metadata(road_df, 'Road', scope_number, selected_date)
+    return run_fusion(bms_df_processed, road_df_processed, on, merge_strategy, engine, workers,
+                      max_distance_m, asof_by, asof_tolerance_s, key_index, road_index,
+                      asof_left_time, asof_right_time)
+
+
+def stream_fuse(bms, road, scope_number, selected_date, merge_strategy="Inner Join", on=None, columns=None,
+                optimize=True):
+    """Yield the out-of-core merge of two sources one hash bucket at a time
+
+    Sources are CSV paths, upload bytes or DataFrames. CSVs are read in
+    chunks (see iter_csv_typed) that are tagged with their metadata and
+    partitioned to disk, so neither the inputs nor the result are ever
+    held whole. Without `on` the sources are joined on their shared
+    columns; with `columns` only those (and the keys) are read.
+    """
+    if on is None:
+        on = common_join_columns(_header(bms), _header(road))
+    left, right = _tagged_sources((bms, road), scope_number, selected_date, on, columns, optimize)
+    return iter_bucket_merge(left, right, on, merge_strategy)
+
+
+def _tagged_sources(sources, scope_number, selected_date, on, columns=None, optimize=True):
+    """Return chunk iterators of the (BMS, road) sources tagged with their metadata"""
+    keep = None if columns is None else set(columns) | set(on)
+    return tuple(_tagged_chunks(source, name, scope_number, selected_date, keep, optimize)
+                 for source, name in zip(sources, ('BMS', 'Road')))
+
+
+def _tagged_chunks(source, source_name, scope_number, selected_date, keep=None, optimize=True):
+    if _is_csv(source):
+        chunks = iter_csv_typed(source, PARTITION_CHUNK_ROWS, optimize, keep)
+    else:
+        if keep is not None:
+            source = source[[col for col in source.columns if col in keep]]
+        chunks = iter_frame_chunks(source)
+    for chunk in chunks:
+        yield add_source_metadata(chunk, source_name, scope_number, selected_date)
+
+
+def _is_csv(source):
+    return isinstance(source, (str, os.PathLike, bytes))
+
+
+def _header(source):
+    return csv_header(source) if _is_csv(source) else source.iloc[:0]
+
+
+def fusion_job(job, bms_df, road_df, scope_number, selected_date, merge_strategy="Inner Join",
+               include_geojson=True, compact_geojson=False, store=None, run=None, coordinate_options=None,
+               **fusion_options):
+    """Background job run by the app: merge, summarize, store and pre-build the exports
+
+    Reports its stages on job and returns a FusionResult whose CSV (and
+    GeoJSON, with coordinate_options) artifacts are already built. With a
+    ResultStore the merged frame is also saved under job.key for other
+    sessions. Stage timings are recorded into run (a new instrumentation
+    Run by default), which is logged as one JSON line when the job ends.
+    """
+    if run is None:
+        run = Run("fusion", scope=scope_number, date=str(selected_date), strategy=merge_strategy)
+
+    def stages():
+        job.set_stage("merge", 0.05)
+        with stage("merge", rows_in=len(bms_df) + len(road_df)) as record:
+            merged_df = fuse(bms_df, road_df, scope_number, selected_date, merge_strategy, **fusion_options)
+            record["rows_out"] = len(merged_df)
+        return _result_stages(job, merged_df, scope_number, include_geojson, compact_geojson, store,
+                              coordinate_options)
+
+    return _logged(run, stages)
+
+
+def fuse_delta(history, bms_df, road_df, scope_number, selected_date, merge_strategy="Inner Join",
+               **fusion_options):
+    """Fuse only the BMS rows not fused for the scope yet and append them to its history
+
+    The history is reset first when the road table or the settings
+    changed; a stored RoadReference passed as road_reference supplies the
+    road table digest instead of re-hashing the table. When the upload
+    extends the previous one, only its appended rows are hashed (see
+    IncrementalHistory.fused_offset). Fused rows go to the partition of
+    their BMS timestamp's date, or of selected_date without one. A delta
+    without new rows writes nothing. Returns the partitions the delta was
+    appended to (those of the last delta when it is empty) and a report
+    dict with the delta, skipped and history row counts.
+    """
+    if merge_strategy not in INCREMENTAL_STRATEGIES:
+        raise ValueError(f"Incremental fusion supports {', '.join(INCREMENTAL_STRATEGIES)}; "
+                         f"{merge_strategy} output depends on rows of earlier deltas")
+    road_reference = fusion_options.get("road_reference")
+    with history.scope_lock(scope_number):
+        with stage("delta: detect", rows_in=len(bms_df)) as record:
+            if road_reference is not None and road_df is road_reference.frame:
+                road_digest = road_reference.digest
+            else:
+                road_digest = frame_digest(road_df)
+            rebuilt = history.begin(scope_number, settings_digest(bms_df, merge_strategy, fusion_options),
+                                    road_digest)
+            appended = bms_df.iloc[history.fused_offset(scope_number, bms_df):]
+            hashes = row_hashes(appended)
+            new_rows = history.new_row_mask(scope_number, hashes)
+            delta = appended[new_rows]
+            record["rows_out"] = len(delta)
+        with stage("delta: merge", rows_in=len(delta) + len(road_df)) as record:
+            # The partition column rides along with each BMS row through the fusion
+            tagged = delta.assign(**{PARTITION_COLUMN: partition_keys(delta, selected_date,
+                                                                      fusion_options.get("asof_left_time"))})
+            options = fusion_options
+            if fusion_options.get("columns") is not None:
+                options = dict(fusion_options, columns=[*fusion_options["columns"], PARTITION_COLUMN])
+            fused_df = fuse(tagged, road_df, scope_number, selected_date, merge_strategy, **options)
+            keys = fused_df.pop(PARTITION_COLUMN).to_numpy()
+            record["rows_out"] = len(fused_df)
+        if delta.empty:
+            # Every row was fused before: keep the stored partitions untouched
+            partition = history.load(scope_number, history.manifest(scope_number)["latest"])
+            if partition is None:
+                partition = fused_df
+        else:
+            with stage("delta: append", rows_in=len(fused_df)) as record:
+                partition = history.append(scope_number, fused_df, keys, hashes[new_rows], upload_marks(bms_df))
+                record["rows_out"] = len(partition)
+        manifest = history.manifest(scope_number)
+    return partition, {
+        "delta_rows": len(delta),
+        "skipped_rows": len(bms_df) - len(delta),
+        "fused_rows": len(fused_df),
+        "partition_rows": len(partition),
+        "history_rows": manifest["history_rows"],
+        "partitions": len(manifest["partitions"]),
+        "rebuilt": rebuilt,
+    }
+
+
+def incremental_job(job, history, bms_df, road_df, scope_number, selected_date, merge_strategy="Inner Join",
+                    include_geojson=True, compact_geojson=False, run=None, coordinate_options=None,
+                    **fusion_options):
+    """Background job run by the app in incremental mode
+
+    Fuses only the new BMS rows into the scope's history and returns a
+    FusionResult of the partitions it appended to, with the fuse_delta
+    report under summary['incremental'] and the exports pre-built.
+    """
+    if run is None:
+        run = Run("incremental", scope=scope_number, date=str(selected_date), strategy=merge_strategy)
+
+    def stages():
+        job.set_stage("merge delta", 0.05)
+        partition, report = fuse_delta(history, bms_df, road_df, scope_number, selected_date, merge_strategy,
+                                       **fusion_options)
+        result = _result_stages(job, partition, scope_number, include_geojson, compact_geojson,
+                                coordinate_options=coordinate_options)
+        result.summary["incremental"] = report
+        return result
+
+    return _logged(run, stages)
+
+
+def _logged(run, stages):
+    """Run stages inside an instrumentation run, logging it however it ends"""
+    status = "failed"
+    try:
+        with run.activate():
+            result = stages()
+        status = "ok"
+        return result
+    except JobCancelled:
+        status = "cancelled"
+        raise
+    finally:
+        run.finish(status)
+        run.log()
+
+
+def _result_stages(job, merged_df, scope_number, include_geojson, compact_geojson, store=None,
+                   coordinate_options=None):
+    """Summarize, store and pre-build the exports of a merged frame, returning its FusionResult
+
+    The GeoJSON is not pre-built when the coordinate options are invalid
+    (an unknown column or CRS); the export reports that on its own.
+    """
+    job.set_stage("summary", 0.45)
+    with stage("summary", rows_in=len(merged_df)):
+        result = FusionResult(merged_df)
+    if store is not None:
+        job.set_stage("store", 0.5)
+        with stage("store", rows_in=len(merged_df)):
+            store.put(job.key, merged_df, result.summary)
+
+    chunks = max(math.ceil(len(merged_df) / CHUNK_ROWS), 1)
+    export_end = 0.75 if include_geojson else 1.0
+    job.set_stage("export CSV", 0.55)
+    with stage("export CSV", rows_in=len(merged_df)):
+        result.artifact(CSV_ARTIFACT,
+                        lambda: spool_chunks(job.track(iter_csv_chunks(merged_df), chunks, 0.55, export_end)))
+    if include_geojson:
+        job.set_stage("export GeoJSON", export_end)
+        with stage("coordinates", rows_in=len(merged_df)) as record:
+            try:
+                points = result.points(coordinate_options)
+            except ValueError:
+                return result
+            record["rows_out"] = points.report["points"]
+        geojson_chunks = iter_geojson_chunks(merged_df, scope_number, compact=compact_geojson, points=points)
+        with stage("export GeoJSON", rows_in=len(merged_df)):
+            result.artifact(geojson_artifact(scope_number, compact_geojson, coordinate_options),
+                            lambda: spool_chunks(job.track(geojson_chunks, chunks + 2, export_end, 1.0)))
+    return result
+
+
+def output_basename(scope_number, selected_date):
+    """Return the export file name stem used by the app's downloads"""
+    return f"merged_data_{scope_number}_{selected_date}"
+
+
+def write_chunks(chunks, path):
+    """Stream byte chunks to a file and return the number of bytes written"""
+    written = 0
+    with open(path, "wb") as handle:
+        for chunk in chunks:
+            handle.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def load_road(road_path, scope_number, road_store_dir=None, optimize=True, use_arrow=False):
+    """Return a job's road table and, with a road store, the scope's RoadReference
+
+    With road_store_dir, road_path is parsed into the scope's reference
+    only when its content or the read options differ from those of the
+    stored table; without road_path the stored reference is used as is.
+    """
+    if road_store_dir is None:
+        return read_csv_typed(road_path, optimize=optimize, use_arrow=use_arrow)[0], None
+    road_store = RoadReferenceStore(road_store_dir)
+    if road_path is not None:
+        source = source_key(file_hash(road_path), optimize=optimize, use_arrow=use_arrow)
+        if not road_store.is_current(scope_number, source):
+            road_df, _ = read_csv_typed(road_path, optimize=optimize, use_arrow=use_arrow)
+            road_store.put(scope_number, road_df, source)
+    reference = road_store.reference(scope_number)
+    if reference is None:
+        raise ValueError(f"No road CSV given and no road reference stored for scope {scope_number}")
+    return reference.frame, reference
+
+
+def run_job(bms_path, road_path, scope_number, selected_date, output_dir,
+            merge_strategy="Inner Join", include_geojson=True, compact_geojson=False,
+            aggregation_scheme=None, aggregation_resolution=None, pyramid_zooms=None,
+            columnar_formats=(), parquet_compression="snappy",
+            optimize=True, use_arrow=False, max_rows=DEFAULT_MAX_OUTPUT_ROWS,
+            max_bytes=DEFAULT_MAX_OUTPUT_BYTES, allow_over_budget=False, history_dir=None,
+            road_store_dir=None, coordinate_options=None, **fusion_options):
+    """Run one headless fusion job from CSV paths to export files
+
+    Key-based joins are planned first and refused with JoinBudgetExceeded
+    when the estimated output exceeds max_rows/max_bytes, unless
+    allow_over_budget is set. With aggregation_scheme a per-cell GeoJSON
+    is written too, and with pyramid_zooms (min, max) a zip of tiles.
+    With history_dir, only BMS rows not fused for the scope yet are fused
+    and appended to its IncrementalHistory there, and the exports hold
+    the date partitions they were appended to (joins are then not planned). With
+    road_store_dir the road table comes from the scope's RoadReference
+    there (see load_road), so road_path may be None once it is stored.
+    coordinate_options (lat_col, lon_col, source_crs, dedupe) are passed
+    to PointCoordinates for the map exports. The Out-of-core engine
+    streams key-based joins that only export CSV/GeoJSON: each merged
+    bucket is written out before the next is merged (see stream_fuse), so
+    the result is never held whole; its export time counts as fusion.
+    Returns a summary dict with row counts, output paths, the coordinate
+    report and timings.
+    """
+    started = time.perf_counter()
+    on = fusion_options.get("on")
+    incremental = None
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, output_basename(scope_number, selected_date))
+    outputs = {"csv": stem + ".csv"}
+    streamed = (fusion_options.get("engine") == OUT_OF_CORE_ENGINE and merge_strategy in MERGE_STRATEGIES
+                and history_dir is None and road_store_dir is None and aggregation_scheme is None
+                and pyramid_zooms is None and not columnar_formats)
+    if history_dir is not None:
+        bms_df, _ = read_csv_typed(bms_path, optimize=optimize, use_arrow=use_arrow)
+        road_df, road_reference = load_road(road_path, scope_number, road_store_dir, optimize, use_arrow)
+        bms_rows, road_rows = len(bms_df), len(road_df)
+        parsed = time.perf_counter()
+        estimated_rows = None
+        merged_df, incremental = fuse_delta(IncrementalHistory(history_dir), bms_df, road_df, scope_number,
+                                            selected_date, merge_strategy, road_reference=road_reference,
+                                            **fusion_options)
+    elif (fusion_options.get("engine") == LAZY_ENGINE and merge_strategy in MERGE_STRATEGIES
+          and road_store_dir is None):
+        # Scan, join and collect in one lazy query instead of parsing both CSVs up front
+        bms_rows = road_rows = None
+        parsed = time.perf_counter()
+        estimated_rows = estimate_lazy_join_rows(bms_path, road_path, merge_strategy, on, optimize)
+        if estimated_rows > max_rows and not allow_over_budget:
+            raise JoinBudgetExceeded(f"Estimated {estimated_rows:,} rows exceeds the {max_rows:,} row budget")
+        merged_df = lazy_fuse(bms_path, road_path, scope_number, selected_date, merge_strategy, on,
+                              fusion_options.get("columns"), optimize)
+    elif streamed:
+        bms_rows = road_rows = None
+        parsed = time.perf_counter()
+        if on is None:
+            on = common_join_columns(csv_header(bms_path), csv_header(road_path))
+        # Key counts only: one chunked pass over the key columns of each CSV
+        left_counts, right_counts = (
+            chunked_key_histogram(iter_csv_typed(path, PARTITION_CHUNK_ROWS, optimize, on), on)
+            for path in (bms_path, road_path)
+        )
+        estimated_rows = estimate_join_rows(left_counts, right_counts, MERGE_STRATEGIES[merge_strategy])
+        if estimated_rows > max_rows and not allow_over_budget:
+            raise JoinBudgetExceeded(f"Estimated {estimated_rows:,} rows exceeds the {max_rows:,} row budget")
+        merged_rows = 0
+
+        def counted(frames):
+            nonlocal merged_rows
+            for frame in frames:
+                merged_rows += len(frame)
+                yield frame
+
+        frames = counted(stream_fuse(bms_path, road_path, scope_number, selected_date, merge_strategy, on,
+                                     fusion_options.get("columns"), optimize))
+        points_report = None
+        with open(outputs["csv"], "wb") as csv_handle:
+            frames = _written_csv(frames, csv_handle)
+            if include_geojson:
+                # One pass: the GeoJSON writer pulls each bucket through the CSV writer
+                outputs["geojson"] = stem + ".geojson"
+                points_report = {}
+                write_chunks(iter_frames_geojson_chunks(frames, scope_number, compact_geojson,
+                                                        coordinate_options=coordinate_options,
+                                                        report=points_report),
+                             outputs["geojson"])
+            else:
+                for _ in frames:
+                    pass
+    else:
+        bms_df, _ = read_csv_typed(bms_path, optimize=optimize, use_arrow=use_arrow)
+        road_df, road_reference = load_road(road_path, scope_number, road_store_dir, optimize, use_arrow)
+        bms_rows, road_rows = len(bms_df), len(road_df)
+        parsed = time.perf_counter()
+        estimated_rows = None
+        if merge_strategy in MERGE_STRATEGIES:
+            keys = common_join_columns(bms_df, road_df) if on is None else on
+            plan = plan_join(bms_df, road_df, keys, merge_strategy, max_rows, max_bytes)
+            estimated_rows = plan["estimated_rows"]
+            if not allow_over_budget:
+                check_budget(plan)
+        merged_df = fuse(bms_df, road_df, scope_number, selected_date, merge_strategy,
+                         road_reference=road_reference, **fusion_options)
+    fused = time.perf_counter()
+
+    if not streamed:
+        merged_rows = len(merged_df)
+        points_report = _write_exports(merged_df, scope_number, stem, outputs, include_geojson, compact_geojson,
+                                       aggregation_scheme, aggregation_resolution, pyramid_zooms,
+                                       columnar_formats, parquet_compression, coordinate_options)
+    finished = time.perf_counter()
+
+    return {
+        "scope": scope_number,
+        "date": str(selected_date),
+        "bms_rows": bms_rows,
+        "road_rows": road_rows,
+        "estimated_rows": estimated_rows,
+        "merged_rows": merged_rows,
+        "incremental": incremental,
+        "points": points_report,
+        "outputs": outputs,
+        "parse_seconds": parsed - started,
+        "fusion_seconds": fused - parsed,
+        "export_seconds": finished - fused,
+        "total_seconds": finished - started,
+    }
+
+
+def _written_csv(frames, handle):
+    """Pass frames through, writing them to a CSV file on the way"""
+    header = True
+    for frame in frames:
+        if header or len(frame):
+            for chunk in iter_csv_chunks(frame, header=header):
+                handle.write(chunk)
+        header = False
+        yield frame
+
+
+def _write_exports(merged_df, scope_number, stem, outputs, include_geojson, compact_geojson, aggregation_scheme,
+                   aggregation_resolution, pyramid_zooms, columnar_formats, parquet_compression,
+                   coordinate_options):
+    """Write the exports of a merged frame, adding their paths to outputs; return the point report"""
+    write_chunks(iter_csv_chunks(merged_df), outputs["csv"])
+    points = None
+    if (include_geojson or aggregation_scheme is not None or pyramid_zooms is not None
+            or any(export_format != "Parquet" for export_format in columnar_formats)):
+        with stage("coordinates", rows_in=len(merged_df)) as record:
+            points = PointCoordinates(merged_df, **(coordinate_options or {}))
+            record["rows_out"] = points.report["points"]
+    if include_geojson:
+        outputs["geojson"] = stem + ".geojson"
+        write_chunks(iter_geojson_chunks(merged_df, scope_number, compact=compact_geojson, points=points),
+                     outputs["geojson"])
+    if aggregation_scheme is not None:
+        if aggregation_resolution is None:
+            aggregation_resolution = AGGREGATION_SCHEMES[aggregation_scheme]
+        outputs["aggregated_geojson"] = stem + "_cells.geojson"
+        write_chunks(iter_aggregated_geojson_chunks(merged_df, scope_number, aggregation_scheme,
+                                                    aggregation_resolution, compact=compact_geojson,
+                                                    points=points),
+                     outputs["aggregated_geojson"])
+    if pyramid_zooms is not None:
+        outputs["tiles"] = stem + "_tiles.zip"
+        write_chunks(tile_pyramid_file(merged_df, scope_number, *pyramid_zooms, points=points), outputs["tiles"])
+    for export_format in columnar_formats:
+        extension, _ = COLUMNAR_FORMATS[export_format]
+        outputs[export_format.lower()] = stem + extension
+        write_chunks(columnar_file(merged_df, export_format, parquet_compression, points),
+                     outputs[export_format.lower()])
+    return None if points is None else points.report
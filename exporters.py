@@ -0,0 +1,309 @@
+"""
+Streaming CSV and GeoJSON exports for the Data Fusion Application
+"""
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from aggregation import (
+    AGGREGATION_SCHEMES,
+    TILE_DETAIL,
+    aggregate_points,
+    aggregated_feature_collection,
+    cell_features,
+    pyramid_tiles,
+)
+from geojson_builder import (
+    WGS84,
+    PointCoordinates,
+    build_point_features,
+    json_column_values,
+    metadata_feature_collection,
+)
+
+# Rows serialized per chunk, bounds the working set of a single export
+CHUNK_ROWS = 50_000
+# Exports larger than this spill from RAM to a temporary file on disk
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+# Parquet compression codecs offered for columnar exports
+PARQUET_COMPRESSIONS = ["snappy", "zstd", "gzip", "none"]
+# Default zoom range of tile pyramid exports
+DEFAULT_PYRAMID_ZOOMS = (8, 12)
+# Columnar export formats, label -> (file extension, MIME type)
+COLUMNAR_FORMATS = {
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "GeoParquet": (".geoparquet", "application/vnd.apache.parquet"),
+    "FlatGeobuf": (".fgb", "application/octet-stream"),
+}
+
+
+def iter_csv_chunks(df, chunk_rows=CHUNK_ROWS, encoding='utf-8', header=True):
+    """Yield the CSV export of a DataFrame as encoded byte chunks"""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=header and start == 0).encode(encoding)
+
+
+def iter_geojson_chunks(df, scope_number, compact=False, chunk_rows=CHUNK_ROWS, points=None):
+    """Yield the GeoJSON export of a DataFrame as encoded byte chunks
+
+    The indented output matches json.dumps(create_geojson_from_data(...),
+    indent=2); compact output drops all optional whitespace. points is a
+    prebuilt PointCoordinates of df's rows; the coordinates are validated
+    once for the whole frame, so dedupe also spans chunks.
+    """
+    if points is None:
+        points = PointCoordinates(df)
+    if points.lat_col is None or points.lon_col is None:
+        collection = metadata_feature_collection(df, scope_number)
+        yield _dumps(collection, compact).encode('utf-8')
+        return
+
+    batches = (build_point_features(df.iloc[start:start + chunk_rows], points.lat_col, points.lon_col,
+                                    points.arrays(start, start + chunk_rows))
+               for start in range(0, len(df), chunk_rows))
+    yield from _iter_feature_collection(f"merged_data_{scope_number}", batches, compact)
+
+
+def iter_frames_geojson_chunks(frames, scope_number, compact=False, chunk_rows=CHUNK_ROWS,
+                               coordinate_options=None, report=None):
+    """Yield one GeoJSON export of a stream of DataFrames as byte chunks
+
+    Each frame gets its own PointCoordinates, so dedupe only spans the
+    rows of one frame; merged hash buckets hold every copy of a row, as
+    equal rows have equal keys. When given, the report dict is filled
+    with the frames' point reports summed.
+    """
+    report = {} if report is None else report
+    frames = iter(frames)
+    first = next(frames)
+    points = _counted_points(first, coordinate_options, report)
+    if points.lat_col is None or points.lon_col is None:
+        # The placeholder feature holds the row count, known once every frame went by
+        for df in frames:
+            _counted_points(df, coordinate_options, report)
+        collection = metadata_feature_collection(first, scope_number)
+        collection["features"][0]["properties"]["total_records"] = report["rows"]
+        yield _dumps(collection, compact).encode('utf-8')
+        return
+
+    def batches():
+        df, frame_points = first, points
+        while True:
+            for start in range(0, len(df), chunk_rows):
+                yield build_point_features(df.iloc[start:start + chunk_rows], frame_points.lat_col,
+                                           frame_points.lon_col, frame_points.arrays(start, start + chunk_rows))
+            df = next(frames, None)
+            if df is None:
+                return
+            frame_points = _counted_points(df, coordinate_options, report)
+
+    yield from _iter_feature_collection(f"merged_data_{scope_number}", batches(), compact)
+
+
+def _counted_points(df, coordinate_options, report):
+    """Return a frame's PointCoordinates, adding its counts to report"""
+    points = PointCoordinates(df, **(coordinate_options or {}))
+    for name, value in points.report.items():
+        if isinstance(value, int):
+            report[name] = report.get(name, 0) + value
+        else:
+            report.setdefault(name, value)
+    return points
+
+
+def iter_aggregated_geojson_chunks(df, scope_number, scheme="Quadkey",
+                                   resolution=AGGREGATION_SCHEMES["Quadkey"], compact=False,
+                                   chunk_rows=CHUNK_ROWS, points=None):
+    """Yield a GeoJSON export of per-cell counts and stats as encoded byte chunks
+
+    Each occupied quadkey tile or grid cell becomes one Polygon feature,
+    so the output size depends on the area covered, not the point count.
+    """
+    cells = aggregate_points(df, scheme, resolution, points=points)
+    batches = (cell_features(cells.iloc[start:start + chunk_rows])
+               for start in range(0, len(cells), chunk_rows))
+    yield from _iter_feature_collection(f"merged_data_{scope_number}_cells", batches, compact)
+
+
+def _iter_feature_collection(name, feature_batches, compact):
+    """Yield a FeatureCollection as byte chunks, one per batch of features"""
+    name = json.dumps(name)
+    if compact:
+        head = '{"type":"FeatureCollection","name":' + name + ',"features":['
+        separator, tail = ',', ']}'
+    else:
+        head = '{\n  "type": "FeatureCollection",\n  "name": ' + name + ',\n  "features": ['
+        separator, tail = ',', '\n  ]\n}'
+
+    yield head.encode('utf-8')
+    written = 0
+    for features in feature_batches:
+        if not features:
+            continue
+        parts = []
+        for feature in features:
+            text = _dumps(feature, compact)
+            if not compact:
+                text = '\n' + '\n'.join('    ' + line for line in text.split('\n'))
+            parts.append(text)
+        prefix = separator if written else ''
+        yield (prefix + separator.join(parts)).encode('utf-8')
+        written += len(features)
+
+    if written == 0 and not compact:
+        tail = ']\n}'
+    yield tail.encode('utf-8')
+
+
+def tile_pyramid_file(df, scope_number, min_zoom=DEFAULT_PYRAMID_ZOOMS[0], max_zoom=DEFAULT_PYRAMID_ZOOMS[1],
+                      detail=TILE_DETAIL, points=None):
+    """Write a zip of aggregated GeoJSON tiles, {z}/{x}/{y}.geojson, and return the rewound file
+
+    Each tile holds the quadkey cells of zoom z + detail inside it, like
+    a vector tile pyramid; metadata.json describes the zoom range and
+    bounds in the style of TileJSON.
+    """
+    disk = tempfile.TemporaryFile()
+    bounds = [180.0, 90.0, -180.0, -90.0]
+    tiles = 0
+    with zipfile.ZipFile(disk, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for zoom, x, y, cells in pyramid_tiles(df, min_zoom, max_zoom, detail, points=points):
+            collection = aggregated_feature_collection(cells, scope_number)
+            archive.writestr(f"{zoom}/{x}/{y}.geojson", _dumps(collection, compact=True))
+            tiles += 1
+            if zoom == min_zoom:
+                bounds = [min(bounds[0], cells["west"].min()), min(bounds[1], cells["south"].min()),
+                          max(bounds[2], cells["east"].max()), max(bounds[3], cells["north"].max())]
+        archive.writestr("metadata.json", _dumps({
+            "name": f"merged_data_{scope_number}_tiles",
+            "format": "geojson",
+            "scheme": "xyz",
+            "tiles": "{z}/{x}/{y}.geojson",
+            "minzoom": min_zoom,
+            "maxzoom": max_zoom,
+            "cell_detail": detail,
+            "tile_count": tiles,
+            "bounds": [float(value) for value in bounds],
+        }, compact=False))
+    return _reopen_for_reading(disk)
+
+
+def spool_chunks(chunks, max_size=SPOOL_MAX_BYTES):
+    """Write byte chunks to memory, spilling to a temporary file past max_size
+
+    Returns a rewound io.BytesIO or an io.BufferedReader over the temporary
+    file, both of which st.download_button accepts.
+    """
+    buffer = io.BytesIO()
+    disk = None
+    for chunk in chunks:
+        if disk is None and buffer.tell() + len(chunk) > max_size:
+            disk = tempfile.TemporaryFile()
+            disk.write(buffer.getbuffer())
+            buffer = None
+        (buffer if disk is None else disk).write(chunk)
+
+    if disk is None:
+        buffer.seek(0)
+        return buffer
+    return _reopen_for_reading(disk)
+
+
+def parquet_file(df, compression="snappy"):
+    """Write a DataFrame to Parquet and return the rewound file"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False, compression=_codec(compression))
+    buffer.seek(0)
+    return buffer
+
+
+def points_geodataframe(df, points=None):
+    """Build a WGS84 point GeoDataFrame from the coordinate columns
+
+    Uses the same coordinate detection and validation as the GeoJSON
+    export (or the prebuilt PointCoordinates points); the coordinate
+    columns become the geometry.
+    """
+    import geopandas as gpd
+
+    if points is None:
+        points = PointCoordinates(df)
+    if points.lat_col is None or points.lon_col is None:
+        raise ValueError("No coordinate columns (lat, lon or latitude, longitude) found")
+    lats, lons, valid = points.arrays()
+    attributes = df.loc[valid, [col for col in df.columns if col not in [points.lat_col, points.lon_col]]]
+    return gpd.GeoDataFrame(
+        attributes.reset_index(drop=True),
+        geometry=gpd.points_from_xy(lons[valid], lats[valid]),
+        crs=WGS84,
+    )
+
+
+def geoparquet_file(df, compression="snappy", points=None):
+    """Write the point geometries of a DataFrame to GeoParquet"""
+    buffer = io.BytesIO()
+    points_geodataframe(df, points).to_parquet(buffer, index=False, compression=_codec(compression))
+    buffer.seek(0)
+    return buffer
+
+
+def flatgeobuf_file(df, points=None):
+    """Write the point geometries of a DataFrame to FlatGeobuf"""
+    gdf = points_geodataframe(df, points)
+    # FlatGeobuf has no field type for Python objects such as dates
+    for col in gdf.columns:
+        if col != gdf.geometry.name and gdf[col].dtype == object:
+            gdf[col] = json_column_values(gdf[col])
+            gdf[col] = gdf[col].astype("string")
+    disk = tempfile.NamedTemporaryFile(suffix=".fgb", delete=False)
+    disk.close()
+    try:
+        gdf.to_file(disk.name, driver="FlatGeobuf")
+        with open(disk.name, "rb") as handle:
+            spool = tempfile.TemporaryFile()
+            shutil.copyfileobj(handle, spool)
+    finally:
+        os.remove(disk.name)
+    return _reopen_for_reading(spool)
+
+
+def columnar_file(df, export_format, compression="snappy", points=None):
+    """Build a columnar export by its COLUMNAR_FORMATS label
+
+    points is a prebuilt PointCoordinates of df's rows for the point
+    geometry formats.
+    """
+    if export_format == "Parquet":
+        return parquet_file(df, compression)
+    if export_format == "GeoParquet":
+        return geoparquet_file(df, compression, points)
+    if export_format == "FlatGeobuf":
+        return flatgeobuf_file(df, points)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+
+def _codec(compression):
+    """Map the 'none' compression choice to pandas' None"""
+    return None if compression == "none" else compression
+
+
+def _reopen_for_reading(disk):
+    """Return a rewound read-only BufferedReader over a temporary file"""
+    # The unlinked file lives as long as the reader
+    disk.flush()
+    reader = open(os.dup(disk.fileno()), 'rb')
+    disk.close()
+    reader.seek(0)
+    return reader
+
+
+def _dumps(obj, compact):
+    """Serialize to JSON, compact or indented like the original export"""
+    if compact:
+        return json.dumps(obj, separators=(',', ':'))
+    return json.dumps(obj, indent=2)
@@ -0,0 +1,456 @@
+"""
+Data fusion strategies for the Data Fusion Application
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from geojson_builder import name_words
+from spatial import DEFAULT_MAX_DISTANCE_M, nearest_road_join
+
+# Merge strategy labels shown in the sidebar, mapped to pandas merge modes
+MERGE_STRATEGIES = {
+    "Inner Join": "inner",
+    "Left Join": "left",
+    "Right Join": "right",
+    "Outer Join": "outer",
+}
+# Spatial strategy assigning each BMS point its nearest road geometry
+NEAREST_ROAD_STRATEGY = "Nearest Road (spatial)"
+# Time-window strategy matching each BMS reading to the closest road record
+ASOF_STRATEGY = "As-of (time window)"
+# All strategies offered in the sidebar, key-based joins first
+STRATEGY_OPTIONS = list(MERGE_STRATEGIES) + [NEAREST_ROAD_STRATEGY, ASOF_STRATEGY]
+# Default tolerance of the as-of join in seconds
+DEFAULT_ASOF_TOLERANCE_S = 300
+# Words of column names that identify timestamp columns (matched as whole words)
+TIME_COLUMN_HINTS = ("timestamp", "time", "datetime", "date", "ts")
+# Metadata columns added during fusion, never used as join or time keys
+METADATA_COLUMNS = ("data_source", "scope", "processing_date")
+# Fusion engines selectable in the sidebar
+FUSION_ENGINES = ["In-memory", "Out-of-core (disk buckets)", "Parallel (process pool)", "Lazy (Polars)"]
+# Engine that runs key-based joins as a lazy Polars query
+LAZY_ENGINE = "Lazy (Polars)"
+# Engine that merges key-based joins one on-disk hash bucket at a time
+OUT_OF_CORE_ENGINE = "Out-of-core (disk buckets)"
+# Number of on-disk hash buckets used by the out-of-core merge
+DEFAULT_BUCKETS = 16
+# Hash buckets per worker for the parallel merge, keeps workers evenly loaded
+BUCKETS_PER_WORKER = 4
+# Rows handled at once while partitioning inputs into buckets
+PARTITION_CHUNK_ROWS = 100_000
+
+
+def constant_column(value, length):
+    """Return a categorical holding one value on every row (1 byte per row)"""
+    codes = np.zeros(length, dtype=np.int8)
+    return pd.Categorical.from_codes(codes, categories=pd.Index([value], dtype=object))
+
+
+def add_source_metadata(df, source, scope_number, selected_date):
+    """Return df tagged with its source, scope and processing date
+
+    The input's columns are shared rather than copied, and the metadata
+    columns are single-category categoricals, so tagging costs one byte
+    per row and column instead of a Python object per row.
+    """
+    df = df.copy(deep=False)
+    df['data_source'] = constant_column(source, len(df))
+    df['scope'] = constant_column(scope_number, len(df))
+    df['processing_date'] = constant_column(selected_date, len(df))
+    return df
+
+
+class KeyIndex:
+    """Row positions of a frame per distinct join key, built once and probed by many joins
+
+    pd.merge factorizes both sides on every call; joining against a
+    KeyIndex only looks up the other side's keys. It answers inner and
+    left joins of another frame with the indexed frame on the right, with
+    pd.merge's rows, columns and dtypes, ordered by left row and then by
+    right row. Left joins match pd.merge's row order too; single-key
+    inner joins of pd.merge may emit the same rows in another order
+    (e.g. with NaN keys or a left key matching several right rows), so
+    compare those order-insensitively. Joins where both sides have
+    missing keys are left to pd.merge, which does not match None with
+    NaN in object columns.
+    """
+
+    def __init__(self, df, on):
+        self.on = list(on)
+        self.rows = len(df)
+        self.dtypes = [df[col].dtype for col in self.on]
+        self.has_nans = any(df[col].hasnans for col in self.on)
+        codes, self.keys = _key_index(df, self.on).factorize(use_na_sentinel=False)
+        # Positions of the rows of each key, grouped by key in row order
+        self.order = np.argsort(codes, kind="stable")
+        self.counts = np.bincount(codes, minlength=len(self.keys))
+        self.starts = np.cumsum(self.counts) - self.counts
+        # Build the key hash table now rather than in the first join
+        self.keys.get_indexer(self.keys[:1])
+
+    def accepts(self, left, right, how):
+        """Return True if join() can answer this join exactly"""
+        return (how in ("inner", "left") and len(right) == self.rows > 0
+                and all(col in left.columns and left[col].dtype == dtype
+                        for col, dtype in zip(self.on, self.dtypes))
+                and not (self.has_nans and any(left[col].hasnans for col in self.on)))
+
+    def indexers(self, left, how):
+        """Return the left and right row positions of a join, -1 for unmatched right rows"""
+        codes = self.keys.get_indexer(_key_index(left, self.on))
+        found = codes >= 0
+        per_row = np.where(found, self.counts[codes], 0)
+        if how == "left":
+            per_row = np.maximum(per_row, 1)
+        left_pos = np.repeat(np.arange(len(left)), per_row)
+        offsets = np.arange(len(left_pos)) - np.repeat(np.cumsum(per_row) - per_row, per_row)
+        matched = np.repeat(found, per_row)
+        right_pos = np.full(len(left_pos), -1, dtype=np.intp)
+        right_pos[matched] = self.order[(np.repeat(self.starts[np.where(found, codes, 0)], per_row)
+                                         + offsets)[matched]]
+        return left_pos, right_pos
+
+    def join(self, left, right, how, suffixes=("_x", "_y")):
+        """Join left with right, the frame (or a row-aligned derivative) this index was built on"""
+        left_pos, right_pos = self.indexers(left, how)
+        left = left.reset_index(drop=True)
+        if not np.array_equal(left_pos, np.arange(len(left))):
+            left = left.take(left_pos).reset_index(drop=True)
+        right = right.drop(columns=self.on).reset_index(drop=True)
+        right = right.take(right_pos) if (right_pos >= 0).all() else right.reindex(right_pos)
+        right = right.reset_index(drop=True)
+
+        overlap = set(left.columns) & set(right.columns)
+        left = left.rename(columns={col: f"{col}{suffixes[0]}" for col in overlap})
+        right = right.rename(columns={col: f"{col}{suffixes[1]}" for col in overlap})
+        return pd.concat([left, right], axis=1)
+
+
+def _key_index(df, on):
+    """Return the join keys of a frame as an Index (MultiIndex for several keys)"""
+    if len(on) == 1:
+        return pd.Index(df[on[0]])
+    return pd.MultiIndex.from_arrays([df[col] for col in on])
+
+
+def merge_frames(left, right, on, merge_strategy, key_index=None):
+    """Merge two frames in memory using a sidebar merge strategy label
+
+    With a KeyIndex built on right's keys, inner and left joins probe it
+    instead of re-hashing right.
+    """
+    how = MERGE_STRATEGIES[merge_strategy]
+    if key_index is not None and key_index.on == list(on) and key_index.accepts(left, right, how):
+        return key_index.join(left, right, how)
+    return pd.merge(left, right, on=list(on), how=how)
+
+
+def run_fusion(left, right, on, merge_strategy, engine="In-memory", workers=None,
+               max_distance_m=DEFAULT_MAX_DISTANCE_M, asof_by=None,
+               asof_tolerance_s=DEFAULT_ASOF_TOLERANCE_S, key_index=None, road_index=None,
+               asof_left_time=None, asof_right_time=None):
+    """Merge two inputs with the selected strategy and fusion engine
+
+    key_index (a KeyIndex of right's join keys) and road_index (a
+    RoadSpatialIndex of right's geometries) are prebuilt indexes reused
+    by in-memory key joins and the nearest-road join. The as-of join
+    matches asof_left_time with asof_right_time (default: detected).
+    """
+    if merge_strategy == NEAREST_ROAD_STRATEGY:
+        return nearest_road_join(left, right, max_distance_m, road_index=road_index)
+    if merge_strategy == ASOF_STRATEGY:
+        return asof_join(left, right, asof_left_time, asof_right_time, by=asof_by,
+                         tolerance_s=asof_tolerance_s)
+    if engine == OUT_OF_CORE_ENGINE:
+        return out_of_core_merge(left, right, on, merge_strategy)
+    if engine == "Parallel (process pool)":
+        return parallel_merge(left, right, on, merge_strategy, workers=workers)
+    return merge_frames(left, right, on, merge_strategy, key_index)
+
+
+def find_time_column(df):
+    """Return the timestamp column of a frame, None if there is none
+
+    Parsed datetime columns win; otherwise the first text column with a
+    timestamp hint as a whole word of its name ('event_ts', not
+    'gps_points') whose values parse as dates is used. Numeric columns
+    are never guessed, pandas would read any number as epoch nanoseconds.
+    """
+    candidates = [col for col in df.columns if col not in METADATA_COLUMNS]
+    for col in candidates:
+        if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            return col
+    for col in candidates:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtype = dtype.categories.dtype
+        if not pd.api.types.is_string_dtype(dtype):
+            continue
+        if not any(word in TIME_COLUMN_HINTS for word in name_words(col)):
+            continue
+        sample = df[col].dropna().head(100)
+        if not sample.empty and _as_datetime(sample).notna().all():
+            return col
+    return None
+
+
+def asof_join(left, right, left_time=None, right_time=None, by=None,
+              tolerance_s=DEFAULT_ASOF_TOLERANCE_S, direction="nearest"):
+    """Match each left row to the closest-in-time right row within a tolerance
+
+    Both sides are sorted on their timestamps (O(n log n)) and matched
+    with pandas.merge_asof, optionally only within groups of the `by`
+    column. Every left row is kept in its original order; rows without
+    a timestamp or without a match get empty right columns. Raises
+    ValueError when a side has no timestamp column or none of its values
+    parse as timestamps.
+    """
+    left_time = left_time or find_time_column(left)
+    right_time = right_time or find_time_column(right)
+    if left_time is None or right_time is None:
+        raise ValueError("As-of join requires a timestamp column in both datasets; "
+                         "select the time columns explicitly")
+
+    row_col = "__asof_row__"
+    left = left.assign(**{row_col: np.arange(len(left))})
+    left_key = _as_datetime(left[left_time])
+    right_key = _as_datetime(right[right_time])
+    for col, values, key in ((left_time, left[left_time], left_key), (right_time, right[right_time], right_key)):
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            raise ValueError(f"As-of join: column '{col}' is numeric, select a datetime or date text column")
+        if values.notna().any() and key.isna().all():
+            # Matching would silently leave every row unmatched
+            raise ValueError(f"As-of join: no value of column '{col}' parses as a timestamp")
+    time_col = "__asof_time__"
+    left = left.assign(**{time_col: left_key})
+    right = right.assign(**{time_col: right_key})
+
+    if by is not None:
+        left, right = _align_key_dtypes(left, right, [by])
+
+    # merge_asof needs non-null, sorted keys; null timestamps are re-attached unmatched
+    left_valid = left[time_col].notna().to_numpy()
+    right = right[right[time_col].notna().to_numpy()]
+    sorted_left = left[left_valid].sort_values(time_col, kind="stable")
+    sorted_right = right.sort_values(time_col, kind="stable")
+
+    tolerance = pd.Timedelta(seconds=tolerance_s) if tolerance_s else None
+    merged = pd.merge_asof(sorted_left, sorted_right, on=time_col, by=by,
+                           tolerance=tolerance, direction=direction)
+    if not left_valid.all():
+        # Joining against an empty right side yields the same columns, all unmatched
+        missing = left[~left_valid].assign(**{time_col: pd.Timestamp(0)})
+        missing[time_col] = missing[time_col].astype(sorted_left[time_col].dtype)
+        unmatched = pd.merge_asof(missing, sorted_right.iloc[:0], on=time_col, by=by)
+        merged = pd.concat([merged, unmatched], ignore_index=True)
+    merged = merged.sort_values(row_col).drop(columns=[row_col, time_col])
+    return merged.reset_index(drop=True)
+
+
+def _as_datetime(series):
+    """Return a naive nanosecond timestamp series, parsing strings where needed
+
+    Strings are parsed as ISO 8601 in one vectorized pass; other formats
+    become NaT. Timestamps with UTC offsets, mixed ones included, are
+    converted to UTC.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(series.dtype):
+        series = pd.to_datetime(series, errors="coerce", format="ISO8601", utc=True)
+    if series.dt.tz is not None:
+        series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+    return series.astype("datetime64[ns]")
+
+
+def _align_key_dtypes(left, right, keys):
+    """Cast join keys with mismatched numeric dtypes to a common dtype"""
+    for key in keys:
+        left_dtype, right_dtype = left[key].dtype, right[key].dtype
+        if left_dtype == right_dtype:
+            continue
+        if pd.api.types.is_numeric_dtype(left_dtype) and pd.api.types.is_numeric_dtype(right_dtype):
+            common = np.result_type(left_dtype, right_dtype)
+        else:
+            common = object
+        left = left.assign(**{key: left[key].astype(common)})
+        right = right.assign(**{key: right[key].astype(common)})
+    return left, right
+
+
+def out_of_core_merge(left, right, on, merge_strategy, buckets=DEFAULT_BUCKETS, tmp_dir=None):
+    """Merge two inputs through on-disk hash buckets and collect the result"""
+    frames = list(iter_bucket_merge(left, right, on, merge_strategy, buckets, tmp_dir))
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_bucket_merge(left, right, on, merge_strategy, buckets=DEFAULT_BUCKETS, tmp_dir=None):
+    """Yield the merge of two inputs one hash bucket at a time
+
+    Inputs may be DataFrames, CSV paths or iterables of DataFrame chunks.
+    Both sides are partitioned by a hash of the join keys into pickle
+    files on disk, so only one bucket pair is held in memory at a time.
+    """
+    on = list(on)
+    how = MERGE_STRATEGIES[merge_strategy]
+    work_dir = tempfile.mkdtemp(prefix="fusion_buckets_", dir=tmp_dir)
+    try:
+        schemas = _partition_inputs(left, right, on, buckets, work_dir)
+        produced = False
+        for bucket in range(buckets):
+            merged = merge_bucket(work_dir, bucket, schemas, on, how)
+            if merged is not None:
+                produced = True
+                yield merged
+        if not produced:
+            yield pd.merge(schemas[0], schemas[1], on=on, how=how)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def parallel_merge(left, right, on, merge_strategy, workers=None, buckets=None, tmp_dir=None):
+    """Merge two inputs by merging hash buckets in a process pool
+
+    Workers receive only a bucket number and read their partitions from
+    disk, then write the merged bucket back to disk, so whole frames are
+    never pickled through the pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    buckets = buckets or workers * BUCKETS_PER_WORKER
+    on = list(on)
+    how = MERGE_STRATEGIES[merge_strategy]
+    work_dir = tempfile.mkdtemp(prefix="fusion_parallel_", dir=tmp_dir)
+    try:
+        schemas = _partition_inputs(left, right, on, buckets, work_dir)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_merge_bucket_to_file, work_dir, bucket, schemas, on, how)
+                for bucket in range(buckets)
+            ]
+            paths = [future.result() for future in futures]
+
+        frames = []
+        for path in paths:
+            if path is not None:
+                with open(path, "rb") as handle:
+                    frames.append(pickle.load(handle))
+        if not frames:
+            return pd.merge(schemas[0], schemas[1], on=on, how=how)
+        return pd.concat(frames, ignore_index=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def merge_bucket(work_dir, bucket, schemas, on, how):
+    """Merge one bucket pair, None when it cannot contribute rows"""
+    left_part = read_bucket(work_dir, "left", bucket, schemas[0])
+    right_part = read_bucket(work_dir, "right", bucket, schemas[1])
+    if _bucket_is_empty(left_part, right_part, how):
+        return None
+    return pd.merge(left_part, right_part, on=on, how=how)
+
+
+def _merge_bucket_to_file(work_dir, bucket, schemas, on, how):
+    """Process pool task: merge one bucket pair and write it to disk"""
+    merged = merge_bucket(work_dir, bucket, schemas, on, how)
+    if merged is None:
+        return None
+    path = os.path.join(work_dir, f"merged_{bucket}.pkl")
+    with open(path, "wb") as handle:
+        pickle.dump(merged, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _partition_inputs(left, right, on, buckets, work_dir):
+    """Partition both inputs into work_dir, return their (left, right) schemas"""
+    left_schema = partition_to_buckets(left, on, buckets, os.path.join(work_dir, "left"))
+    right_schema = partition_to_buckets(right, on, buckets, os.path.join(work_dir, "right"))
+    return left_schema, right_schema
+
+
+def partition_to_buckets(source, on, buckets, prefix):
+    """Append chunks of source to bucket files by key hash, return the schema
+
+    The schema holds the dtypes common to all chunks (CSV chunks infer
+    theirs independently, e.g. int64 vs float64 where a chunk has gaps),
+    which read_bucket casts every bucket to.
+    """
+    schema = None
+    handles = {}
+    try:
+        for chunk in iter_frame_chunks(source):
+            if schema is None:
+                schema = chunk.iloc[:0]
+            elif not schema.dtypes.equals(chunk.dtypes):
+                schema = pd.concat([schema, chunk.iloc[:0]])
+            if chunk.empty:
+                continue
+            bucket_ids = hash_keys(chunk, on) % buckets
+            for bucket, part in chunk.groupby(bucket_ids, sort=False):
+                if bucket not in handles:
+                    handles[bucket] = open(f"{prefix}_{bucket}.pkl", "wb")
+                pickle.dump(part, handles[bucket], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return schema
+
+
+def read_bucket(work_dir, side, bucket, schema):
+    """Load all chunks written to one bucket file"""
+    path = os.path.join(work_dir, f"{side}_{bucket}.pkl")
+    if not os.path.exists(path):
+        return schema
+    parts = []
+    with open(path, "rb") as handle:
+        while True:
+            try:
+                parts.append(pickle.load(handle))
+            except EOFError:
+                break
+    part = pd.concat(parts) if len(parts) > 1 else parts[0]
+    if not part.dtypes.equals(schema.dtypes):
+        part = part.astype(schema.dtypes.to_dict())
+    return part
+
+
+def hash_keys(df, on):
+    """Return a uint64 hash per row of the join key columns
+
+    Numeric keys are hashed as float64 so equal values stored with
+    different dtypes (int32 vs int64 vs float) land in the same bucket.
+    """
+    keys = df[on].copy()
+    for col in on:
+        if pd.api.types.is_numeric_dtype(keys[col].dtype) and not pd.api.types.is_bool_dtype(keys[col].dtype):
+            keys[col] = keys[col].astype("float64")
+        elif isinstance(keys[col].dtype, pd.CategoricalDtype):
+            keys[col] = keys[col].astype(keys[col].cat.categories.dtype)
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def iter_frame_chunks(source, chunk_rows=PARTITION_CHUNK_ROWS):
+    """Yield DataFrame chunks from a frame, a CSV path or an iterable of frames"""
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, max(len(source), 1), chunk_rows):
+            yield source.iloc[start:start + chunk_rows]
+    elif isinstance(source, (str, os.PathLike)):
+        yield from pd.read_csv(source, chunksize=chunk_rows)
+    else:
+        yield from source
+
+
+def _bucket_is_empty(left_part, right_part, how):
+    """Return True when a bucket pair cannot contribute any rows"""
+    if how == "inner":
+        return left_part.empty or right_part.empty
+    if how == "left":
+        return left_part.empty
+    if how == "right":
+        return right_part.empty
+    return left_part.empty and right_part.empty
@@ -0,0 +1,308 @@
+"""
+Columnar GeoJSON builder for the Data Fusion Application
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+# Whole column names recognized as latitude/longitude (case-insensitive)
+LAT_NAMES = ("lat", "latitude")
+LON_NAMES = ("lon", "lng", "long", "longitude")
+# Words marking a coordinate column inside longer names (start_lat, gpsLongitude);
+# 'long' only counts as a whole name, inside names it is mostly the word ('balance_long')
+LAT_WORDS = ("lat", "latitude")
+LON_WORDS = ("lon", "lng", "longitude")
+# Whole column names of projected coordinates, recognized with a projected source CRS
+Y_NAMES = ("y", "northing")
+X_NAMES = ("x", "easting")
+# CRS of exported coordinates
+WGS84 = "EPSG:4326"
+
+
+def create_geojson_from_data(df, scope_number, points=None):
+    """Create GeoJSON from DataFrame with coordinate columns
+
+    points is a prebuilt PointCoordinates of df's rows; by default the
+    coordinate columns are detected and read as WGS84 degrees.
+    """
+    with stage("geojson: find coordinates", rows_in=len(df)) as record:
+        if points is None:
+            points = PointCoordinates(df)
+        record["rows_out"] = points.report["points"]
+
+    if points.lat_col is None or points.lon_col is None:
+        # If no coordinate columns, create a simple GeoJSON with metadata
+        return metadata_feature_collection(df, scope_number)
+
+    with stage("geojson: build features", rows_in=len(df)) as record:
+        features = build_point_features(df, points.lat_col, points.lon_col, points.arrays())
+        record["rows_out"] = len(features)
+    return {
+        "type": "FeatureCollection",
+        "name": f"merged_data_{scope_number}",
+        "features": features
+    }
+
+
+def find_coordinate_columns(df, lat_col=None, lon_col=None, projected=False):
+    """Return the (lat, lon) column names, None where no column matches
+
+    Whole names (lat, latitude, lon, lng, long, longitude) win over
+    names holding one as a word (start_lat, gpsLon), numeric columns
+    over others, earlier columns over later ones; relation_id, platform
+    or balance_long do not match. lat_col/lon_col override the
+    detection; with projected, y/northing and x/easting match as well.
+    """
+    for col in (lat_col, lon_col):
+        if col is not None and col not in df.columns:
+            raise ValueError(f"Coordinate column not found: {col}")
+    if lat_col is None:
+        lat_col = _best_column(df, LAT_NAMES + (Y_NAMES if projected else ()), LAT_WORDS, LON_WORDS, lon_col)
+    if lon_col is None:
+        lon_col = _best_column(df, LON_NAMES + (X_NAMES if projected else ()), LON_WORDS, LAT_WORDS, lat_col)
+    return lat_col, lon_col
+
+
+def name_words(name):
+    """Split a column name into lowercase words: 'GPSLat_2' -> ['gps', 'lat']"""
+    spaced = re.sub(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])", "_", str(name))
+    return re.findall(r"[a-z]+", spaced.lower())
+
+
+def _best_column(df, names, words, other_words, exclude):
+    """Return the best-ranked column named like a coordinate, None if there is none"""
+    candidates = []
+    for position, col in enumerate(df.columns):
+        if col == exclude or not isinstance(df[col], pd.Series):
+            continue
+        col_words = name_words(col)
+        if str(col).strip().lower() in names:
+            rank = 0
+        elif any(word in words for word in col_words) and not any(word in other_words for word in col_words):
+            rank = 1
+        else:
+            continue
+        dtype = df[col].dtype
+        numeric = pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        candidates.append((rank, not numeric, position, col))
+    return min(candidates)[3] if candidates else None
+
+
+def coordinate_key(coordinate_options=None):
+    """Return a hashable key of coordinate options, () for the defaults"""
+    return tuple(sorted((name, value) for name, value in (coordinate_options or {}).items()
+                        if value is not None and value is not False))
+
+
+class PointCoordinates:
+    """WGS84 point coordinates of a frame's rows, validated in bulk
+
+    The coordinate columns are detected unless lat_col/lon_col are given.
+    Their values are coerced to float in one pass, reprojected with
+    pyproj when source_crs is not WGS84, and rows are masked out of
+    `valid` when a coordinate is missing or unparseable, outside
+    -90..90 / -180..180, or (with dedupe) the row repeats an earlier row
+    in every column. `report` counts the kept points and the rejected
+    rows per reason. Without coordinate columns lat_col or lon_col is
+    None and the arrays are empty.
+    """
+
+    def __init__(self, df, lat_col=None, lon_col=None, source_crs=None, dedupe=False):
+        crs = _source_crs(source_crs)
+        reproject = crs is not None and not crs.equals(WGS84, ignore_axis_order=True)
+        self.lat_col, self.lon_col = find_coordinate_columns(df, lat_col, lon_col,
+                                                             projected=reproject and crs.is_projected)
+        self.report = {"lat_col": self.lat_col, "lon_col": self.lon_col, "source_crs": source_crs,
+                       "rows": len(df), "points": 0, "missing": 0, "out_of_range": 0, "duplicates": 0}
+        if self.lat_col is None or self.lon_col is None:
+            self.lats = self.lons = np.empty(0)
+            self.valid = np.zeros(0, dtype=bool)
+            return
+
+        lats = _coerce_coordinates(df[self.lat_col])
+        lons = _coerce_coordinates(df[self.lon_col])
+        present = ~(np.isnan(lats) | np.isnan(lons))
+        if reproject:
+            lats, lons = reproject_points(lats, lons, present, crs)
+        valid = present & in_wgs84_range(lats, lons)
+        self.report["missing"] = int(len(df) - present.sum())
+        self.report["out_of_range"] = int(present.sum() - valid.sum())
+        if dedupe:
+            first = first_occurrences(df)
+            self.report["duplicates"] = int((valid & ~first).sum())
+            valid &= first
+        self.report["points"] = int(valid.sum())
+        self.lats, self.lons, self.valid = lats, lons, valid
+
+    def arrays(self, start=0, stop=None):
+        """Return the (lats, lons, valid) arrays of a slice of rows"""
+        return self.lats[start:stop], self.lons[start:stop], self.valid[start:stop]
+
+    def nbytes(self):
+        """Return the memory held by the coordinate arrays"""
+        return self.lats.nbytes + self.lons.nbytes + self.valid.nbytes
+
+
+def in_wgs84_range(lats, lons):
+    """Return the mask of finite coordinates within -90..90 latitude and -180..180 longitude"""
+    with np.errstate(invalid="ignore"):
+        return (np.abs(lats) <= 90.0) & (np.abs(lons) <= 180.0)
+
+
+def reproject_points(ys, xs, mask, crs):
+    """Reproject the masked y/x coordinates from crs to WGS84, returning (lats, lons)
+
+    Unmasked rows come back as NaN. pyproj is imported on first use.
+    """
+    from pyproj import Transformer
+
+    transformer = Transformer.from_crs(crs, WGS84, always_xy=True)
+    lats = np.full(len(ys), np.nan)
+    lons = np.full(len(xs), np.nan)
+    lons[mask], lats[mask] = transformer.transform(xs[mask], ys[mask])
+    return lats, lons
+
+
+def first_occurrences(df):
+    """Return the mask of rows not repeating an earlier row in every column
+
+    Rows are compared by a hash of their values. Non-numeric columns are
+    hashed by their factorized codes, which only identify values within
+    this frame but are far cheaper to hash than the strings themselves.
+    """
+    columns = {}
+    for position in range(len(df.columns)):
+        values = df.iloc[:, position]
+        if not (pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_datetime64_any_dtype(values.dtype)):
+            values = pd.factorize(values)[0]
+        columns[position] = values
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(columns, index=df.index), index=False)
+    return ~hashes.duplicated().to_numpy()
+
+
+def _source_crs(source_crs):
+    """Parse a source CRS, None when not given"""
+    if source_crs is None or source_crs == "":
+        return None
+    from pyproj import CRS
+    from pyproj.exceptions import CRSError
+
+    try:
+        return CRS.from_user_input(source_crs)
+    except CRSError as e:
+        raise ValueError(f"Unknown source CRS {source_crs!r}: {e}") from None
+
+
+def metadata_feature_collection(df, scope_number):
+    """Create the placeholder GeoJSON used when no coordinates exist"""
+    return {
+        "type": "FeatureCollection",
+        "name": f"merged_data_{scope_number}",
+        "features": [{
+            "type": "Feature",
+            "properties": {
+                "scope": scope_number,
+                "total_records": len(df),
+                "description": "Merged dataset without spatial coordinates"
+            },
+            "geometry": {
+                "type": "Point",
+                "coordinates": [0, 0]  # Default coordinates
+            }
+        }]
+    }
+
+
+def build_point_features(df, lat_col, lon_col, coordinates=None):
+    """Build Point features for every row with valid coordinates
+
+    coordinates is the (lats, lons, valid) of df's rows, as returned by
+    coordinate_arrays or PointCoordinates.arrays; the lat/lon columns
+    are left out of the properties either way.
+    """
+    df = _upcast_like_rows(df)
+
+    lats, lons, valid = coordinate_arrays(df, lat_col, lon_col) if coordinates is None else coordinates
+    if not valid.all():
+        df = df[valid]
+        lats = lats[valid]
+        lons = lons[valid]
+
+    prop_names = [col for col in df.columns if col not in [lat_col, lon_col]]
+    prop_columns = [json_column_values(df[col]) for col in prop_names]
+
+    geometries = [
+        {"type": "Point", "coordinates": [lon, lat]}
+        for lon, lat in zip(lons.tolist(), lats.tolist())
+    ]
+    if prop_columns:
+        properties = [dict(zip(prop_names, row)) for row in zip(*prop_columns)]
+    else:
+        properties = [{} for _ in geometries]
+
+    return [
+        {"type": "Feature", "properties": props, "geometry": geometry}
+        for props, geometry in zip(properties, geometries)
+    ]
+
+
+def coordinate_arrays(df, lat_col, lon_col):
+    """Return float64 lat and lon arrays plus the mask of rows with both set and in range"""
+    # Validate coordinates with NumPy masks instead of per-row float() casts
+    lats = _coerce_coordinates(df[lat_col])
+    lons = _coerce_coordinates(df[lon_col])
+    valid = in_wgs84_range(lats, lons)
+    return lats, lons, valid
+
+
+def json_column_values(series):
+    """Convert a column to a list of JSON-serializable values (NaN -> None)"""
+    values = series.tolist()
+    dtype = series.dtype
+    if not (pd.api.types.is_float_dtype(dtype)
+            or pd.api.types.is_integer_dtype(dtype)
+            or pd.api.types.is_bool_dtype(dtype)):
+        # Object, datetime and categorical columns may hold non-JSON scalars
+        values = [_json_scalar(value) for value in values]
+
+    missing = series.isna().to_numpy()
+    if missing.any():
+        for idx in np.flatnonzero(missing).tolist():
+            values[idx] = None
+    return values
+
+
+def _json_scalar(value):
+    """Convert a single non-native value to its JSON representation"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _coerce_coordinates(series):
+    """Convert a coordinate column to float64, unparseable values become NaN"""
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _upcast_like_rows(df):
+    """Apply the common-dtype upcast that row-wise iteration performs
+
+    Reading a frame row by row casts every value to the frame's common
+    dtype (e.g. int columns become float when mixed with float columns),
+    which the previous iterrows-based builder exposed in its output.
+    """
+    common_dtype = df.iloc[:0].to_numpy().dtype
+    if common_dtype == object or len(df.columns) == 0:
+        return df
+    if all(dtype == common_dtype for dtype in df.dtypes):
+        return df
+    return df.astype(common_dtype)
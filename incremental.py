@@ -0,0 +1,224 @@
+"""
+Incremental fusion history: per-scope fused output partitioned by processing date
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from fusion import ASOF_STRATEGY, NEAREST_ROAD_STRATEGY, find_time_column
+from result_store import file_lock, read_frame, write_atomic, write_frame
+
+# Default location of the incremental fusion history
+DEFAULT_HISTORY_DIR = os.path.join(tempfile.gettempdir(), "data_fusion_history")
+# Strategies whose output for a BMS row depends only on that row and the road table
+INCREMENTAL_STRATEGIES = ("Inner Join", "Left Join", NEAREST_ROAD_STRATEGY, ASOF_STRATEGY)
+# Fusion options that change how rows are fused but not the fused rows
+RESULT_NEUTRAL_OPTIONS = ("engine", "workers", "road_reference", "sources")
+
+# Rows of the previous upload re-hashed to check that a new upload extends it
+PREFIX_CHECK_ROWS = 64
+# Temporary column carrying each BMS row's partition through the fusion
+PARTITION_COLUMN = "__partition__"
+
+MANIFEST_NAME = "manifest.json"
+
+
+def row_hashes(df):
+    """Return a uint64 hash of every row's values, independent of the index"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def partition_keys(df, default_date, time_col=None):
+    """Return the partition of every row: the date of its timestamp, default_date without one
+
+    The timestamp column is time_col, or the one find_time_column detects.
+    """
+    keys = np.full(len(df), str(default_date), dtype=object)
+    time_col = time_col or find_time_column(df)
+    if time_col is None or df.empty:
+        return keys
+    values = df[time_col]
+    if not pd.api.types.is_datetime64_any_dtype(values.dtype):
+        values = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    valid = values.notna().to_numpy()
+    keys[valid] = values[valid].dt.strftime("%Y-%m-%d").to_numpy()
+    return keys
+
+
+def upload_marks(df):
+    """Return the row count and the hashes of evenly spaced rows of an upload"""
+    positions = np.unique(np.linspace(0, len(df) - 1, min(len(df), PREFIX_CHECK_ROWS)).astype(np.int64))
+    return {"rows": len(df), "hashes": row_hashes(df.iloc[positions]).tolist()}
+
+
+def frame_digest(df):
+    """Return a digest of a frame's column names, dtypes and values"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(row_hashes(df).tobytes())
+    return digest.hexdigest()
+
+
+def settings_digest(bms_df, merge_strategy, fusion_options):
+    """Return a digest of everything besides the road table that shapes the fused rows
+
+    BMS dtypes are included because row hashes depend on them: parsing
+    the same CSV with other read options must not make old rows look new.
+    """
+    options = sorted(
+        (name, repr(tuple(value) if isinstance(value, list) else value))
+        for name, value in fusion_options.items() if name not in RESULT_NEUTRAL_OPTIONS
+    )
+    dtypes = [(str(col), str(dtype)) for col, dtype in bms_df.dtypes.items()]
+    return hashlib.blake2b(repr((merge_strategy, options, dtypes)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class IncrementalHistory:
+    """Fused output per scope, one partition file per date of the fused BMS rows
+
+    Alongside the partitions each scope keeps the hashes of every BMS row
+    fused so far, so a re-uploaded history is reduced to its new rows, and
+    a manifest with the road table and settings digests the partitions
+    were fused with. Rows identical to an already fused row count as
+    already fused; rows dropped from a later upload are not retracted.
+
+    Files are never rewritten in place: an update writes new partition and
+    hash files, then swaps the manifest naming them, so a crash leaves the
+    previous state intact. Updates of a scope are serialized by a lock
+    file, between processes as well (see scope_lock).
+    """
+
+    def __init__(self, directory=DEFAULT_HISTORY_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _scope_dir(self, scope_number):
+        return os.path.join(self.directory, str(scope_number))
+
+    def scope_lock(self, scope_number):
+        """Return a context manager holding the lock that serializes updates of one scope"""
+        return file_lock(os.path.join(self.directory, f"{scope_number}.lock"))
+
+    def manifest(self, scope_number):
+        """Return a scope's manifest, None if nothing was fused for it yet"""
+        path = os.path.join(self._scope_dir(scope_number), MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            return json.load(handle)
+
+    def begin(self, scope_number, settings, road):
+        """Prepare a scope for an update, returning True if its history was reset
+
+        The history is dropped when the road table or the settings differ
+        from those the stored partitions were fused with.
+        """
+        manifest = self.manifest(scope_number)
+        # Histories from before partitions were listed in the manifest are rebuilt too
+        if (manifest is not None and "files" in manifest and manifest["settings"] == settings
+                and manifest["road"] == road):
+            return False
+        rebuilt = manifest is not None
+        self.reset(scope_number)
+        os.makedirs(self._scope_dir(scope_number))
+        self._write_manifest(scope_number, {
+            "scope": str(scope_number), "settings": settings, "road": road, "generation": 0,
+            "partitions": {}, "files": {}, "seen": None, "upload": None, "latest": [], "history_rows": 0,
+        })
+        return rebuilt
+
+    def fused_offset(self, scope_number, df):
+        """Return how many leading rows of df are the previous upload's rows, all fused already
+
+        An upload that extends the previous one (same rows first, new
+        rows appended) is recognized from the hashes of a few of its
+        leading rows, so only the rows past the offset need hashing.
+        """
+        upload = self.manifest(scope_number)["upload"]
+        if upload is None or len(df) < upload["rows"]:
+            return 0
+        if upload_marks(df.iloc[:upload["rows"]])["hashes"] != upload["hashes"]:
+            return 0
+        return upload["rows"]
+
+    def new_row_mask(self, scope_number, hashes):
+        """Return the mask of rows whose hash was not fused for the scope yet"""
+        return ~np.isin(hashes, self._seen(self.manifest(scope_number)))
+
+    def append(self, scope_number, fused_df, keys, hashes, upload):
+        """Append fused rows to the partitions of their keys and return the updated partitions
+
+        keys holds the partition of every fused row (see partition_keys);
+        hashes are the BMS row hashes the rows were fused from, marked as
+        fused for the scope, and upload the upload_marks of the upload
+        they came from. The updated partitions are read back and
+        concatenated in key order; without fused rows, nothing but the
+        hashes is updated.
+        """
+        manifest = self.manifest(scope_number)
+        generation = manifest["generation"] + 1
+        scope_dir = self._scope_dir(scope_number)
+        partitions = []
+        for key, rows in fused_df.groupby(np.asarray(keys), sort=True):
+            key = str(key)
+            existing = manifest["files"].get(key)
+            partition = rows if existing is None else pd.concat(
+                [read_frame(os.path.join(scope_dir, existing)), rows], ignore_index=True)
+            written = write_frame(partition.reset_index(drop=True), os.path.join(scope_dir, f"{key}.{generation}"))
+            manifest["files"][key] = os.path.basename(written)
+            manifest["partitions"][key] = len(partition)
+            partitions.append(written)
+        if len(hashes):
+            seen = np.union1d(self._seen(manifest), hashes)
+            manifest["seen"] = f"seen.{generation}.npy"
+            write_atomic(os.path.join(scope_dir, manifest["seen"]), lambda handle: np.save(handle, seen))
+        manifest["generation"] = generation
+        manifest["upload"] = upload
+        manifest["latest"] = sorted(str(key) for key in set(keys))
+        manifest["history_rows"] = sum(manifest["partitions"].values())
+        # The manifest swap commits the update; files it no longer names are dropped after
+        self._write_manifest(scope_number, manifest)
+        self._remove_unlisted(scope_number, manifest)
+        if not partitions:
+            return fused_df
+        # Read back, so the partitions are exactly those later loads return
+        return pd.concat([read_frame(path) for path in partitions], ignore_index=True)
+
+    def load(self, scope_number, dates=None):
+        """Return the fused history of a scope (optionally only some dates), oldest first"""
+        manifest = self.manifest(scope_number)
+        if manifest is None:
+            return None
+        keys = sorted(manifest["files"]) if dates is None else sorted(str(value) for value in dates)
+        frames = [read_frame(os.path.join(self._scope_dir(scope_number), manifest["files"][key]))
+                  for key in keys if key in manifest["files"]]
+        return pd.concat(frames, ignore_index=True) if frames else None
+
+    def reset(self, scope_number):
+        """Delete the history of a scope"""
+        shutil.rmtree(self._scope_dir(scope_number), ignore_errors=True)
+
+    def _seen(self, manifest):
+        if manifest is None or manifest["seen"] is None:
+            return np.empty(0, dtype=np.uint64)
+        return np.load(os.path.join(self._scope_dir(manifest["scope"]), manifest["seen"]))
+
+    def _remove_unlisted(self, scope_number, manifest):
+        """Delete files of the scope the manifest does not name, e.g. left by a crashed update"""
+        listed = {MANIFEST_NAME, manifest["seen"], *manifest["files"].values()}
+        scope_dir = self._scope_dir(scope_number)
+        for name in os.listdir(scope_dir):
+            if name not in listed:
+                os.remove(os.path.join(scope_dir, name))
+
+    def _write_manifest(self, scope_number, manifest):
+        manifest["updated"] = datetime.now().isoformat(timespec="seconds")
+        write_atomic(os.path.join(self._scope_dir(scope_number), MANIFEST_NAME),
+                     lambda handle: handle.write(json.dumps(manifest, indent=2).encode("utf-8")))
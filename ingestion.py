@@ -0,0 +1,139 @@
+"""
+Typed, low-memory CSV ingestion for the Data Fusion Application
+"""
+
+import functools
+import importlib.util
+import io
+
+import numpy as np
+import pandas as pd
+
+# Rows read up front to infer compact dtypes
+SAMPLE_ROWS = 10_000
+# String columns with at most this share of distinct values become categories
+CATEGORY_MAX_RATIO = 0.5
+
+
+@functools.lru_cache(maxsize=None)
+def arrow_available():
+    """Return True when the optional pyarrow package is installed"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def read_csv_typed(source, optimize=True, use_arrow=False, sample_rows=SAMPLE_ROWS):
+    """Read a CSV with compact dtypes and report its memory footprint
+
+    Returns the DataFrame and a report with the estimated memory of a
+    default read ('before_bytes') and the actual memory ('after_bytes').
+    """
+    use_arrow = use_arrow and arrow_available()
+    sample = pd.read_csv(source, nrows=sample_rows)
+    _rewind(source)
+
+    read_options = {}
+    if optimize:
+        category_cols, date_cols = infer_column_types(sample)
+        if category_cols and not use_arrow:
+            read_options['dtype'] = {col: 'category' for col in category_cols}
+        if date_cols:
+            read_options['parse_dates'] = date_cols
+            read_options['date_format'] = 'ISO8601'
+    if use_arrow:
+        read_options['engine'] = 'pyarrow'
+        read_options['dtype_backend'] = 'pyarrow'
+
+    df = pd.read_csv(source, **read_options)
+    if optimize and use_arrow:
+        # Arrow-backed numerics are already compact, only dictionary-encode
+        df = df.astype({col: 'category' for col in category_cols})
+    elif optimize:
+        df = downcast_numeric(df)
+
+    sample_bytes = int(sample.memory_usage(index=True, deep=True).sum())
+    before_bytes = sample_bytes if len(sample) >= len(df) else int(sample_bytes / max(len(sample), 1) * len(df))
+    report = {
+        "rows": len(df),
+        "engine": "pyarrow" if use_arrow else "c",
+        "before_bytes": before_bytes,
+        "after_bytes": int(df.memory_usage(index=True, deep=True).sum()),
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()
+                   if str(dtype) != str(sample.dtypes.get(col))},
+    }
+    return df, report
+
+
+def iter_csv_typed(source, chunk_rows, optimize=True, columns=None, sample_rows=SAMPLE_ROWS):
+    """Yield a CSV path or the bytes of an upload as DataFrame chunks
+
+    With optimize, the timestamp columns read_csv_typed would parse are
+    parsed in every chunk. Categories and downcasts are left out, chunks
+    would infer them independently. With columns only those are read.
+    """
+    usecols = None if columns is None else (lambda col: col in columns)
+    read_options = {}
+    if optimize:
+        _, date_cols = infer_column_types(pd.read_csv(_csv_source(source), nrows=sample_rows, usecols=usecols))
+        if date_cols:
+            read_options['parse_dates'] = date_cols
+            read_options['date_format'] = 'ISO8601'
+    with pd.read_csv(_csv_source(source), chunksize=chunk_rows, usecols=usecols, **read_options) as reader:
+        yield from reader
+
+
+def csv_header(source):
+    """Return an empty frame with the columns of a CSV path or upload bytes"""
+    return pd.read_csv(_csv_source(source), nrows=0)
+
+
+def _csv_source(source):
+    """Wrap upload bytes in a fresh buffer, paths pass through"""
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def infer_column_types(sample):
+    """Return (category columns, timestamp columns) detected in a sample"""
+    category_cols = []
+    date_cols = []
+    for col in sample.columns:
+        series = sample[col]
+        if not pd.api.types.is_string_dtype(series.dtype):
+            continue
+        values = series.dropna()
+        if values.empty:
+            continue
+        parsed = pd.to_datetime(values, errors='coerce', format='ISO8601')
+        if parsed.notna().all():
+            date_cols.append(col)
+        elif values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+            category_cols.append(col)
+    return category_cols, date_cols
+
+
+def downcast_numeric(df):
+    """Downcast int64/float64 columns where the conversion is lossless"""
+    converted = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == np.int64:
+            smaller = pd.to_numeric(series, downcast='integer')
+            # Keep at least int32 so later arithmetic does not overflow quickly
+            if smaller.dtype.itemsize < 4:
+                smaller = series.astype(np.int32)
+            if smaller.dtype != series.dtype:
+                converted[col] = smaller
+        elif series.dtype == np.float64:
+            smaller = series.astype(np.float32)
+            values = series.to_numpy()
+            roundtrip = smaller.to_numpy().astype(np.float64)
+            if np.array_equal(values, roundtrip, equal_nan=True):
+                converted[col] = smaller
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def _rewind(source):
+    """Seek file-like sources back to the start"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
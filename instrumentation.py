@@ -0,0 +1,207 @@
+"""
+Hot-path instrumentation: per-stage wall/CPU time, memory and row counts
+"""
+
+import contextlib
+import contextvars
+import functools
+import importlib.util
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Logger emitting one JSON line per finished run
+RUN_LOGGER = "data_fusion.runs"
+# Runs kept per session for the diagnostics panel
+MAX_RECENT_RUNS = 10
+
+_current_run = contextvars.ContextVar("data_fusion_run", default=None)
+# Traced stages open in any thread; the tracer runs while there is one
+_traced_records = []
+_tracer_lock = threading.Lock()
+_owns_tracer = False
+
+
+@functools.lru_cache(maxsize=None)
+def psutil_available():
+    """Return True when the optional psutil package is installed"""
+    return importlib.util.find_spec("psutil") is not None
+
+
+def process_rss():
+    """Return the process resident set size in bytes, None if unknown
+
+    Uses psutil when installed; otherwise falls back to the peak RSS
+    reported by getrusage, which only ever grows.
+    """
+    if psutil_available():
+        import psutil
+        return psutil.Process().memory_info().rss
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    return None
+
+
+class Run:
+    """Stage timings of one app run or fusion job
+
+    Stages are recorded by the module-level stage() while the run is
+    active, so instrumented functions need no run argument. cpu_seconds
+    is the CPU time of the thread running the stage. With trace_memory,
+    each stage also records its tracemalloc peak, nested stages included
+    in their enclosing stage's peak; tracing slows allocation-heavy code
+    down and is process-wide, so peaks of stages running concurrently in
+    other threads overlap.
+    """
+
+    def __init__(self, name, trace_memory=False, **context):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.trace_memory = trace_memory
+        self.context = context
+        self.stages = []
+        self.status = None
+        self.started_at = time.time()
+        self.total_seconds = None
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Make this the run stage() records into, in the current thread"""
+        token = _current_run.set(self)
+        try:
+            yield self
+        finally:
+            _current_run.reset(token)
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None, **details):
+        """Time a stage; set record['rows_out'] (or other fields) inside the block"""
+        record = {"stage": name, "rows_in": rows_in, "rows_out": None, **details}
+        if self.trace_memory:
+            _start_tracing(record)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.thread_time() - cpu
+            record["rss_bytes"] = process_rss()
+            if self.trace_memory:
+                _stop_tracing(record)
+            self.stages.append(record)
+
+    def finish(self, status="ok"):
+        """Close the run and return its record"""
+        self.status = status
+        self.total_seconds = time.perf_counter() - self._started
+        return self.record()
+
+    def record(self):
+        """Return the run as a JSON-serializable dict"""
+        return {
+            "event": "data_fusion.run",
+            "run_id": self.id,
+            "run": self.name,
+            "status": self.status,
+            "started": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "total_seconds": self.total_seconds,
+            "context": self.context,
+            "stages": list(self.stages),
+        }
+
+    def log(self):
+        """Emit the run record as one JSON log line and return it"""
+        record = self.record()
+        run_logger().info(json.dumps(record, default=str))
+        return record
+
+
+def _start_tracing(record):
+    """Start tracing for a stage unless it is already on, and restart the peak for it
+
+    The peak so far is first credited to every open traced stage, so
+    resetting it for this stage does not lower theirs.
+    """
+    global _owns_tracer
+    with _tracer_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracer = True
+        _credit_peak()
+        tracemalloc.reset_peak()
+        record["peak_traced_bytes"] = 0
+        _traced_records.append(record)
+
+
+def _stop_tracing(record):
+    """Record a stage's peak and stop tracing once no traced stage is open"""
+    global _owns_tracer
+    with _tracer_lock:
+        _credit_peak()
+        # By identity: records of different stages may compare equal
+        _traced_records[:] = [other for other in _traced_records if other is not record]
+        # A tracer started outside of the runs (e.g. by a test) is left running
+        if not _traced_records and _owns_tracer:
+            tracemalloc.stop()
+            _owns_tracer = False
+
+
+def _credit_peak():
+    """Raise the peak of every open traced stage to the tracer's current peak"""
+    peak = tracemalloc.get_traced_memory()[1]
+    for record in _traced_records:
+        record["peak_traced_bytes"] = max(record["peak_traced_bytes"], peak)
+
+
+def current_run():
+    """Return the run active in this thread, None if there is none"""
+    return _current_run.get()
+
+
+@contextlib.contextmanager
+def stage(name, rows_in=None, **details):
+    """Record a stage into the active run; a no-op without one"""
+    run = _current_run.get()
+    if run is None:
+        yield {}
+        return
+    with run.stage(name, rows_in, **details) as record:
+        yield record
+
+
+def run_logger():
+    """Return the run logger, writing JSON lines to stderr unless configured otherwise"""
+    logger = logging.getLogger(RUN_LOGGER)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def stages_frame(record):
+    """Return a run record's stages as a table for display"""
+    columns = ["stage", "wall_seconds", "cpu_seconds", "rows_in", "rows_out", "rss_bytes",
+               "peak_traced_bytes"]
+    frame = pd.DataFrame(record["stages"])
+    return frame[[col for col in columns if col in frame.columns]]
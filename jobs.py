@@ -0,0 +1,182 @@
+"""
+Background job runner shared by every app session
+"""
+
+import logging
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs executed at the same time; further submissions wait in the queue
+DEFAULT_MAX_JOBS = 2
+# Finished jobs kept for sessions that have not collected them yet
+MAX_FINISHED_JOBS = 16
+# Seconds between progress refreshes in the app
+JOB_POLL_SECONDS = 1.0
+# Logger receiving the traceback of every failed job
+JOB_LOGGER = "data_fusion.jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancellation was requested"""
+
+
+class Job:
+    """State of one background job, polled by the session that submitted it"""
+
+    def __init__(self, label, key=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.key = key
+        self.status = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.stage_seconds = {}
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._stage_started = None
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED_STATES
+
+    def set_stage(self, stage, progress=None):
+        """Enter the next stage, raising JobCancelled if cancellation was requested"""
+        self.check_cancelled()
+        self._close_stage()
+        self.stage = stage
+        self._stage_started = time.perf_counter()
+        if progress is not None:
+            self.progress = progress
+
+    def track(self, items, total, start, end):
+        """Yield items while moving progress from start to end
+
+        Cancellation is checked before every item, so long exports stop
+        at the next chunk boundary.
+        """
+        for count, item in enumerate(items, 1):
+            self.check_cancelled()
+            yield item
+            self.progress = start + (end - start) * min(count / total, 1.0) if total else end
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.label)
+
+    def cancel(self):
+        """Request cancellation; queued jobs are dropped right away"""
+        self._cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+
+    def elapsed(self):
+        """Return seconds since the job started (or was submitted, if queued)"""
+        end = self.finished_at or time.time()
+        return end - (self.started_at or self.submitted_at)
+
+    def _close_stage(self):
+        if self.stage is not None and self._stage_started is not None:
+            self.stage_seconds[self.stage] = time.perf_counter() - self._stage_started
+            self._stage_started = None
+
+    def _finish(self, status):
+        self._close_stage()
+        self.status = status
+        self.finished_at = time.time()
+        if status == DONE:
+            self.progress = 1.0
+
+
+class JobRegistry:
+    """Thread pool plus an id -> Job registry with a concurrency limit"""
+
+    def __init__(self, max_workers=DEFAULT_MAX_JOBS, max_finished=MAX_FINISHED_JOBS):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fusion-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, label, func, *args, key=None, **kwargs):
+        """Queue func(job, *args, **kwargs) and return its Job"""
+        job = Job(label, key)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job._future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        """Execute a job in a worker thread, recording its outcome"""
+        if job._cancel_event.is_set():
+            job._finish(CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            # The message alone may be empty (e.g. a bare KeyError), name the type too
+            job.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            job.traceback = traceback.format_exc()
+            logging.getLogger(JOB_LOGGER).error("Job %s (%s) failed\n%s", job.id, job.label, job.traceback)
+            job._finish(FAILED)
+        else:
+            job._finish(DONE)
+
+    def get(self, job_id):
+        """Return a job by id, None if unknown or already collected"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id):
+        """Forget a job once its submitter has collected the outcome"""
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def queued_ahead(self, job):
+        """Return how many queued jobs were submitted before job"""
+        with self._lock:
+            ahead = 0
+            for other in self._jobs.values():
+                if other is job:
+                    break
+                ahead += other.status == QUEUED
+            return ahead
+
+    def stats(self):
+        """Return running/queued/finished job counts and the concurrency limit"""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "running": statuses.count(RUNNING),
+            "queued": statuses.count(QUEUED),
+            "finished": sum(status in FINISHED_STATES for status in statuses),
+            "max_workers": self.max_workers,
+        }
+
+    def _prune(self):
+        """Drop the oldest uncollected finished jobs beyond max_finished"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
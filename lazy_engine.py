@@ -0,0 +1,245 @@
+"""
+Lazy Polars fusion engine: scans, tags and joins both inputs in one query plan
+"""
+
+import functools
+import importlib.util
+import io
+
+import numpy as np
+import pandas as pd
+
+from fusion import MERGE_STRATEGIES, METADATA_COLUMNS
+from ingestion import SAMPLE_ROWS, infer_column_types
+
+
+@functools.lru_cache(maxsize=None)
+def polars_available():
+    """Return True when the optional polars package is installed"""
+    return importlib.util.find_spec("polars") is not None
+
+
+def scan_input(source, columns=None, optimize=True):
+    """Return a LazyFrame over a DataFrame, a CSV path or the bytes of a CSV upload
+
+    Selecting columns here lets Polars push the projection down into the
+    CSV reader, so unused columns are never parsed. With optimize, CSV
+    columns read_csv_typed would make categorical are scanned as such.
+    """
+    import polars as pl
+    if isinstance(source, pd.DataFrame):
+        if columns is not None:
+            source = source[[col for col in source.columns if col in columns]]
+        return pl.from_pandas(source).lazy()
+    schema_overrides = None
+    if optimize:
+        sample_source = io.BytesIO(source) if isinstance(source, bytes) else source
+        category_cols, _ = infer_column_types(pd.read_csv(sample_source, nrows=SAMPLE_ROWS))
+        schema_overrides = {col: pl.Categorical for col in category_cols}
+    lazy = pl.scan_csv(source, try_parse_dates=True, schema_overrides=schema_overrides)
+    if columns is not None:
+        lazy = lazy.select([col for col in lazy.collect_schema().names() if col in columns])
+    return lazy
+
+
+def tag_source(lazy, source, scope_number, selected_date):
+    """Add the metadata columns to a LazyFrame, like add_source_metadata"""
+    import polars as pl
+    return lazy.with_columns(
+        pl.lit(source).alias('data_source'),
+        pl.lit(scope_number).alias('scope'),
+        pl.lit(selected_date).alias('processing_date'),
+    )
+
+
+def _align_keys(left, right, on):
+    """Cast join keys with mismatched dtypes to a common dtype on both sides
+
+    Follows planner.normalize_key_dtypes: numeric keys are compared as
+    floats, a text key whose values all parse as the other side's
+    numbers or timestamps is converted (one pass over the key column),
+    and any other mismatch is compared as strings.
+    """
+    import polars as pl
+    left_schema, right_schema = left.collect_schema(), right.collect_schema()
+    left_casts, right_casts = {}, {}
+    for key in on:
+        left_dtype, right_dtype = left_schema[key], right_schema[key]
+        if left_dtype == right_dtype:
+            continue
+        left_kind, right_kind = _key_kind(left_dtype), _key_kind(right_dtype)
+        if left_kind == right_kind and left_kind in ("numeric", "datetime"):
+            common = pl.Float64 if left_kind == "numeric" else pl.Datetime("us")
+            left_casts[key] = right_casts[key] = pl.col(key).cast(common)
+            continue
+        converted = None
+        if left_kind == "string" and right_kind in ("numeric", "datetime"):
+            converted = _parsed_key(left, key, right_kind)
+            if converted is not None:
+                left_casts[key], right_casts[key] = converted
+        elif right_kind == "string" and left_kind in ("numeric", "datetime"):
+            converted = _parsed_key(right, key, left_kind)
+            if converted is not None:
+                right_casts[key], left_casts[key] = converted
+        if converted is None:
+            left_casts[key] = right_casts[key] = pl.col(key).cast(pl.String)
+    if left_casts:
+        left = left.with_columns(list(left_casts.values()))
+        right = right.with_columns(list(right_casts.values()))
+    return left, right
+
+
+def _key_kind(dtype):
+    """Classify a Polars key dtype like planner.key_kind"""
+    import polars as pl
+    if dtype == pl.Boolean:
+        return "bool"
+    if dtype.is_numeric():
+        return "numeric"
+    if dtype.is_temporal():
+        return "datetime"
+    return "string"
+
+
+def _parsed_key(lazy, key, kind):
+    """Return (text side, other side) casts parsing a text key as numbers/timestamps
+
+    None if any value of the text key fails to parse.
+    """
+    import polars as pl
+    text = pl.col(key).cast(pl.String)
+    if kind == "numeric":
+        common = pl.Float64
+        parsed = text.cast(common, strict=False)
+    else:
+        common = pl.Datetime("us")
+        parsed = text.str.to_datetime(time_unit="us", strict=False)
+    try:
+        failed = lazy.select((parsed.is_null() & pl.col(key).is_not_null()).any()).collect().item()
+    except pl.exceptions.PolarsError:
+        # e.g. timestamps with time zones, which need an explicit format
+        return None
+    if failed:
+        return None
+    return parsed.alias(key), pl.col(key).cast(common)
+
+
+def lazy_join(left, right, on, merge_strategy, suffixes=("_x", "_y")):
+    """Join two LazyFrames with pandas.merge column naming and row order
+
+    Returns the joined LazyFrame and the {output column: (side, column)}
+    map of the suffixed overlapping columns.
+    """
+    import polars as pl
+    how = MERGE_STRATEGIES[merge_strategy]
+    on = list(on)
+    left, right = _align_keys(left, right, on)
+    left_names = left.collect_schema().names()
+    right_names = right.collect_schema().names()
+    overlap = (set(left_names) & set(right_names)) - set(on)
+    renamed = {}
+    for col in overlap:
+        renamed[f"{col}{suffixes[0]}"] = ("left", col)
+        renamed[f"{col}{suffixes[1]}"] = ("right", col)
+    left = left.rename({col: f"{col}{suffixes[0]}" for col in overlap})
+    right = right.rename({col: f"{col}{suffixes[1]}" for col in overlap})
+
+    if how == "outer":
+        # pandas sorts full outer joins by key (missing categories first, other
+        # missing keys last); keep ties in left-then-right order
+        schema = left.collect_schema()
+        nulls_last = [not isinstance(schema[key], pl.Categorical) for key in on]
+        joined = left.join(right, on=on, how="full", coalesce=True, nulls_equal=True,
+                           maintain_order="left_right")
+        joined = joined.sort(on, nulls_last=nulls_last, maintain_order=True)
+    else:
+        joined = left.join(right, on=on, how=how, coalesce=True, nulls_equal=True,
+                           maintain_order="right" if how == "right" else "left")
+
+    # pandas puts the left columns first, then the right non-key columns
+    output = [_suffixed(col, overlap, suffixes[0]) for col in left_names]
+    output += [_suffixed(col, overlap, suffixes[1]) for col in right_names if col not in on]
+    return joined.select(output), renamed
+
+
+def _suffixed(col, overlap, suffix):
+    """Return a column's output name after overlap suffixing"""
+    return f"{col}{suffix}" if col in overlap else col
+
+
+def constant_categoricals(df, renamed, values):
+    """Turn the metadata columns of a collected frame into constant categoricals
+
+    Rows a side did not contribute are missing, exactly as in the pandas
+    merge of two add_source_metadata-tagged frames.
+    """
+    for output, (side, col) in renamed.items():
+        if col not in METADATA_COLUMNS:
+            continue
+        codes = np.where(df[output].notna().to_numpy(), 0, -1).astype(np.int8)
+        df[output] = pd.Categorical.from_codes(codes, categories=pd.Index([values[side][col]], dtype=object))
+    return df
+
+
+def column_names(source):
+    """Return the column names of a DataFrame, CSV path or CSV bytes without reading its rows"""
+    import polars as pl
+    if isinstance(source, pd.DataFrame):
+        return list(source.columns)
+    return pl.scan_csv(source).collect_schema().names()
+
+
+def estimate_lazy_join_rows(bms, road, merge_strategy="Inner Join", on=None, optimize=True):
+    """Return the output row count of a join from grouped key counts
+
+    Only the key columns are scanned, so this is far cheaper than the join.
+    """
+    import polars as pl
+    how = MERGE_STRATEGIES[merge_strategy]
+    if on is None:
+        on = shared_columns(bms, road)
+    left, right = _align_keys(scan_input(bms, set(on), optimize), scan_input(road, set(on), optimize), on)
+    left_counts = left.group_by(on).agg(pl.len().alias("left_rows"))
+    right_counts = right.group_by(on).agg(pl.len().alias("right_rows"))
+    counts = left_counts.join(right_counts, on=on, how="full", coalesce=True, nulls_equal=True)
+    counts = counts.select(pl.col("left_rows").fill_null(0), pl.col("right_rows").fill_null(0))
+    counts = counts.collect(engine="streaming")
+    left_rows = counts["left_rows"].cast(pl.Int64)
+    right_rows = counts["right_rows"].cast(pl.Int64)
+    rows = (left_rows * right_rows).sum()
+    if how in ("left", "outer"):
+        rows += left_rows.filter(right_rows == 0).sum()
+    if how in ("right", "outer"):
+        rows += right_rows.filter(left_rows == 0).sum()
+    return int(rows)
+
+
+def shared_columns(bms, road):
+    """Return the join columns shared by both sources, in BMS column order"""
+    road_columns = set(column_names(road)) - set(METADATA_COLUMNS)
+    return [col for col in column_names(bms) if col in road_columns]
+
+
+def lazy_fuse(bms, road, scope_number, selected_date, merge_strategy="Inner Join", on=None,
+              columns=None, optimize=True):
+    """Tag and join two inputs in a single lazy Polars query
+
+    Inputs may be DataFrames, CSV paths or CSV bytes. Without `on` the
+    inputs are joined on their shared columns; with `columns` only those
+    (and the keys) are read. The query runs on the multi-threaded
+    streaming engine and the result is returned as pandas, with metadata
+    columns matching the pandas engines.
+    """
+    if not polars_available():
+        raise ImportError("The Lazy (Polars) engine requires the polars package")
+    if on is None:
+        on = shared_columns(bms, road)
+    keep = None if columns is None else set(columns) | set(on)
+    left = tag_source(scan_input(bms, keep, optimize), 'BMS', scope_number, selected_date)
+    right = tag_source(scan_input(road, keep, optimize), 'Road', scope_number, selected_date)
+    joined, renamed = lazy_join(left, right, on, merge_strategy)
+
+    merged = joined.collect(engine="streaming").to_pandas()
+    values = {side: {'data_source': source, 'scope': scope_number, 'processing_date': selected_date}
+              for side, source in (("left", 'BMS'), ("right", 'Road'))}
+    return constant_categoricals(merged, renamed, values)
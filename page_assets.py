@@ -0,0 +1,167 @@
+"""
+Page assets and server-wide resources of the Streamlit app
+
+Streamlit re-executes app.py on every interaction; what lives here is
+built once per server process instead.
+"""
+
+import os
+
+import streamlit as st
+
+from incremental import DEFAULT_HISTORY_DIR, IncrementalHistory
+from jobs import DEFAULT_MAX_JOBS, JobRegistry
+from result_store import DEFAULT_STORE_DIR, STORE_MAX_BYTES, ResultStore
+from road_reference import DEFAULT_ROAD_DIR, RoadReferenceStore
+
+# Modern CSS styling to match the design
+PAGE_CSS = """
+<style>
+    .main-header {
+        font-size: 2.5rem;
+        font-weight: bold;
+        color: #1f77b4;
+        text-align: center;
+        margin-bottom: 1rem;
+    }
+    .via-fusion-tag {
+        background-color: #ff6b35;
+        color: white;
+        padding: 0.3rem 0.8rem;
+        border-radius: 15px;
+        font-size: 0.9rem;
+        font-weight: bold;
+        display: inline-block;
+        margin-bottom: 2rem;
+        text-align: center;
+        width: 100%;
+    }
+    .section-header {
+        font-size: 1.8rem;
+        font-weight: bold;
+        color: #2c3e50;
+        margin-top: 2rem;
+        margin-bottom: 1.5rem;
+    }
+    .upload-section {
+        background-color: #f8f9fa;
+        border: 2px dashed #dee2e6;
+        border-radius: 10px;
+        padding: 2rem;
+        margin: 1rem 0;
+        text-align: center;
+    }
+    .upload-title {
+        font-size: 1.4rem;
+        font-weight: bold;
+        color: #2c3e50;
+        margin-bottom: 0.5rem;
+    }
+    .upload-subtitle {
+        color: #6c757d;
+        margin-bottom: 1rem;
+    }
+    .file-upload-area {
+        background-color: #f8f9fa;
+        border: 2px dashed #dee2e6;
+        border-radius: 8px;
+        padding: 2rem;
+        margin: 1rem 0;
+        text-align: center;
+        min-height: 120px;
+        display: flex;
+        flex-direction: column;
+        justify-content: center;
+        align-items: center;
+    }
+    .upload-icon {
+        font-size: 2rem;
+        color: #6c757d;
+        margin-bottom: 1rem;
+    }
+    .upload-text {
+        color: #495057;
+        font-size: 1.1rem;
+        margin-bottom: 0.5rem;
+    }
+    .upload-limit {
+        color: #6c757d;
+        font-size: 0.9rem;
+    }
+    .browse-button {
+        background-color: #6c757d;
+        color: white;
+        border: none;
+        padding: 0.5rem 1rem;
+        border-radius: 5px;
+        margin-top: 1rem;
+    }
+    .file-info-box {
+        background-color: #e7f3ff;
+        border: 1px solid #b3d9ff;
+        color: #004085;
+        padding: 1rem;
+        border-radius: 5px;
+        margin: 1rem 0;
+        text-align: center;
+    }
+    .success-message {
+        background-color: #d4edda;
+        border: 1px solid #c3e6cb;
+        color: #155724;
+        padding: 0.75rem;
+        border-radius: 0.25rem;
+        margin: 1rem 0;
+    }
+    .info-box {
+        background-color: #e7f3ff;
+        border: 1px solid #b3d9ff;
+        color: #004085;
+        padding: 1rem;
+        border-radius: 0.25rem;
+        margin: 1rem 0;
+    }
+    .footer {
+        text-align: center;
+        color: #666;
+        margin-top: 2rem;
+        padding: 1rem;
+        border-top: 1px solid #dee2e6;
+    }
+    .metric-card {
+        background-color: #f8f9fa;
+        border: 1px solid #dee2e6;
+        border-radius: 8px;
+        padding: 1rem;
+        text-align: center;
+        margin: 0.5rem 0;
+    }
+</style>
+"""
+
+
+@st.cache_resource
+def get_job_registry():
+    """Return the background job registry shared by every session"""
+    return JobRegistry(int(os.environ.get('DATA_FUSION_MAX_JOBS', DEFAULT_MAX_JOBS)))
+
+
+@st.cache_resource
+def get_result_store():
+    """Return the disk-backed result store shared by every session"""
+    return ResultStore(
+        os.environ.get('DATA_FUSION_STORE_DIR', DEFAULT_STORE_DIR),
+        int(os.environ.get('DATA_FUSION_STORE_MAX_BYTES', STORE_MAX_BYTES))
+    )
+
+
+@st.cache_resource
+def get_incremental_history():
+    """Return the per-scope incremental fusion history shared by every session"""
+    return IncrementalHistory(os.environ.get('DATA_FUSION_HISTORY_DIR', DEFAULT_HISTORY_DIR))
+
+
+@st.cache_resource
+def get_road_store():
+    """Return the per-scope road reference store shared by every session"""
+    return RoadReferenceStore(os.environ.get('DATA_FUSION_ROAD_DIR', DEFAULT_ROAD_DIR))
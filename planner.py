@@ -0,0 +1,188 @@
+"""
+Join planning: key dtype normalization, output-size estimates and a budget guard
+"""
+
+import numpy as np
+import pandas as pd
+
+from fusion import MERGE_STRATEGIES, hash_keys
+
+# Joins estimated to produce more rows than this are refused by default
+DEFAULT_MAX_OUTPUT_ROWS = 50_000_000
+# Joins estimated to need more memory than this are refused by default
+DEFAULT_MAX_OUTPUT_BYTES = 8 * 1024 * 1024 * 1024
+# Rows sampled per input to estimate the in-memory size of a row
+ROW_BYTES_SAMPLE = 10_000
+# Per-chunk key counts held before they are folded into the running histogram
+HISTOGRAM_FOLD_ENTRIES = 1_000_000
+
+
+class JoinBudgetExceeded(ValueError):
+    """Raised when a join's estimated output exceeds the row or byte budget"""
+
+
+def key_kind(series):
+    """Classify a key column as 'numeric', 'datetime', 'bool' or 'string'"""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "string"
+
+
+def _convert_key(series, kind):
+    """Convert a string key column to numbers/dates, None if any value fails"""
+    values = series.astype(object) if isinstance(series.dtype, pd.CategoricalDtype) else series
+    if kind == "numeric":
+        converted = pd.to_numeric(values, errors="coerce")
+    else:
+        converted = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    if (converted.isna() & series.notna()).any():
+        return None
+    return converted
+
+
+def normalize_key_dtypes(left, right, keys):
+    """Bring the join keys of both sides to comparable dtypes
+
+    Keys of the same kind are left as they are (pandas joins int32 with
+    int64 or a categorical with its string values). A string key whose
+    values all parse as the other side's numbers or timestamps is
+    converted; otherwise both sides are compared as strings. Returns the
+    two frames and a list of human-readable changes.
+    """
+    changes = []
+    for key in keys:
+        left_kind, right_kind = key_kind(left[key]), key_kind(right[key])
+        if left_kind == right_kind:
+            continue
+        before = (str(left[key].dtype), str(right[key].dtype))
+        converted = None
+        if left_kind == "string" and right_kind in ("numeric", "datetime"):
+            converted = _convert_key(left[key], right_kind)
+            if converted is not None:
+                left = left.assign(**{key: converted})
+        elif right_kind == "string" and left_kind in ("numeric", "datetime"):
+            converted = _convert_key(right[key], left_kind)
+            if converted is not None:
+                right = right.assign(**{key: converted})
+        if converted is None:
+            left = left.assign(**{key: left[key].astype(str).where(left[key].notna())})
+            right = right.assign(**{key: right[key].astype(str).where(right[key].notna())})
+        changes.append(f"{key}: {before[0]} / {before[1]} → {left[key].dtype} / {right[key].dtype}")
+    return left, right, changes
+
+
+def key_histogram(df, keys):
+    """Return the number of rows per distinct join key (hashed)"""
+    return pd.Series(hash_keys(df, list(keys))).value_counts(sort=False)
+
+
+def chunked_key_histogram(chunks, keys):
+    """Return the key_histogram of a frame read as chunks, holding only key counts
+
+    Chunk counts are folded in once they outnumber the running
+    histogram, so unique keys cost O(n log n) rather than a re-sum per chunk.
+    """
+    counts = None
+    pending = []
+    pending_entries = 0
+    for chunk in chunks:
+        pending.append(key_histogram(chunk, keys))
+        pending_entries += len(pending[-1])
+        if pending_entries >= max(HISTOGRAM_FOLD_ENTRIES, 0 if counts is None else len(counts)):
+            counts = _fold_histograms(counts, pending)
+            pending, pending_entries = [], 0
+    return _fold_histograms(counts, pending)
+
+
+def _fold_histograms(counts, pending):
+    parts = pending if counts is None else [counts, *pending]
+    if not parts:
+        return pd.Series(dtype=np.int64)
+    return pd.concat(parts).groupby(level=0, sort=False).sum()
+
+
+def key_relationship(left_counts, right_counts):
+    """Describe the key cardinality as one-to-one, one-to-many, many-to-one or many-to-many"""
+    left_many = len(left_counts) and left_counts.max() > 1
+    right_many = len(right_counts) and right_counts.max() > 1
+    return f"{'many' if left_many else 'one'}-to-{'many' if right_many else 'one'}"
+
+
+def estimate_join_rows(left_counts, right_counts, how):
+    """Return the exact output row count of a join from both key histograms"""
+    common = left_counts.index.intersection(right_counts.index)
+    left_matched = left_counts.loc[common]
+    right_matched = right_counts.loc[common]
+    rows = int((left_matched.to_numpy(dtype=np.int64) * right_matched.to_numpy(dtype=np.int64)).sum())
+    if how in ("left", "outer"):
+        rows += int(left_counts.sum() - left_matched.sum())
+    if how in ("right", "outer"):
+        rows += int(right_counts.sum() - right_matched.sum())
+    return rows
+
+
+def row_bytes(df, sample_rows=ROW_BYTES_SAMPLE):
+    """Estimate the in-memory bytes of one row from a sample"""
+    sample = df.head(sample_rows)
+    if sample.empty:
+        return 0.0
+    return float(sample.memory_usage(index=False, deep=True).sum()) / len(sample)
+
+
+def plan_join(left, right, keys, merge_strategy, max_rows=DEFAULT_MAX_OUTPUT_ROWS,
+              max_bytes=DEFAULT_MAX_OUTPUT_BYTES):
+    """Estimate a key-based join before running it
+
+    Returns a plan dict with the keys, dtype changes, key cardinality,
+    estimated output rows/bytes, warnings and whether the estimate fits
+    the row and byte budget.
+    """
+    plan = {
+        "keys": list(keys),
+        "how": MERGE_STRATEGIES[merge_strategy],
+        "changes": [],
+        "warnings": [],
+        "relationship": None,
+        "distinct_keys": None,
+        "estimated_rows": None,
+        "estimated_bytes": None,
+        "within_budget": False,
+    }
+    if not keys:
+        plan["warnings"].append("No join keys selected")
+        return plan
+
+    left, right, plan["changes"] = normalize_key_dtypes(left, right, keys)
+    left_counts = key_histogram(left, keys)
+    right_counts = key_histogram(right, keys)
+    plan["relationship"] = key_relationship(left_counts, right_counts)
+    plan["distinct_keys"] = (len(left_counts), len(right_counts))
+    plan["estimated_rows"] = estimate_join_rows(left_counts, right_counts, plan["how"])
+    plan["estimated_bytes"] = int(plan["estimated_rows"] * (row_bytes(left) + row_bytes(right)))
+
+    if plan["relationship"] == "many-to-many":
+        plan["warnings"].append(
+            f"Keys repeat on both sides (many-to-many): {len(left):,} × {len(right):,} rows "
+            f"join into {plan['estimated_rows']:,}"
+        )
+    if plan["estimated_rows"] > max_rows:
+        plan["warnings"].append(f"Estimated {plan['estimated_rows']:,} rows exceeds the {max_rows:,} row budget")
+    if plan["estimated_bytes"] > max_bytes:
+        plan["warnings"].append(
+            f"Estimated {plan['estimated_bytes'] / 1e9:.1f} GB exceeds the {max_bytes / 1e9:.1f} GB memory budget"
+        )
+    plan["within_budget"] = plan["estimated_rows"] <= max_rows and plan["estimated_bytes"] <= max_bytes
+    return plan
+
+
+def check_budget(plan):
+    """Raise JoinBudgetExceeded when a plan does not fit its budget"""
+    if not plan["within_budget"]:
+        raise JoinBudgetExceeded("; ".join(plan["warnings"]) or "Join is over budget")
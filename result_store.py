@@ -0,0 +1,254 @@
+"""
+Server-wide, disk-backed store of fusion results shared by every session
+"""
+
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+from ingestion import arrow_available
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Default location of the stored results
+DEFAULT_STORE_DIR = os.path.join(tempfile.gettempdir(), "data_fusion_results")
+# Default disk quota for stored results
+STORE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+# Stored results older than this are discarded
+STORE_TTL_SECONDS = 24 * 60 * 60
+
+FRAME_SUFFIXES = (".arrow", ".pkl")
+SUMMARY_SUFFIX = ".summary.pkl"
+
+
+def store_key(key):
+    """Return a stable file-name digest for a fusion key tuple"""
+    return hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def write_frame(df, path_stem):
+    """Write a frame as an uncompressed Arrow IPC file, or pickle it if Arrow can't hold it
+
+    Each column is written as one contiguous array, so read_frame can map
+    it without copying. Returns the path written.
+    """
+    if arrow_available():
+        from pyarrow import ArrowException, feather
+        path = path_stem + ".arrow"
+        try:
+            write_atomic(path, lambda handle: feather.write_feather(df, handle, compression="uncompressed",
+                                                                    chunksize=max(len(df), 1)))
+            return path
+        except (ArrowException, TypeError, ValueError):
+            pass
+    path = path_stem + ".pkl"
+    write_atomic(path, lambda handle: pickle.dump(df, handle, protocol=pickle.HIGHEST_PROTOCOL))
+    return path
+
+
+def read_frame(path):
+    """Read a stored frame, memory-mapping Arrow files
+
+    Numeric and naive timestamp columns without missing values become
+    read-only NumPy views of the mapped file: they are not copied, and
+    every process reading the file shares their pages through the OS
+    page cache. Other columns (text, categoricals, missing values) are
+    converted to pandas, which copies them.
+    """
+    if path.endswith(".arrow"):
+        import pyarrow as pa
+        from pyarrow import feather
+        table = feather.read_table(path, memory_map=True)
+        metadata = table.schema.pandas_metadata
+        numpy_types = {column["name"]: column["numpy_type"] for column in metadata["columns"]}
+        mapped = {}
+        # Only frames with unique, unnamed string columns and a range index are rebuilt by hand
+        plain = (all(isinstance(index, dict) for index in metadata["index_columns"])
+                 and [(index["name"], index["pandas_type"]) for index in metadata["column_indexes"]] == [(None, "unicode")]
+                 and len(set(table.column_names)) == table.num_columns)
+        for name, column in zip(table.column_names, table.columns):
+            if not plain:
+                break
+            if column.null_count or column.num_chunks != 1 or not (
+                    pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+                    or (pa.types.is_timestamp(column.type) and column.type.tz is None)):
+                continue
+            values = column.chunk(0).to_numpy(zero_copy_only=True)
+            # e.g. a nullable Int64 column without missing values stays Int64
+            if str(values.dtype) == numpy_types.get(name):
+                mapped[name] = values
+        if not mapped:
+            return table.to_pandas()
+        converted = table.drop_columns(list(mapped)).to_pandas()
+        # copy=False also keeps pandas from consolidating (copying) the mapped columns
+        return pd.DataFrame({name: mapped[name] if name in mapped else converted[name]
+                             for name in table.column_names}, index=converted.index, copy=False)
+    with open(path, "rb") as handle:
+        return pickle.load(handle)
+
+
+def write_atomic(path, write):
+    """Write through a temporary file so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            write(handle)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on a lock file, between threads and processes alike
+
+    Every holder opens the file itself, so the lock also serializes
+    threads of one process. The lock file is created when missing.
+    """
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds; keep waiting
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ResultStore:
+    """Fusion results on local disk with LRU + TTL eviction and a byte quota
+
+    Each entry is a frame file plus a pickled summary, named by the digest
+    of the fusion key. File modification times track the last access for
+    LRU eviction. Frames currently loaded by any session are handed out
+    as the same object, so sessions share one copy in memory.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR, max_bytes=STORE_MAX_BYTES,
+                 ttl_seconds=STORE_TTL_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._loaded = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, digest):
+        stem = os.path.join(self.directory, digest)
+        frame_path = next((stem + suffix for suffix in FRAME_SUFFIXES if os.path.exists(stem + suffix)), None)
+        return stem, frame_path, stem + SUMMARY_SUFFIX
+
+    def get(self, key):
+        """Return (merged_df, summary) for a fusion key, None if absent or expired"""
+        digest = store_key(key)
+        with self._lock:
+            _, frame_path, summary_path = self._paths(digest)
+            if frame_path is None or not os.path.exists(summary_path) or self._expired(summary_path):
+                self._remove(digest)
+                self.misses += 1
+                return None
+            with open(summary_path, "rb") as handle:
+                summary = pickle.load(handle)
+            merged_df = self._loaded.get(digest)
+            if merged_df is None:
+                merged_df = read_frame(frame_path)
+                self._loaded[digest] = merged_df
+            os.utime(frame_path)
+            self.hits += 1
+            return merged_df, summary
+
+    def put(self, key, merged_df, summary):
+        """Store a fusion result, evicting expired and least recently used entries"""
+        digest = store_key(key)
+        with self._lock:
+            self._remove(digest)
+            stem, _, summary_path = self._paths(digest)
+            write_frame(merged_df, stem)
+            write_atomic(summary_path, lambda handle: pickle.dump(summary, handle,
+                                                                   protocol=pickle.HIGHEST_PROTOCOL))
+            self._loaded[digest] = merged_df
+            self._evict(keep=digest)
+
+    def _expired(self, summary_path):
+        """Return True when an entry was written longer than the TTL ago"""
+        return time.time() - os.path.getmtime(summary_path) > self.ttl_seconds
+
+    def _entries(self):
+        """Return {digest: (last access, total bytes, summary path)} of stored entries"""
+        entries = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(FRAME_SUFFIXES) or name.endswith(SUMMARY_SUFFIX):
+                continue
+            digest = name.split(".", 1)[0]
+            _, frame_path, summary_path = self._paths(digest)
+            try:
+                frame_stat = os.stat(frame_path)
+                summary_bytes = os.path.getsize(summary_path)
+            except (OSError, TypeError):
+                continue
+            entries[digest] = (frame_stat.st_mtime, frame_stat.st_size + summary_bytes, summary_path)
+        return entries
+
+    def _evict(self, keep=None):
+        """Drop expired entries, then the least recently used ones beyond the quota"""
+        entries = self._entries()
+        for digest, (_, _, summary_path) in list(entries.items()):
+            if digest != keep and self._expired(summary_path):
+                self._remove(digest)
+                del entries[digest]
+        total = sum(nbytes for _, nbytes, _ in entries.values())
+        # Always keep the newest entry, even when it alone exceeds the quota
+        for digest, (_, nbytes, _) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            self._remove(digest)
+            total -= nbytes
+
+    def _remove(self, digest):
+        """Delete an entry's files; sessions holding the frame keep their copy"""
+        stem = os.path.join(self.directory, digest)
+        for path in [stem + suffix for suffix in FRAME_SUFFIXES] + [stem + SUMMARY_SUFFIX]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._loaded.pop(digest, None)
+
+    def stats(self):
+        """Return hit/miss counters and current disk usage"""
+        with self._lock:
+            entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(nbytes for _, nbytes, _ in entries.values()),
+            "max_bytes": self.max_bytes,
+        }
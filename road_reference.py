@@ -0,0 +1,176 @@
+"""
+Server-side road reference per scope: the parsed road table with its join and spatial indexes
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+from fusion import KeyIndex
+from geojson_builder import find_coordinate_columns
+from incremental import frame_digest
+from result_store import FRAME_SUFFIXES, file_lock, read_frame, store_key, write_atomic, write_frame
+from spatial import RoadSpatialIndex, find_wkt_column
+
+# Default location of the stored road references
+DEFAULT_ROAD_DIR = os.path.join(tempfile.gettempdir(), "data_fusion_roads")
+
+MANIFEST_NAME = "manifest.json"
+FRAME_STEM = "road"
+
+
+def geometry_columns(df):
+    """Return the WKT or lat/lon columns of a road table, None if it has no geometries"""
+    wkt_col = find_wkt_column(df)
+    if wkt_col is not None:
+        return [wkt_col]
+    lat_col, lon_col = find_coordinate_columns(df)
+    if lat_col is None or lon_col is None:
+        return None
+    return [lat_col, lon_col]
+
+
+class RoadReference:
+    """A scope's stored road table and the indexes built over it
+
+    The KeyIndex of each join key set and the RoadSpatialIndex are built
+    on first use and kept with the reference, so every later fusion
+    against the same road table (in any session) reuses them.
+    """
+
+    def __init__(self, scope_number, frame, manifest):
+        self.scope = str(scope_number)
+        self.frame = frame
+        self.manifest = manifest
+        self.digest = manifest["digest"]
+        self._key_indexes = {}
+        self._spatial_index = None
+        self._lock = threading.Lock()
+
+    def key_index(self, on):
+        """Return the KeyIndex of the road table on these join keys"""
+        on = tuple(on)
+        with self._lock:
+            if on not in self._key_indexes:
+                self._key_indexes[on] = KeyIndex(self.frame, on)
+            return self._key_indexes[on]
+
+    def spatial_index(self):
+        """Return the RoadSpatialIndex of the road geometries"""
+        with self._lock:
+            if self._spatial_index is None:
+                self._spatial_index = RoadSpatialIndex(self.frame)
+            return self._spatial_index
+
+
+class RoadReferenceStore:
+    """Road references per scope on local disk, shared by every session
+
+    Each scope keeps its parsed road table as one frame file plus a
+    manifest with the digest of the source it was parsed from (file
+    content and read options) and of the table itself. An unchanged
+    upload is recognized from the source digest without parsing it; a
+    changed one replaces the reference. Loaded references are handed
+    out as the same object, indexes included.
+
+    Every update writes a new generation of the frame file, then swaps
+    the manifest naming it, under a per-scope file lock: sessions and
+    batch worker processes sharing the directory never read a frame
+    that does not match its manifest.
+    """
+
+    def __init__(self, directory=DEFAULT_ROAD_DIR):
+        self.directory = directory
+        self._loaded = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _scope_dir(self, scope_number):
+        return os.path.join(self.directory, str(scope_number))
+
+    def scope_lock(self, scope_number):
+        """Return a lock serializing updates of a scope between threads and processes"""
+        return file_lock(os.path.join(self.directory, f"{scope_number}.lock"))
+
+    def manifest(self, scope_number):
+        """Return a scope's manifest, None if no road table is stored for it"""
+        path = os.path.join(self._scope_dir(scope_number), MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            return json.load(handle)
+
+    def is_current(self, scope_number, source):
+        """Return True if the scope's road table was parsed from this source key"""
+        manifest = self.manifest(scope_number)
+        return manifest is not None and manifest["source"] == store_key(source)
+
+    def put(self, scope_number, road_df, source):
+        """Store the road table parsed from source as the scope's reference and return it
+
+        The table is read back from its file so that every session, this
+        one included, fuses with exactly the stored table.
+        """
+        scope = str(scope_number)
+        with self.scope_lock(scope):
+            scope_dir = self._scope_dir(scope)
+            os.makedirs(scope_dir, exist_ok=True)
+            previous = self.manifest(scope)
+            generation = previous.get("generation", 0) + 1 if previous is not None else 1
+            written = write_frame(road_df.reset_index(drop=True),
+                                  os.path.join(scope_dir, f"{FRAME_STEM}.{generation}"))
+            frame = read_frame(written)
+            manifest = {
+                "scope": scope,
+                "generation": generation,
+                "frame": os.path.basename(written),
+                "source": store_key(source),
+                "digest": frame_digest(frame),
+                "rows": len(frame),
+                "columns": len(frame.columns),
+                "geometry": geometry_columns(frame),
+                "updated": datetime.now().isoformat(timespec="seconds"),
+            }
+            write_atomic(os.path.join(scope_dir, MANIFEST_NAME),
+                         lambda handle: handle.write(json.dumps(manifest, indent=2).encode("utf-8")))
+            self._remove_unlisted(scope, manifest)
+            self._loaded[scope] = RoadReference(scope, frame, manifest)
+            return self._loaded[scope]
+
+    def reference(self, scope_number):
+        """Return a scope's RoadReference, None if no road table is stored for it"""
+        scope = str(scope_number)
+        with self.scope_lock(scope):
+            manifest = self.manifest(scope)
+            if manifest is None:
+                self._loaded.pop(scope, None)
+                return None
+            loaded = self._loaded.get(scope)
+            if loaded is None or loaded.digest != manifest["digest"]:
+                loaded = RoadReference(scope, read_frame(self._frame_path(manifest)), manifest)
+                self._loaded[scope] = loaded
+            return loaded
+
+    def reset(self, scope_number):
+        """Delete the road reference of a scope"""
+        scope = str(scope_number)
+        with self.scope_lock(scope):
+            shutil.rmtree(self._scope_dir(scope), ignore_errors=True)
+            self._loaded.pop(scope, None)
+
+    def _frame_path(self, manifest):
+        scope_dir = self._scope_dir(manifest["scope"])
+        if "frame" in manifest:
+            return os.path.join(scope_dir, manifest["frame"])
+        # Manifests written before generations name no frame file
+        stem = os.path.join(scope_dir, FRAME_STEM)
+        return next((stem + suffix for suffix in FRAME_SUFFIXES if os.path.exists(stem + suffix)), None)
+
+    def _remove_unlisted(self, scope_number, manifest):
+        """Delete files of the scope the manifest does not name, e.g. older generations"""
+        scope_dir = self._scope_dir(scope_number)
+        for name in os.listdir(scope_dir):
+            if name not in (MANIFEST_NAME, manifest["frame"]):
+                os.remove(os.path.join(scope_dir, name))
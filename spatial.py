@@ -0,0 +1,134 @@
+"""
+Spatial fusion of BMS points with road geometries
+
+geopandas and shapely are imported on first use: they add a noticeable
+share of the app's start-up time and most sessions never join spatially.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from geojson_builder import coordinate_arrays, find_coordinate_columns
+
+# Default search radius when assigning a BMS point to its nearest road
+DEFAULT_MAX_DISTANCE_M = 50.0
+# Column names that may hold WKT road geometries
+WKT_COLUMN_NAMES = ("geometry", "wkt", "geom", "the_geom", "shape", "linestring")
+# Coordinate reference system of lat/lon and WKT inputs
+SOURCE_CRS = "EPSG:4326"
+
+
+def find_wkt_column(df):
+    """Return the first column holding WKT geometries, None if there is none"""
+    import shapely
+    for col in df.columns:
+        if str(col).lower() not in WKT_COLUMN_NAMES:
+            continue
+        sample = df[col].dropna().head(20)
+        if sample.empty:
+            continue
+        parsed = shapely.from_wkt(sample.astype(str).to_numpy(), on_invalid="ignore")
+        if not shapely.is_missing(parsed).any():
+            return col
+    return None
+
+
+def point_geometries(df):
+    """Build Point geometries from a frame's lat/lon columns (None if invalid)"""
+    import shapely
+    lat_col, lon_col = find_coordinate_columns(df)
+    if lat_col is None or lon_col is None:
+        raise ValueError("No latitude/longitude columns found for spatial join")
+    lats, lons, valid = coordinate_arrays(df, lat_col, lon_col)
+    geoms = np.full(len(df), None, dtype=object)
+    geoms[valid] = shapely.points(lons[valid], lats[valid])
+    return geoms
+
+
+def road_geometries(road_df):
+    """Build road geometries from a WKT column or, failing that, lat/lon columns"""
+    import shapely
+    wkt_col = find_wkt_column(road_df)
+    if wkt_col is not None:
+        values = road_df[wkt_col].astype(object).where(road_df[wkt_col].notna(), None).to_numpy()
+        return shapely.from_wkt(values, on_invalid="ignore")
+    return point_geometries(road_df)
+
+
+class RoadSpatialIndex:
+    """Road geometries parsed once, with an STRtree per metric CRS
+
+    The nearest-road join projects roads to the UTM zone of the BMS
+    points, so the projected roads and their tree are built on first use
+    per zone and reused by every later join in it.
+    """
+
+    def __init__(self, road_df):
+        import shapely
+        self.geometries = road_geometries(road_df)
+        self.valid = ~shapely.is_missing(self.geometries)
+        self.rows = len(road_df)
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def tree(self, metric_crs):
+        """Return the STRtree of the valid roads projected to metric_crs"""
+        import geopandas as gpd
+        from shapely import STRtree
+        key = metric_crs.to_string()
+        with self._lock:
+            if key not in self._trees:
+                projected = gpd.GeoSeries(self.geometries[self.valid], crs=SOURCE_CRS).to_crs(metric_crs)
+                self._trees[key] = STRtree(projected.to_numpy())
+            return self._trees[key]
+
+
+def nearest_road_join(bms_df, road_df, max_distance_m=DEFAULT_MAX_DISTANCE_M,
+                      how="left", suffixes=("_x", "_y"), road_index=None):
+    """Attach to each BMS point the nearest road within max_distance_m
+
+    Both sides are projected to the local UTM zone so distances are in
+    metres, then an STRtree over the roads answers every nearest-road
+    query in one vectorized call. With how='left' unmatched BMS rows are
+    kept with empty road columns; with how='inner' they are dropped.
+    road_index is a prebuilt RoadSpatialIndex of road_df's rows.
+    """
+    import geopandas as gpd
+    import shapely
+    if road_index is None or road_index.rows != len(road_df):
+        road_index = RoadSpatialIndex(road_df)
+    points = point_geometries(bms_df)
+
+    points_valid = ~shapely.is_missing(points)
+    road_pos = np.full(len(bms_df), -1, dtype=np.int64)
+    distances = np.full(len(bms_df), np.nan)
+
+    if points_valid.any() and road_index.valid.any():
+        point_series = gpd.GeoSeries(points[points_valid], crs=SOURCE_CRS)
+        metric_crs = point_series.estimate_utm_crs()
+        projected_points = point_series.to_crs(metric_crs).to_numpy()
+
+        tree = road_index.tree(metric_crs)
+        (input_idx, tree_idx), nearest = tree.query_nearest(
+            projected_points, max_distance=max_distance_m, return_distance=True, all_matches=False
+        )
+        point_rows = np.flatnonzero(points_valid)[input_idx]
+        road_pos[point_rows] = np.flatnonzero(road_index.valid)[tree_idx]
+        distances[point_rows] = nearest
+
+    matched = road_pos >= 0
+    left = bms_df.reset_index(drop=True)
+    if how == "inner":
+        left = left[matched].reset_index(drop=True)
+        road_pos = road_pos[matched]
+        distances = distances[matched]
+    right = road_df.reset_index(drop=True).reindex(road_pos).reset_index(drop=True)
+
+    overlap = set(left.columns) & set(right.columns)
+    left = left.rename(columns={col: f"{col}{suffixes[0]}" for col in overlap})
+    right = right.rename(columns={col: f"{col}{suffixes[1]}" for col in overlap})
+    merged = pd.concat([left, right], axis=1)
+    merged["road_distance_m"] = distances
+    return merged
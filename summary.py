@@ -0,0 +1,68 @@
+"""
+Summary statistics computed once per fusion result
+"""
+
+import pandas as pd
+
+# Source labels written to the data_source metadata column
+SOURCE_LABELS = ("BMS", "Road")
+# Columns that may hold the source label after a merge adds suffixes
+SOURCE_COLUMNS = ("data_source", "data_source_x", "data_source_y")
+# Rows kept for the merged data preview
+PREVIEW_ROWS = 20
+
+
+def source_counts(df):
+    """Count the rows each source contributed to a merged frame
+
+    A merge suffixes the data_source columns of both inputs, so a row
+    counts for a source when any of its source columns carries that label.
+    """
+    columns = [col for col in SOURCE_COLUMNS if col in df.columns]
+    counts = {}
+    for label in SOURCE_LABELS:
+        mask = pd.Series(False, index=df.index)
+        for col in columns:
+            mask |= (df[col] == label).to_numpy()
+        counts[label] = int(mask.sum())
+    return counts
+
+
+def column_stats(df):
+    """Return per-column dtype, null ratio, memory and numeric range"""
+    rows = len(df)
+    memory = df.memory_usage(index=False, deep=True)
+    nulls = df.isna().sum()
+    stats = {}
+    for col in df.columns:
+        entry = {
+            "dtype": str(df[col].dtype),
+            "nulls": int(nulls[col]),
+            "null_ratio": float(nulls[col] / rows) if rows else 0.0,
+            "bytes": int(memory[col]),
+        }
+        if pd.api.types.is_numeric_dtype(df[col].dtype) and not pd.api.types.is_bool_dtype(df[col].dtype):
+            entry["min"] = df[col].min()
+            entry["max"] = df[col].max()
+        stats[col] = entry
+    return stats
+
+
+def summarize_frame(df):
+    """Return the counts, column stats and preview shown for a merged frame"""
+    stats = column_stats(df)
+    return {
+        "rows": len(df),
+        "columns": len(df.columns),
+        "sources": source_counts(df),
+        "column_stats": stats,
+        "memory_bytes": int(df.index.memory_usage()) + sum(entry["bytes"] for entry in stats.values()),
+        "preview": df.head(PREVIEW_ROWS).copy(),
+    }
+
+
+def column_stats_frame(summary):
+    """Return a summary's column stats as a small display table"""
+    table = pd.DataFrame.from_dict(summary["column_stats"], orient="index")
+    table.index.name = "column"
+    return table
@@ -0,0 +1,68 @@
+"""
+Deterministic synthetic BMS and road data for the benchmarks
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Start of the day the synthetic timestamps are spread over
+TIMESTAMP_START = "2025-09-29"
+
+
+def make_bms_frame(rows, seed=42):
+    """Generate a deterministic BMS-like frame with coordinates"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "vehicle_id": rng.integers(1, 5000, rows),
+        "latitude": rng.uniform(25.0, 25.4, rows),
+        "longitude": rng.uniform(55.1, 55.5, rows),
+        "battery_level": rng.uniform(0, 100, rows).round(2),
+        "voltage": rng.normal(48, 2, rows).round(3),
+        "status": rng.choice(["charging", "idle", "riding"], rows),
+        "data_source": "BMS",
+    })
+
+
+def make_road_frame(segments=5000, seed=7):
+    """Generate a deterministic road-segment frame keyed by vehicle_id"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "vehicle_id": np.arange(1, segments + 1),
+        "road_name": rng.choice([f"Road {i}" for i in range(200)], segments),
+        "speed_limit": rng.choice([30, 50, 70, 90, 110], segments),
+        "data_source": "Road",
+    })
+
+
+def make_road_lines(segments=5000, seed=11):
+    """Generate deterministic WKT road segments over the BMS bounding box"""
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(55.1, 55.5, segments)
+    y = rng.uniform(25.0, 25.4, segments)
+    return pd.DataFrame({
+        "road_id": np.arange(segments),
+        "geometry": [f"LINESTRING ({a:.6f} {b:.6f}, {a + 0.002:.6f} {b + 0.001:.6f})"
+                     for a, b in zip(x, y)],
+    })
+
+
+def make_timed_inputs(rows, events=50_000, seed=3):
+    """Generate BMS readings and road events with timestamps for the as-of join"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(TIMESTAMP_START)
+    bms_df = make_bms_frame(rows).assign(
+        timestamp=start + pd.to_timedelta(np.sort(rng.integers(0, 86_400, rows)), unit="s")
+    )
+    road_df = make_road_frame().sample(events, replace=True, random_state=seed).assign(
+        event_time=start + pd.to_timedelta(np.sort(rng.integers(0, 86_400, events)), unit="s")
+    ).drop(columns=["data_source"])
+    return bms_df, road_df
+
+
+def write_csv(df, directory, name):
+    """Write a synthetic frame as CSV and return its path"""
+    path = os.path.join(directory, name)
+    df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from fusion import asof_join, find_time_column
+
+# Minute readings as date text, next to a numeric column whose name contains 'ts'
+READINGS = pd.DataFrame({
+    "gps_points": range(3),
+    "timestamp": ["2024-01-01 10:00", "2024-01-01 10:01", "2024-01-01 10:02"],
+})
+ROAD = pd.DataFrame({"recorded": pd.to_datetime(["2024-01-01 10:01:10"]), "flow": [7]})
+
+
+def test_find_time_column_matches_whole_words_of_text_columns():
+    assert find_time_column(READINGS) == "timestamp"
+    assert find_time_column(READINGS.astype({"timestamp": "category"})) == "timestamp"
+    assert find_time_column(pd.DataFrame({"eventTs": ["2024-01-01"], "stats": ["2024-01-01"]})) == "eventTs"
+    assert find_time_column(pd.DataFrame({"ts": [1_700_000_000]})) is None
+
+
+def test_asof_join_uses_selected_time_columns():
+    merged = asof_join(READINGS, ROAD, "timestamp", "recorded", tolerance_s=30)
+    assert merged["flow"].tolist()[1] == 7
+    assert merged["flow"].notna().sum() == 1
+
+
+@pytest.mark.parametrize("left, left_time", [
+    (READINGS, "gps_points"),
+    (READINGS.assign(timestamp=["a", "b", "c"]), "timestamp"),
+    (READINGS.drop(columns="timestamp"), None),
+])
+def test_asof_join_refuses_time_columns_that_cannot_match(left, left_time):
+    with pytest.raises(ValueError):
+        asof_join(left, ROAD, left_time)
+
+
+def test_asof_join_parses_iso_text_with_mixed_offsets():
+    left = pd.DataFrame({"timestamp": ["2024-01-01T11:01:00+01:00", "2024-01-01T12:01:00+02:00"]})
+    merged = asof_join(left, ROAD, "timestamp", "recorded", tolerance_s=30)
+    assert merged["flow"].tolist() == [7, 7]
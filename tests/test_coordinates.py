@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from exporters import iter_geojson_chunks
+from geojson_builder import PointCoordinates, find_coordinate_columns
+
+
+@pytest.mark.parametrize("columns, expected", [
+    (["platform", "relation_id", "lat", "gps_lon"], ("lat", "gps_lon")),
+    (["platform", "latitude", "balance_long"], ("latitude", None)),
+    (["start_lat", "Latitude", "gpsLongitude", "lng"], ("Latitude", "lng")),
+    (["translation", "plateau"], (None, None)),
+])
+def test_coordinate_columns_are_matched_by_whole_words(columns, expected):
+    df = pd.DataFrame({col: [1.0] for col in columns})
+    assert find_coordinate_columns(df) == expected
+
+
+def test_coordinate_overrides_must_exist():
+    df = pd.DataFrame({"a": [1.0], "b": [2.0]})
+    assert find_coordinate_columns(df, lat_col="a", lon_col="b") == ("a", "b")
+    with pytest.raises(ValueError, match="not found"):
+        find_coordinate_columns(df, lat_col="missing")
+
+
+def test_projected_coordinates_round_trip_to_wgs84():
+    pyproj = pytest.importorskip("pyproj")
+    lats, lons = np.array([48.8566, 45.764, 43.2965]), np.array([2.3522, 4.8357, 5.3698])
+    xs, ys = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:2154", always_xy=True).transform(lons, lats)
+    df = pd.DataFrame({"x": xs, "y": ys, "name": ["Paris", "Lyon", "Marseille"]})
+
+    points = PointCoordinates(df, source_crs="EPSG:2154")
+    assert (points.lat_col, points.lon_col) == ("y", "x")
+    np.testing.assert_allclose(points.lats, lats, atol=1e-7)
+    np.testing.assert_allclose(points.lons, lons, atol=1e-7)
+    assert points.report["points"] == 3
+    # Without the source CRS, metres are out of the degree range
+    assert PointCoordinates(df, "y", "x").report["out_of_range"] == 3
+
+
+def test_rejected_rows_are_counted_by_reason():
+    df = pd.DataFrame({
+        "lat": ["25.1", "95", None, "abc", "-90", "25.2"],
+        "lon": [55.2, 55.3, 55.4, 55.5, -190.0, 180.0],
+    })
+    points = PointCoordinates(df)
+    assert points.valid.tolist() == [True, False, False, False, False, True]
+    assert {name: points.report[name] for name in ("rows", "points", "missing", "out_of_range")} == {
+        "rows": 6, "points": 2, "missing": 2, "out_of_range": 2}
+
+
+def test_dedupe_spans_geojson_chunks():
+    df = pd.DataFrame({"lat": [25.1, 25.2, 25.1, 25.3, 25.2], "lon": [55.1, 55.2, 55.1, 55.3, 55.2],
+                       "status": ["idle", "idle", "idle", "riding", "charging"]})
+    points = PointCoordinates(df, dedupe=True)
+    assert points.report["duplicates"] == 1
+    payload = b"".join(iter_geojson_chunks(df, "403825", chunk_rows=2, points=points))
+    features = json.loads(payload)["features"]
+    assert [feature["geometry"]["coordinates"] for feature in features] == [
+        [55.1, 25.1], [55.2, 25.2], [55.3, 25.3], [55.2, 25.2]]
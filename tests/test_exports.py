@@ -0,0 +1,49 @@
+import json
+import tracemalloc
+
+import pytest
+
+from benchmark import STREAM_PEAK_BYTES_PER_ROW
+from exporters import iter_csv_chunks, iter_geojson_chunks, spool_chunks
+from geojson_builder import create_geojson_from_data
+from synthetic import make_bms_frame
+
+# Rows exported by the memory tests and the chunk size they stream with
+ROWS = 20_000
+CHUNK_ROWS = 1_000
+
+
+def spooled_peak(chunks):
+    """Return (payload size, peak traced bytes) of spooling chunks to disk"""
+    tracemalloc.start()
+    try:
+        spool = spool_chunks(chunks, max_size=1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    size = spool.seek(0, 2)
+    spool.close()
+    return size, peak
+
+
+@pytest.fixture(scope="module")
+def bms():
+    return make_bms_frame(ROWS)
+
+
+@pytest.mark.parametrize("export", ["csv", "geojson"])
+def test_streaming_export_peak_is_bounded_by_chunk_size(bms, export):
+    if export == "csv":
+        chunks = iter_csv_chunks(bms, CHUNK_ROWS)
+    else:
+        chunks = iter_geojson_chunks(bms, "403825", chunk_rows=CHUNK_ROWS)
+    size, peak = spooled_peak(chunks)
+    assert peak < CHUNK_ROWS * STREAM_PEAK_BYTES_PER_ROW
+    # The payload itself never has to fit in memory
+    assert peak < size
+
+
+def test_streaming_geojson_matches_in_memory_export():
+    df = make_bms_frame(500)
+    streamed = b"".join(iter_geojson_chunks(df, "403825", chunk_rows=64))
+    assert json.loads(streamed) == create_geojson_from_data(df, "403825")
@@ -0,0 +1,109 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import engine
+from engine import fuse, fuse_delta
+from incremental import IncrementalHistory, partition_keys
+from synthetic import make_bms_frame, make_road_frame
+
+SCOPE = "403825"
+SELECTED_DATE = "2025-10-02"
+ROWS = 2_000
+FIRST_UPLOAD_ROWS = 1_200
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    # Readings spread over three days, in time order like a growing log
+    seconds = np.sort(np.random.default_rng(5).integers(0, 3 * 86_400, ROWS))
+    bms = make_bms_frame(ROWS).drop(columns="data_source").assign(
+        timestamp=pd.Timestamp("2025-09-29") + pd.to_timedelta(seconds, unit="s"))
+    return bms, make_road_frame().drop(columns="data_source")
+
+
+def sorted_rows(df):
+    # Stored partitions come back from Arrow: compare values, not categorical dtypes
+    return df.sort_values(list(df.columns)).reset_index(drop=True).astype(object)
+
+
+def expected_partitions(bms, road):
+    fused = fuse(bms, road, SCOPE, SELECTED_DATE)
+    return fused.groupby(fused["timestamp"].dt.strftime("%Y-%m-%d")).size().to_dict(), fused
+
+
+def test_delta_fuses_and_hashes_only_appended_rows(inputs, tmp_path, monkeypatch):
+    bms, road = inputs
+    history = IncrementalHistory(str(tmp_path))
+    _, report = fuse_delta(history, bms.iloc[:FIRST_UPLOAD_ROWS], road, SCOPE, SELECTED_DATE)
+    assert report["delta_rows"] == FIRST_UPLOAD_ROWS and not report["rebuilt"]
+
+    hashed = []
+    row_hashes = engine.row_hashes
+    monkeypatch.setattr(engine, "row_hashes", lambda df: hashed.append(len(df)) or row_hashes(df))
+    partition, report = fuse_delta(history, bms, road, SCOPE, SELECTED_DATE)
+    assert hashed == [ROWS - FIRST_UPLOAD_ROWS]
+    assert (report["delta_rows"], report["skipped_rows"]) == (ROWS - FIRST_UPLOAD_ROWS, FIRST_UPLOAD_ROWS)
+
+    counts, fused = expected_partitions(bms, road)
+    manifest = history.manifest(SCOPE)
+    assert manifest["partitions"] == counts
+    assert report["history_rows"] == len(fused)
+    pd.testing.assert_frame_equal(sorted_rows(history.load(SCOPE)), sorted_rows(fused))
+    # The delta's rows fall on the last days only: those partitions come back whole
+    latest = fused[fused["timestamp"].dt.strftime("%Y-%m-%d").isin(manifest["latest"])]
+    pd.testing.assert_frame_equal(sorted_rows(partition), sorted_rows(latest))
+
+
+def test_unchanged_upload_is_skipped_without_writes(inputs, tmp_path):
+    bms, road = inputs
+    history = IncrementalHistory(str(tmp_path))
+    first, _ = fuse_delta(history, bms, road, SCOPE, SELECTED_DATE)
+    manifest = history.manifest(SCOPE)
+    files = sorted(path.name for path in (tmp_path / SCOPE).iterdir())
+
+    partition, report = fuse_delta(history, bms, road, SCOPE, SELECTED_DATE)
+    assert (report["delta_rows"], report["skipped_rows"], report["rebuilt"]) == (0, ROWS, False)
+    assert history.manifest(SCOPE) == manifest
+    assert sorted(path.name for path in (tmp_path / SCOPE).iterdir()) == files
+    pd.testing.assert_frame_equal(partition, first)
+
+
+def test_settings_change_rebuilds_partitions_by_row_date(inputs, tmp_path):
+    bms, road = inputs
+    history = IncrementalHistory(str(tmp_path))
+    fuse_delta(history, bms.iloc[:FIRST_UPLOAD_ROWS], road, SCOPE, SELECTED_DATE)
+
+    changed_road = road.iloc[::2]
+    _, report = fuse_delta(history, bms, changed_road, SCOPE, SELECTED_DATE)
+    counts, fused = expected_partitions(bms, changed_road)
+    assert report["rebuilt"] and report["delta_rows"] == ROWS
+    # The whole upload is fused again, but every row still goes to its own date
+    assert history.manifest(SCOPE)["partitions"] == counts and len(counts) == 3
+    pd.testing.assert_frame_equal(sorted_rows(history.load(SCOPE)), sorted_rows(fused))
+    assert sorted(path.name for path in (tmp_path / SCOPE).iterdir()) == sorted(
+        ["manifest.json", history.manifest(SCOPE)["seen"], *history.manifest(SCOPE)["files"].values()])
+
+
+def test_rows_without_timestamp_go_to_selected_date(inputs):
+    bms = inputs[0].head(4).astype({"timestamp": "str"})
+    bms.loc[1, "timestamp"] = None
+    keys = partition_keys(bms, SELECTED_DATE)
+    assert list(keys) == ["2025-09-29", SELECTED_DATE, "2025-09-29", "2025-09-29"]
+    assert set(partition_keys(bms.drop(columns="timestamp"), SELECTED_DATE)) == {SELECTED_DATE}
+
+
+def fuse_upload(directory, bms, road):
+    return fuse_delta(IncrementalHistory(directory), bms, road, SCOPE, SELECTED_DATE)[1]
+
+
+def test_concurrent_processes_fuse_each_row_once(inputs, tmp_path):
+    bms, road = inputs
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        reports = list(pool.map(fuse_upload, [str(tmp_path)] * 4, [bms] * 4, [road] * 4))
+    assert sorted(report["delta_rows"] for report in reports) == [0, 0, 0, ROWS]
+    history = IncrementalHistory(str(tmp_path))
+    _, fused = expected_partitions(bms, road)
+    pd.testing.assert_frame_equal(sorted_rows(history.load(SCOPE)), sorted_rows(fused))
@@ -0,0 +1,60 @@
+import threading
+import time
+import tracemalloc
+
+from instrumentation import Run
+
+# Bytes allocated by the stages under test
+BIG = 20 * 1024 * 1024
+SMALL = 1024 * 1024
+
+
+def test_nested_stage_keeps_enclosing_peak():
+    run = Run("test", trace_memory=True)
+    with run.stage("outer"):
+        block = bytearray(BIG)
+        del block
+        with run.stage("inner"):
+            block = bytearray(SMALL)
+            del block
+    inner, outer = run.stages
+    assert (inner["stage"], outer["stage"]) == ("inner", "outer")
+    assert outer["peak_traced_bytes"] >= BIG
+    assert SMALL <= inner["peak_traced_bytes"] < BIG
+    assert not tracemalloc.is_tracing()
+
+
+def test_concurrent_runs_share_the_tracer_and_keep_their_own_cpu():
+    slow_started, fast_done = threading.Event(), threading.Event()
+    runs = {"slow": Run("slow", trace_memory=True), "fast": Run("fast", trace_memory=True)}
+
+    def slow():
+        with runs["slow"].stage("wait"):
+            slow_started.set()
+            fast_done.wait(10)
+            # The other run finished: tracing must still be on for this one
+            assert tracemalloc.is_tracing()
+            block = bytearray(BIG)
+            del block
+
+    def fast():
+        slow_started.wait(10)
+        with runs["fast"].stage("spin"):
+            # Spin on this thread's CPU clock, so a loaded machine cannot shorten it
+            deadline = time.thread_time() + 0.3
+            while time.thread_time() < deadline:
+                pass
+        fast_done.set()
+
+    threads = [threading.Thread(target=slow), threading.Thread(target=fast)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    (waited,), (spun,) = runs["slow"].stages, runs["fast"].stages
+    assert "error" not in waited
+    assert waited["peak_traced_bytes"] >= BIG
+    assert spun["cpu_seconds"] >= 0.3
+    # Busy-waiting in the other thread is not charged to this stage
+    assert waited["cpu_seconds"] < 0.1
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, JOB_LOGGER, QUEUED, RUNNING, JobRegistry
+
+# Seconds a test waits for a job before failing
+TIMEOUT = 10
+
+
+def wait(job):
+    job._future.exception(timeout=TIMEOUT)
+    return job
+
+
+def started(job):
+    deadline = time.perf_counter() + TIMEOUT
+    while job.status != RUNNING and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    return job
+
+
+def blocked_job(job, release, stages=("load", "merge")):
+    for stage in stages:
+        job.set_stage(stage)
+        release.wait(TIMEOUT)
+    return "result"
+
+
+@pytest.fixture
+def registry():
+    registry = JobRegistry(max_workers=1, max_finished=2)
+    yield registry
+    registry._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def test_job_result_is_picked_up_once(registry):
+    job = wait(registry.submit("square", lambda job, value: value ** 2, 7, key=("k",)))
+    assert (job.status, job.result, job.key, job.progress) == (DONE, 49, ("k",), 1.0)
+    assert registry.get(job.id) is job
+    assert registry.pop(job.id) is job
+    assert registry.get(job.id) is None and registry.pop(job.id) is None
+
+
+def test_jobs_beyond_the_limit_wait_and_can_be_cancelled(registry):
+    release = threading.Event()
+    running = started(registry.submit("running", blocked_job, release))
+    queued = registry.submit("queued", blocked_job, release)
+    last = registry.submit("last", lambda job: "ran")
+    assert queued.status == QUEUED and registry.queued_ahead(last) == 1
+    assert registry.stats() == {"running": 1, "queued": 2, "finished": 0, "max_workers": 1}
+
+    queued.cancel()
+    assert queued.status == CANCELLED and queued.done
+    release.set()
+    assert wait(running).status == DONE and wait(last).result == "ran"
+    assert queued.started_at is None
+
+
+def test_running_job_stops_at_its_next_stage(registry):
+    release = threading.Event()
+    job = started(registry.submit("cancelled", blocked_job, release))
+    job.cancel()
+    release.set()
+    assert wait(job).status == CANCELLED
+    assert job.result is None and job.stage == "load" and "load" in job.stage_seconds
+
+
+def test_failed_job_reports_its_error(registry, caplog):
+    def failing(job):
+        job.set_stage("merge")
+        raise KeyError("vehicle_id")
+
+    def bare(job):
+        raise Exception()
+
+    with caplog.at_level(logging.ERROR, logger=JOB_LOGGER):
+        job = wait(registry.submit("failing", failing))
+        silent = wait(registry.submit("bare", bare))
+    assert job.status == FAILED and job.result is None
+    assert job.error == "KeyError: 'vehicle_id'"
+    assert "raise KeyError" in job.traceback
+    assert silent.error == "Exception"
+    assert f"Job {job.id} (failing) failed" in caplog.text and "KeyError" in caplog.text
+
+
+def test_registry_forgets_oldest_finished_jobs(registry):
+    jobs = [wait(registry.submit(f"job {position}", lambda job: None)) for position in range(4)]
+    release = threading.Event()
+    running = registry.submit("running", blocked_job, release)
+    # Only the newest max_finished finished jobs are kept; unfinished ones never drop
+    assert [registry.get(job.id) for job in jobs] == [None, None, jobs[2], jobs[3]]
+    assert registry.get(running.id) is running
+    release.set()
+    wait(running)
+    registry.submit("next", lambda job: None)
+    assert registry.get(jobs[2].id) is None
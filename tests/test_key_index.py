@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fusion import KeyIndex, merge_frames
+
+# Key dtypes the join is checked with
+KEY_DTYPES = ["float64", "Int64", "str", "object", "category"]
+
+
+def make_keys(rng, rows, dtype, missing=0.3):
+    """Return keys drawn from a few values with a share of missing ones"""
+    values = rng.integers(0, 5, rows).astype(float)
+    values[rng.random(rows) < missing] = np.nan
+    keys = pd.Series(values)
+    if dtype in ("float64", "Int64"):
+        return keys.astype(dtype)
+    labels = keys.map(lambda value: None if pd.isna(value) else f"k{int(value)}")
+    if dtype == "category":
+        return labels.astype(pd.CategoricalDtype([f"k{value}" for value in range(5)]))
+    return labels.astype(dtype)
+
+
+def make_pair(seed, dtype, keys=1, left_missing=0.3, right_missing=0.3):
+    rng = np.random.default_rng(seed)
+    on = [f"key{position}" for position in range(keys)]
+    left_rows, right_rows = rng.integers(1, 40), rng.integers(1, 25)
+    left = pd.DataFrame({col: make_keys(rng, left_rows, dtype, left_missing) for col in on})
+    left["left_row"] = np.arange(left_rows)
+    right = pd.DataFrame({col: make_keys(rng, right_rows, dtype, right_missing) for col in on})
+    right["right_row"] = np.arange(right_rows)
+    return left, right, on
+
+
+def by_rows(df):
+    return df.sort_values(["left_row", "right_row"], na_position="first").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("dtype", KEY_DTYPES)
+@pytest.mark.parametrize("keys", [1, 2])
+@pytest.mark.parametrize("missing", [(0.3, 0.3), (0.0, 0.3), (0.3, 0.0), (0.0, 0.0)])
+def test_key_index_join_matches_merge(dtype, keys, missing):
+    for seed in range(10):
+        left, right, on = make_pair(seed, dtype, keys, *missing)
+        index = KeyIndex(right, on)
+        for how in ("inner", "left"):
+            expected = pd.merge(left, right, on=on, how=how)
+            result = merge_frames(left, right, on, "Inner Join" if how == "inner" else "Left Join",
+                                  key_index=index)
+            if how == "left":
+                pd.testing.assert_frame_equal(result, expected)
+            else:
+                # pd.merge's single-key inner joins do not always keep left row order
+                pd.testing.assert_frame_equal(by_rows(result), by_rows(expected))
+            if index.accepts(left, right, how):
+                assert result["left_row"].is_monotonic_increasing
+
+
+def test_key_index_leaves_missing_keys_on_both_sides_to_merge():
+    left = pd.DataFrame({"key": pd.Series([None, "a", np.nan], dtype=object), "left_row": [0, 1, 2]})
+    right = pd.DataFrame({"key": pd.Series([np.nan, "a"], dtype=object), "right_row": [0, 1]})
+    index = KeyIndex(right, ["key"])
+    assert not index.accepts(left, right, "inner")
+    assert index.accepts(left.dropna(), right, "inner")
+    pd.testing.assert_frame_equal(merge_frames(left, right, ["key"], "Inner Join", key_index=index),
+                                  pd.merge(left, right, on=["key"], how="inner"))
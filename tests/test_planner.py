@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import run_job
+from planner import (JoinBudgetExceeded, check_budget, chunked_key_histogram, estimate_join_rows, key_histogram,
+                     normalize_key_dtypes, plan_join)
+from synthetic import make_bms_frame, make_road_frame
+
+HOWS = ["inner", "left", "right", "outer"]
+
+
+def keyed_pair(seed, keys=1, missing=0.2):
+    """Return frames whose keys repeat on both sides (many-to-many) with missing ones"""
+    rng = np.random.default_rng(seed)
+    on = [f"key{position}" for position in range(keys)]
+    frames = []
+    for rows in rng.integers(1, 60, 2):
+        df = pd.DataFrame({col: rng.integers(0, 6, rows).astype(float) for col in on})
+        for col in on:
+            df.loc[rng.random(rows) < missing, col] = np.nan
+        frames.append(df.assign(row=np.arange(rows)))
+    return *frames, on
+
+
+@pytest.mark.parametrize("how", HOWS)
+@pytest.mark.parametrize("keys", [1, 2])
+def test_estimate_matches_merge_row_count(how, keys):
+    for seed in range(20):
+        left, right, on = keyed_pair(seed, keys)
+        estimated = estimate_join_rows(key_histogram(left, on), key_histogram(right, on), how)
+        assert estimated == len(pd.merge(left, right, on=on, how=how))
+
+
+def test_chunked_histogram_matches_whole_frame():
+    left, _, on = keyed_pair(3, keys=2)
+    chunks = (left.iloc[start:start + 7] for start in range(0, len(left), 7))
+    pd.testing.assert_series_equal(chunked_key_histogram(chunks, on).sort_index(),
+                                   key_histogram(left, on).sort_index(), check_names=False)
+
+
+def test_normalize_converts_text_keys_to_the_other_kind():
+    ints = pd.DataFrame({"key": [1, 2, 3]})
+    left, right, changes = normalize_key_dtypes(ints, pd.DataFrame({"key": ["1", "2.0", None]}), ["key"])
+    assert pd.api.types.is_numeric_dtype(right["key"]) and right["key"].tolist()[:2] == [1, 2]
+    assert left["key"].dtype == ints["key"].dtype and len(changes) == 1
+
+    dates = pd.DataFrame({"key": pd.to_datetime(["2025-09-29", "2025-09-30"])})
+    text = pd.DataFrame({"key": pd.Series(["2025-09-30T00:00:00", "2025-09-29"]).astype("category")})
+    left, right, _ = normalize_key_dtypes(text, dates, ["key"])
+    assert pd.api.types.is_datetime64_any_dtype(left["key"])
+    assert len(pd.merge(left, right, on="key")) == 2
+
+
+def test_normalize_falls_back_to_strings():
+    left, right, changes = normalize_key_dtypes(pd.DataFrame({"key": [1, 2]}),
+                                                pd.DataFrame({"key": ["1", "two"]}), ["key"])
+    assert left["key"].tolist() == ["1", "2"] and right["key"].tolist() == ["1", "two"]
+    assert len(pd.merge(left, right, on="key")) == 1
+    assert len(changes) == 1 and changes[0].startswith("key: int64 / ")
+
+
+def test_check_budget_refuses_plans_over_budget():
+    left, right, on = keyed_pair(1)
+    rows = len(pd.merge(left, right, on=on))
+    plan = plan_join(left, right, on, "Inner Join", max_rows=rows)
+    assert plan["estimated_rows"] == rows and plan["within_budget"]
+    check_budget(plan)
+    for budget in ({"max_rows": rows - 1}, {"max_bytes": 1}):
+        plan = plan_join(left, right, on, "Inner Join", **budget)
+        with pytest.raises(JoinBudgetExceeded, match="exceeds the"):
+            check_budget(plan)
+    with pytest.raises(JoinBudgetExceeded, match="No join keys selected"):
+        check_budget(plan_join(left, right, [], "Inner Join"))
+
+
+def test_run_job_refuses_joins_over_budget(tmp_path):
+    paths = []
+    for name, df in (("bms", make_bms_frame(1_000)), ("road", make_road_frame())):
+        paths.append(str(tmp_path / f"{name}.csv"))
+        df.drop(columns="data_source").to_csv(paths[-1], index=False)
+    with pytest.raises(JoinBudgetExceeded):
+        run_job(*paths, "403825", "2025-09-29", str(tmp_path / "refused"), max_rows=999)
+    summary = run_job(*paths, "403825", "2025-09-29", str(tmp_path / "allowed"), max_rows=999,
+                      allow_over_budget=True, include_geojson=False)
+    assert summary["estimated_rows"] == summary["merged_rows"] == 1_000
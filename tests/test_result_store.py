@@ -0,0 +1,90 @@
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+from exporters import iter_csv_chunks, iter_geojson_chunks
+from fusion import add_source_metadata
+from result_store import ResultStore, read_frame, store_key, write_frame
+from synthetic import make_bms_frame
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture(scope="module")
+def merged():
+    return add_source_metadata(make_bms_frame(20_000), "BMS", "403825", "2025-09-29")
+
+
+def touch(store, key, seconds_ago):
+    """Backdate an entry's last access and write time"""
+    stem = os.path.join(store.directory, store_key(key))
+    stamp = time.time() - seconds_ago
+    for path in (stem + ".arrow", stem + ".summary.pkl"):
+        os.utime(path, (stamp, stamp))
+
+
+def test_read_frame_maps_numeric_columns_without_copying(merged, tmp_path):
+    import pyarrow as pa
+    path = write_frame(merged, str(tmp_path / "merged"))
+    allocated = pa.total_allocated_bytes()
+    tracemalloc.start()
+    try:
+        frame = read_frame(path)
+        traced = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    numeric = frame.select_dtypes("number")
+    assert list(numeric.columns) == ["vehicle_id", "latitude", "longitude", "battery_level", "voltage"]
+    for col in numeric.columns:
+        assert not numeric[col].to_numpy().flags.writeable
+    # Only the text and categorical columns are converted
+    copied = traced + pa.total_allocated_bytes() - allocated
+    assert copied < numeric.memory_usage(index=False).sum() / 2
+    pd.testing.assert_frame_equal(frame, merged, check_categorical=False, check_dtype=False)
+
+
+def test_stored_result_exports_round_trip(merged, tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.put(("key",), merged, {"rows": len(merged)})
+    # A second store over the directory reads the files instead of the in-process copy
+    stored, summary = ResultStore(str(tmp_path)).get(("key",))
+    assert stored is not merged and summary == {"rows": len(merged)}
+    assert b"".join(iter_csv_chunks(stored)) == b"".join(iter_csv_chunks(merged))
+    assert (b"".join(iter_geojson_chunks(stored, "403825"))
+            == b"".join(iter_geojson_chunks(merged, "403825")))
+
+
+def test_least_recently_used_entries_are_evicted_beyond_quota(merged, tmp_path):
+    small = merged.head(1_000)
+    store = ResultStore(str(tmp_path))
+    for position, key in enumerate(["a", "b", "c"]):
+        store.put((key,), small, {})
+        touch(store, (key,), 30 - position)
+    entry_bytes = store.stats()["bytes"] / 3
+    assert store.get(("a",)) is not None  # a is now the most recently used
+
+    store.max_bytes = 3.5 * entry_bytes
+    store.put(("d",), small, {})
+    assert store.get(("b",)) is None
+    assert all(store.get((key,)) is not None for key in ["a", "c", "d"])
+    assert store.stats()["entries"] == 3
+
+
+def test_expired_entries_are_dropped(merged, tmp_path):
+    store = ResultStore(str(tmp_path), ttl_seconds=60)
+    store.put(("old",), merged.head(10), {})
+    store.put(("new",), merged.head(10), {})
+    touch(store, ("old",), 120)
+    assert store.get(("old",)) is None and store.get(("new",)) is not None
+    assert not any(name.startswith(store_key(("old",))) for name in os.listdir(tmp_path))
+    assert (store.stats()["hits"], store.stats()["misses"]) == (1, 1)
+
+
+def test_newest_entry_is_kept_over_quota(merged, tmp_path):
+    store = ResultStore(str(tmp_path), max_bytes=1)
+    store.put(("first",), merged.head(100), {})
+    store.put(("second",), merged.head(100), {})
+    assert store.get(("first",)) is None and store.get(("second",)) is not None
@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+from road_reference import MANIFEST_NAME, RoadReferenceStore
+from synthetic import make_road_frame
+
+pytest.importorskip("pyarrow")
+
+SCOPE = "403825"
+
+
+@pytest.fixture(scope="module")
+def roads():
+    return make_road_frame(500), make_road_frame(300, seed=8)
+
+
+def test_put_and_reference_return_the_stored_table(roads, tmp_path):
+    road, _ = roads
+    store = RoadReferenceStore(str(tmp_path))
+    assert store.reference(SCOPE) is None
+    put = store.put(SCOPE, road, "v1")
+    pd.testing.assert_frame_equal(put.frame, road.reset_index(drop=True), check_dtype=False)
+    assert store.reference(SCOPE) is put
+    loaded = RoadReferenceStore(str(tmp_path)).reference(SCOPE)
+    assert loaded.digest == put.digest
+    pd.testing.assert_frame_equal(loaded.frame, put.frame)
+
+
+def test_changed_source_is_stale_until_put_replaces_it(roads, tmp_path):
+    road, changed = roads
+    store, other = RoadReferenceStore(str(tmp_path)), RoadReferenceStore(str(tmp_path))
+    first = store.put(SCOPE, road, "v1")
+    assert other.reference(SCOPE).digest == first.digest
+    assert store.is_current(SCOPE, "v1") and not store.is_current(SCOPE, "v2")
+    second = store.put(SCOPE, changed, "v2")
+    assert other.is_current(SCOPE, "v2") and not other.is_current(SCOPE, "v1")
+    assert other.reference(SCOPE).digest == second.digest != first.digest
+    assert len(other.reference(SCOPE).frame) == len(changed)
+    # Only the manifest and the frame it names are left
+    manifest = other.manifest(SCOPE)
+    assert sorted(os.listdir(tmp_path / SCOPE)) == sorted([MANIFEST_NAME, manifest["frame"]])
+    store.reset(SCOPE)
+    assert other.reference(SCOPE) is None
+
+
+def put_and_read(directory, seed):
+    store = RoadReferenceStore(directory)
+    for round_number in range(5):
+        store.put(SCOPE, make_road_frame(200 + seed, seed=seed), f"v{seed}.{round_number}")
+        reference = RoadReferenceStore(directory).reference(SCOPE)
+        assert len(reference.frame) == reference.manifest["rows"]
+    return True
+
+
+def test_concurrent_processes_never_read_a_mismatched_frame(tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        assert all(pool.map(put_and_read, [str(tmp_path)] * 4, range(4)))